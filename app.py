@@ -1,10 +1,24 @@
 import os
-import json
+import tempfile
+import time
+from functools import partial
 from PIL import Image
-import numpy as np
-import tensorflow as tf
 import streamlit as st
-from deep_translator import GoogleTranslator
+
+from batching import get_batcher
+from calibration import load_temperature
+from class_registry import load_registry
+from embeddings import EMBEDDINGS_DIR, get_index, predict_images_with_embeddings
+from inference import predict_batch, predict_images
+from jobs import JOB_THRESHOLD, TERMINAL, get_job_pool
+from metrics import stage, start_trace, write_textfile
+from model_registry import load_error, load_in_background, mark_startup, model_version, peek_model, startup_metrics, wait_until_ready
+from prediction_cache import get_prediction_cache
+from quality import DEFAULT_THRESHOLDS, QUALITY_GATE, check_quality
+from streaming import FrameStream, video_frames
+from translation import backend_stats, translate_many
+from tiling import analyze_tiled, heatmap_overlay
+from tta import predict_images_tta
 
 # Page Configuration
 st.set_page_config(
@@ -73,447 +87,39 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
-# Initialize translator
-def translate_to_hindi(text):
-    try:
-        translation = GoogleTranslator(source='en', target='hi').translate(text)
-        return translation
-    except:
-        return text
-
 # Session state for language
 if 'language' not in st.session_state:
     st.session_state.language = 'English'
 
 # Load model and class indices
 working_dir = os.path.dirname(os.path.abspath(__file__))
-model_path = f"{working_dir}/plant_disease_prediction_model.h5"
-model = tf.keras.models.load_model(model_path)
-class_indices = json.load(open(f"{working_dir}/class_indices.json"))
-
-# Disease Information Database
-DISEASE_INFO = {
-    "Apple___Apple_scab": {
-        "name": "Apple Scab",
-        "description": "Apple scab is a fungal disease caused by Venturia inaequalis. It causes dark, scabby lesions on leaves, fruit, and twigs, leading to premature leaf drop and reduced fruit quality.",
-        "symptoms": [
-            "Olive-green to brown spots on leaves",
-            "Velvety lesions on fruit",
-            "Premature leaf drop",
-            "Cracked and distorted fruit"
-        ],
-        "cure": [
-            "Remove and destroy infected leaves and fruit",
-            "Apply fungicides containing captan or myclobutanil",
-            "Prune trees to improve air circulation",
-            "Plant resistant apple varieties",
-            "Apply fungicides in early spring before bud break"
-        ]
-    },
-    "Apple___Black_rot": {
-        "name": "Apple Black Rot",
-        "description": "Black rot is caused by the fungus Botryosphaeria obtusa. It affects leaves, fruit, and bark, causing significant damage to apple trees.",
-        "symptoms": [
-            "Purple spots on leaves that turn brown",
-            "Black, sunken lesions on fruit",
-            "Mummified fruit remains on tree",
-            "Cankers on branches"
-        ],
-        "cure": [
-            "Prune out dead and diseased branches",
-            "Remove mummified fruit from tree and ground",
-            "Apply fungicides like captan or thiophanate-methyl",
-            "Maintain good tree hygiene",
-            "Ensure proper drainage around trees"
-        ]
-    },
-    "Apple___Cedar_apple_rust": {
-        "name": "Cedar Apple Rust",
-        "description": "Cedar apple rust is caused by Gymnosporangium juniperi-virginianae. It requires both apple and cedar trees to complete its life cycle.",
-        "symptoms": [
-            "Yellow-orange spots on upper leaf surface",
-            "Small, raised, orange lesions on fruit",
-            "Premature leaf drop",
-            "Reduced fruit quality"
-        ],
-        "cure": [
-            "Remove nearby cedar trees if possible",
-            "Apply fungicides containing myclobutanil",
-            "Plant resistant apple varieties",
-            "Rake and destroy fallen leaves",
-            "Apply fungicides from bud break to 4 weeks after petal fall"
-        ]
-    },
-    "Apple___healthy": {
-        "name": "Healthy Apple Plant",
-        "description": "Your apple plant appears healthy with no signs of disease. Continue maintaining good practices.",
-        "symptoms": [
-            "Vibrant green leaves",
-            "No spots or discoloration",
-            "Healthy fruit development"
-        ],
-        "cure": [
-            "Continue regular watering schedule",
-            "Apply balanced fertilizer as needed",
-            "Prune regularly for air circulation",
-            "Monitor for early signs of disease",
-            "Maintain mulch around base of tree"
-        ]
-    },
-    "Corn_(maize)___Cercospora_leaf_spot Gray_leaf_spot": {
-        "name": "Corn Gray Leaf Spot",
-        "description": "Gray leaf spot is caused by the fungus Cercospora zeae-maydis. It thrives in warm, humid conditions and can significantly reduce yield.",
-        "symptoms": [
-            "Rectangular gray-brown lesions on leaves",
-            "Lesions parallel to leaf veins",
-            "Premature leaf death",
-            "Reduced photosynthesis"
-        ],
-        "cure": [
-            "Plant resistant corn hybrids",
-            "Rotate crops with non-host plants",
-            "Apply fungicides containing strobilurins",
-            "Till crop residue into soil",
-            "Avoid overhead irrigation"
-        ]
-    },
-    "Corn_(maize)___Common_rust": {
-        "name": "Corn Common Rust",
-        "description": "Common rust is caused by Puccinia sorghi. It appears as small, circular to elongated pustules on leaves.",
-        "symptoms": [
-            "Reddish-brown pustules on both leaf surfaces",
-            "Pustules release rust-colored spores",
-            "Yellowing of leaves",
-            "Reduced plant vigor"
-        ],
-        "cure": [
-            "Plant resistant corn varieties",
-            "Apply fungicides if severe",
-            "Scout fields regularly",
-            "Remove volunteer corn plants",
-            "Ensure adequate plant nutrition"
-        ]
-    },
-    "Corn_(maize)___Northern_Leaf_Blight": {
-        "name": "Northern Corn Leaf Blight",
-        "description": "Northern leaf blight is caused by Exserohilum turcicum. It can cause significant yield losses in susceptible corn varieties.",
-        "symptoms": [
-            "Long, elliptical gray-green lesions on leaves",
-            "Lesions may span the entire leaf width",
-            "Premature leaf death",
-            "Reduced grain fill"
-        ],
-        "cure": [
-            "Plant resistant hybrids",
-            "Rotate crops for 2-3 years",
-            "Apply fungicides at early infection stages",
-            "Bury crop debris through deep tillage",
-            "Scout fields early and often"
-        ]
-    },
-    "Corn_(maize)___healthy": {
-        "name": "Healthy Corn Plant",
-        "description": "Your corn plant is healthy with no visible disease symptoms. Maintain current management practices.",
-        "symptoms": [
-            "Dark green, vigorous leaves",
-            "No lesions or spots",
-            "Good ear development"
-        ],
-        "cure": [
-            "Maintain adequate soil moisture",
-            "Apply nitrogen fertilizer as recommended",
-            "Control weeds effectively",
-            "Monitor for pests and diseases",
-            "Ensure proper plant spacing"
-        ]
-    },
-    "Grape___Black_rot": {
-        "name": "Grape Black Rot",
-        "description": "Black rot is caused by Guignardia bidwellii. It's one of the most serious diseases of grapes in humid climates.",
-        "symptoms": [
-            "Circular tan spots on leaves with dark borders",
-            "Black, shriveled, mummified berries",
-            "Brown lesions on shoots",
-            "Infected fruit drops prematurely"
-        ],
-        "cure": [
-            "Remove and destroy mummified fruit",
-            "Prune to improve air circulation",
-            "Apply fungicides from bud break through harvest",
-            "Remove wild grape vines nearby",
-            "Maintain good canopy management"
-        ]
-    },
-    "Grape___Esca_(Black_Measles)": {
-        "name": "Grape Esca (Black Measles)",
-        "description": "Esca is a complex disease involving multiple fungi. It affects the wood and vascular system of grapevines.",
-        "symptoms": [
-            "Tiger stripe pattern on leaves",
-            "Sudden wilting of shoots (apoplexy)",
-            "Dark streaking in wood",
-            "Berry spots and shriveling"
-        ],
-        "cure": [
-            "Remove and destroy infected wood",
-            "Avoid wounding during pruning",
-            "Delay pruning until late winter",
-            "Apply wound protectants after pruning",
-            "Currently no effective chemical control"
-        ]
-    },
-    "Grape___Leaf_blight_(Isariopsis_Leaf_Spot)": {
-        "name": "Grape Leaf Blight",
-        "description": "Leaf blight is caused by Pseudocercospora vitis. It causes leaf spots and premature defoliation.",
-        "symptoms": [
-            "Angular brown spots on leaves",
-            "Spots may have yellow halos",
-            "Premature leaf drop",
-            "Reduced photosynthesis"
-        ],
-        "cure": [
-            "Remove infected leaves",
-            "Apply copper-based fungicides",
-            "Improve air circulation through pruning",
-            "Avoid overhead irrigation",
-            "Maintain balanced nutrition"
-        ]
-    },
-    "Grape___healthy": {
-        "name": "Healthy Grape Plant",
-        "description": "Your grapevine is healthy with no disease symptoms present. Continue good vineyard management.",
-        "symptoms": [
-            "Lush green foliage",
-            "No leaf spots or discoloration",
-            "Healthy fruit clusters"
-        ],
-        "cure": [
-            "Continue regular irrigation",
-            "Maintain proper canopy management",
-            "Apply balanced fertilizers",
-            "Monitor for early disease signs",
-            "Ensure good air circulation"
-        ]
-    },
-    "Potato___Early_blight": {
-        "name": "Potato Early Blight",
-        "description": "Early blight is caused by Alternaria solani. It affects leaves, stems, and tubers of potato plants.",
-        "symptoms": [
-            "Dark brown spots with concentric rings (target pattern)",
-            "Yellowing around lesions",
-            "Premature leaf drop",
-            "Lesions on stems and tubers"
-        ],
-        "cure": [
-            "Plant resistant varieties",
-            "Apply fungicides containing chlorothalonil",
-            "Remove infected plant debris",
-            "Rotate crops with non-solanaceous plants",
-            "Ensure adequate plant spacing"
-        ]
-    },
-    "Potato___Late_blight": {
-        "name": "Potato Late Blight",
-        "description": "Late blight is caused by Phytophthora infestans. It's the same pathogen that caused the Irish potato famine.",
-        "symptoms": [
-            "Water-soaked lesions on leaves",
-            "White fungal growth on undersides of leaves",
-            "Blackened stems",
-            "Brown, firm rot on tubers"
-        ],
-        "cure": [
-            "Apply fungicides preventatively (mancozeb, chlorothalonil)",
-            "Destroy infected plants immediately",
-            "Plant certified disease-free seed potatoes",
-            "Avoid overhead irrigation",
-            "Hill up soil to protect tubers"
-        ]
-    },
-    "Potato___healthy": {
-        "name": "Healthy Potato Plant",
-        "description": "Your potato plant is healthy with no disease symptoms. Maintain current growing practices.",
-        "symptoms": [
-            "Green, vigorous foliage",
-            "No leaf spots or blight",
-            "Healthy plant growth"
-        ],
-        "cure": [
-            "Maintain consistent soil moisture",
-            "Apply balanced fertilizer",
-            "Hill soil around plants",
-            "Monitor for Colorado potato beetles",
-            "Harvest at proper maturity"
-        ]
-    },
-    "Tomato___Bacterial_spot": {
-        "name": "Tomato Bacterial Spot",
-        "description": "Bacterial spot is caused by Xanthomonas species. It affects leaves, stems, and fruit of tomato plants.",
-        "symptoms": [
-            "Small, dark, greasy-looking spots on leaves",
-            "Raised spots on fruit",
-            "Yellow halos around leaf spots",
-            "Premature leaf drop"
-        ],
-        "cure": [
-            "Use disease-free seeds and transplants",
-            "Apply copper-based bactericides",
-            "Remove infected plant material",
-            "Avoid overhead watering",
-            "Rotate crops for 2-3 years"
-        ]
-    },
-    "Tomato___Early_blight": {
-        "name": "Tomato Early Blight",
-        "description": "Early blight is caused by Alternaria solani. It's common in warm, humid conditions.",
-        "symptoms": [
-            "Dark spots with concentric rings on lower leaves",
-            "Yellowing around spots",
-            "Defoliation from bottom up",
-            "Lesions on fruit (usually at stem end)"
-        ],
-        "cure": [
-            "Remove infected lower leaves",
-            "Apply fungicides containing chlorothalonil",
-            "Mulch around plants",
-            "Stake and prune for air circulation",
-            "Water at base of plants"
-        ]
-    },
-    "Tomato___Late_blight": {
-        "name": "Tomato Late Blight",
-        "description": "Late blight is caused by Phytophthora infestans. It can destroy entire tomato crops rapidly.",
-        "symptoms": [
-            "Large, irregular brown lesions on leaves",
-            "White fungal growth on leaf undersides",
-            "Brown, greasy-looking spots on fruit",
-            "Rapid plant collapse"
-        ],
-        "cure": [
-            "Apply fungicides immediately (copper, chlorothalonil)",
-            "Remove and destroy infected plants",
-            "Improve air circulation",
-            "Avoid wetting foliage",
-            "Plant resistant varieties if available"
-        ]
-    },
-    "Tomato___Leaf_Mold": {
-        "name": "Tomato Leaf Mold",
-        "description": "Leaf mold is caused by Passalora fulva. It's most common in greenhouse and high tunnel production.",
-        "symptoms": [
-            "Pale green or yellow spots on upper leaf surfaces",
-            "Olive-green to gray fuzzy growth on undersides",
-            "Curling and browning of leaves",
-            "Rarely affects fruit"
-        ],
-        "cure": [
-            "Reduce humidity through ventilation",
-            "Space plants for air circulation",
-            "Apply fungicides containing chlorothalonil",
-            "Remove infected leaves",
-            "Plant resistant varieties"
-        ]
-    },
-    "Tomato___Septoria_leaf_spot": {
-        "name": "Tomato Septoria Leaf Spot",
-        "description": "Septoria leaf spot is caused by Septoria lycopersici. It's one of the most destructive tomato diseases.",
-        "symptoms": [
-            "Small, circular spots with gray centers",
-            "Dark borders around spots",
-            "Tiny black specks in center of spots",
-            "Defoliation starting from bottom"
-        ],
-        "cure": [
-            "Remove infected leaves immediately",
-            "Apply fungicides containing chlorothalonil or copper",
-            "Mulch to prevent soil splash",
-            "Rotate crops",
-            "Avoid overhead irrigation"
-        ]
-    },
-    "Tomato___Spider_mites Two-spotted_spider_mite": {
-        "name": "Two-Spotted Spider Mites",
-        "description": "Spider mites are tiny arachnids that feed on plant sap. They thrive in hot, dry conditions.",
-        "symptoms": [
-            "Stippling or tiny yellow spots on leaves",
-            "Fine webbing on plants",
-            "Bronzed or silvery leaves",
-            "Leaf drop in severe cases"
-        ],
-        "cure": [
-            "Spray with strong water jet to dislodge mites",
-            "Apply insecticidal soap or neem oil",
-            "Release predatory mites",
-            "Maintain adequate soil moisture",
-            "Remove heavily infested leaves"
-        ]
-    },
-    "Tomato___Target_Spot": {
-        "name": "Tomato Target Spot",
-        "description": "Target spot is caused by Corynespora cassiicola. It affects tomato leaves, stems, and fruit.",
-        "symptoms": [
-            "Brown spots with concentric rings (target pattern)",
-            "Lesions larger than early blight",
-            "Defoliation",
-            "Fruit lesions can occur"
-        ],
-        "cure": [
-            "Apply fungicides containing chlorothalonil",
-            "Remove infected plant debris",
-            "Improve air circulation",
-            "Avoid overhead watering",
-            "Rotate with non-host crops"
-        ]
-    },
-    "Tomato___Yellow_Leaf_Curl_Virus": {
-        "name": "Tomato Yellow Leaf Curl Virus",
-        "description": "TYLCV is transmitted by whiteflies. It's a serious viral disease in warm climates.",
-        "symptoms": [
-            "Upward curling of leaves",
-            "Yellowing of leaf margins",
-            "Stunted plant growth",
-            "Reduced fruit production"
-        ],
-        "cure": [
-            "Control whiteflies with insecticides or yellow sticky traps",
-            "Remove infected plants immediately",
-            "Use reflective mulches",
-            "Plant virus-resistant varieties",
-            "Use insect-proof netting in greenhouses"
-        ]
-    },
-    "Tomato___Tomato_mosaic_virus": {
-        "name": "Tomato Mosaic Virus",
-        "description": "Tomato mosaic virus (ToMV) causes mottled foliage and reduced yield. It spreads through contact and tools.",
-        "symptoms": [
-            "Mottled light and dark green pattern on leaves",
-            "Distorted leaves",
-            "Stunted growth",
-            "Reduced fruit set and quality"
-        ],
-        "cure": [
-            "Remove and destroy infected plants",
-            "Sanitize tools and hands",
-            "Plant resistant varieties",
-            "Control weeds that harbor virus",
-            "Avoid handling plants when wet"
-        ]
-    },
-    "Tomato___healthy": {
-        "name": "Healthy Tomato Plant",
-        "description": "Your tomato plant is healthy with no disease or pest issues. Continue your current care routine.",
-        "symptoms": [
-            "Dark green, lush foliage",
-            "No spots or discoloration",
-            "Good fruit set and development"
-        ],
-        "cure": [
-            "Water consistently at base of plant",
-            "Apply balanced fertilizer regularly",
-            "Stake or cage plants for support",
-            "Prune suckers for better air flow",
-            "Monitor regularly for early issues"
-        ]
-    }
-}
+# Keras .h5/.keras, or a .tflite/.onnx export from export_model.py
+model_path = os.environ.get("PLANT_MODEL_PATH", f"{working_dir}/plant_disease_prediction_model.h5")
+# The model loads in a background thread so the page renders before it is ready
+load_in_background(model_path)
+model = peek_model(model_path)
+model_ready = model is not None
+# Concurrent sessions share one queue in front of the model and are served in micro-batches
+# Models that expose their penultimate layer also return embeddings from the same forward pass
+batcher = get_batcher(
+    model_path, model, partial(predict_batch, model),
+    embed_fn=model.predict_with_embeddings if getattr(model, "supports_embeddings", False) else None,
+) if model_ready else None
+# Re-analysing an image already seen by this process skips preprocessing and the forward pass
+# Softmax temperature fitted offline by calibration.py (1 when there is no calibration file)
+temperature = load_temperature()
+prediction_cache = get_prediction_cache(f"{model_version(model_path)}-t{temperature:g}") if model_ready else None
+# One immutable metadata record per model output index, built once per process
+registry = load_registry(f"{working_dir}/class_indices.json")
+# Large batches are spooled to a SQLite-backed job queue and scored in the background;
+# job workers give way whenever interactive requests are waiting on the batcher
+job_pool = get_job_pool(
+    model_path, batcher, registry, temperature=temperature,
+    quality_thresholds=DEFAULT_THRESHOLDS if QUALITY_GATE else None,
+    yield_to=lambda: batcher.queue_depth() > 0,
+) if model_ready else None
+# Past cases indexed offline with embeddings.py, shown next to single-image predictions
+similar_index = get_index(EMBEDDINGS_DIR) if os.path.isdir(EMBEDDINGS_DIR) else None
 
 # Translation content
 TRANSLATIONS = {
@@ -555,16 +161,60 @@ TRANSLATIONS = {
         "upload_header": "📤 Upload Plant Leaf Image",
         "upload_prompt": "Choose an image...",
         "upload_info": "👆 Please upload an image to get started",
+        "model_loading": "⏳ Loading model...",
+        "model_ready": "✅ Model ready",
+        "model_error": "❌ Model failed to load",
+        "startup_header": "⏱️ Startup timings",
+        "debug_timings": "🐞 Show request timings",
+        "stage_column": "Stage",
+        "translation_backend": "Translation backend",
+        "batch_mode": "📚 Batch mode (multiple images)",
+        "tta_mode": "🔁 Thorough analysis",
+        "tta_help": "Also checks flipped, rotated and cropped versions of each photo. Slower, but more reliable on hard cases.",
+        "tiled_mode": "🔬 Detailed analysis (large photos)",
+        "tiled_help": "Examines the full-resolution photo in overlapping patches so small lesions are not missed. Best for field photos with many leaves.",
+        "heatmap_caption": "Red areas are likely diseased, green areas look healthy",
+        "tile_count": "Patches",
+        "scan_mode": "🎥 Row scan mode",
+        "scan_help": "Sweep the camera along a row: take snapshots or upload a video, and near-duplicate frames are skipped.",
+        "camera_prompt": "Take a snapshot of the next leaf",
+        "upload_video": "...or upload a video of the row",
+        "scan_header": "🎥 Row scan tally",
+        "scan_frames": "Frames",
+        "scan_skipped": "Skipped (duplicates)",
+        "scan_fps": "Frames / second",
+        "scan_count": "Frames",
+        "scan_reset": "🔄 Start a new scan",
+        "upload_prompt_multiple": "Choose images...",
+        "batch_results_header": "📊 Batch Results",
+        "job_header": "📦 Background analysis",
+        "job_submitted": "Large batch queued. You can keep using the app; results appear below as they finish.",
+        "job_cancel": "⏹️ Cancel",
+        "job_cancelled": "The background analysis was cancelled.",
+        "file_column": "File",
         "analyze_button": "🔬 Analyze Disease",
         "analyzing": "🔍 Analyzing image...",
         "analysis_complete": "✅ Analysis Complete!",
         "detected_condition": "Detected Condition",
         "confidence": "Confidence",
+        "retake_photo": "⚠️ The model is not confident about this image. Please retake the photo in good light with a single leaf filling the frame.",
+        "retake_short": "⚠️ Retake photo",
+        "top_k_header": "🔢 Other possibilities",
+        "similar_header": "🔎 Similar past cases",
+        "similarity": "similarity",
+        "quality_rejected": "🚫 This photo can't be analysed reliably. Please retake it:",
+        "quality_blurry": "The image is blurry; hold the camera steady and tap to focus on the leaf",
+        "quality_too_dark": "The image is too dark; move into better light",
+        "quality_too_bright": "The image is overexposed; avoid direct sunlight or glare",
+        "quality_not_a_leaf": "No leaf detected; fill the frame with a single leaf",
         "disease_info_header": "📋 Disease Information",
         "symptoms_header": "🔍 Symptoms",
         "treatment_header": "💊 Treatment & Management",
         "footer_text": "🌱 Plant Disease Classifier ",
-        "disclaimer": "For educational purposes only. Consult agricultural experts for serious infestations."
+        "disclaimer": "For educational purposes only. Consult agricultural experts for serious infestations.",
+        "healthy_leaf": "🌱 The leaf looks healthy. No treatment is needed.",
+        "no_info": "ℹ️ Detailed information for this condition is not available yet. Please consult a local agricultural expert.",
+        "missing_info": "Classes without disease information"
     },
     "Hindi": {
         "title": "🌿 पौधे रोग पहचान प्रणाली",
@@ -604,42 +254,63 @@ TRANSLATIONS = {
         "upload_header": "📤 पौधे की पत्ती की छवि अपलोड करें",
         "upload_prompt": "एक छवि चुनें...",
         "upload_info": "👆 कृपया शुरू करने के लिए एक छवि अपलोड करें",
+        "model_loading": "⏳ मॉडल लोड हो रहा है...",
+        "model_ready": "✅ मॉडल तैयार है",
+        "model_error": "❌ मॉडल लोड नहीं हो सका",
+        "startup_header": "⏱️ स्टार्टअप समय",
+        "debug_timings": "🐞 अनुरोध समय दिखाएं",
+        "stage_column": "चरण",
+        "translation_backend": "अनुवाद बैकएंड",
+        "batch_mode": "📚 बैच मोड (कई छवियां)",
+        "tta_mode": "🔁 गहन विश्लेषण",
+        "tta_help": "हर फोटो के पलटे, घुमाए और काटे गए रूपों की भी जांच करता है। धीमा, लेकिन कठिन मामलों में अधिक विश्वसनीय।",
+        "tiled_mode": "🔬 विस्तृत विश्लेषण (बड़ी फोटो)",
+        "tiled_help": "पूरी रिज़ॉल्यूशन फोटो को ओवरलैपिंग टुकड़ों में जांचता है ताकि छोटे घाव छूटें नहीं। कई पत्तियों वाली खेत की फोटो के लिए सबसे अच्छा।",
+        "heatmap_caption": "लाल क्षेत्र संभवतः रोगग्रस्त हैं, हरे क्षेत्र स्वस्थ दिखते हैं",
+        "tile_count": "टुकड़े",
+        "scan_mode": "🎥 पंक्ति स्कैन मोड",
+        "scan_help": "कैमरे को पंक्ति के साथ घुमाएं: स्नैपशॉट लें या वीडियो अपलोड करें, लगभग एक जैसे फ्रेम छोड़ दिए जाते हैं।",
+        "camera_prompt": "अगली पत्ती का स्नैपशॉट लें",
+        "upload_video": "...या पंक्ति का वीडियो अपलोड करें",
+        "scan_header": "🎥 पंक्ति स्कैन गिनती",
+        "scan_frames": "फ्रेम",
+        "scan_skipped": "छोड़े गए (दोहराव)",
+        "scan_fps": "फ्रेम / सेकंड",
+        "scan_count": "फ्रेम",
+        "scan_reset": "🔄 नया स्कैन शुरू करें",
+        "upload_prompt_multiple": "छवियां चुनें...",
+        "batch_results_header": "📊 बैच परिणाम",
+        "job_header": "📦 पृष्ठभूमि विश्लेषण",
+        "job_submitted": "बड़ा बैच कतार में है। आप ऐप का उपयोग जारी रख सकते हैं; परिणाम पूरे होते ही नीचे दिखेंगे।",
+        "job_cancel": "⏹️ रद्द करें",
+        "job_cancelled": "पृष्ठभूमि विश्लेषण रद्द कर दिया गया।",
+        "file_column": "फ़ाइल",
         "analyze_button": "🔬 रोग का विश्लेषण करें",
         "analyzing": "🔍 छवि का विश्लेषण किया जा रहा है...",
         "analysis_complete": "✅ विश्लेषण पूर्ण!",
         "detected_condition": "पहचानी गई स्थिति",
         "confidence": "विश्वास स्तर",
+        "retake_photo": "⚠️ मॉडल इस छवि के बारे में आश्वस्त नहीं है। कृपया अच्छी रोशनी में, फ्रेम में एक ही पत्ती के साथ फिर से फोटो लें।",
+        "retake_short": "⚠️ फिर से फोटो लें",
+        "top_k_header": "🔢 अन्य संभावनाएं",
+        "similar_header": "🔎 मिलते-जुलते पिछले मामले",
+        "similarity": "समानता",
+        "quality_rejected": "🚫 इस फोटो का विश्वसनीय विश्लेषण नहीं हो सकता। कृपया फिर से लें:",
+        "quality_blurry": "छवि धुंधली है; कैमरा स्थिर रखें और पत्ती पर फोकस करने के लिए टैप करें",
+        "quality_too_dark": "छवि बहुत अंधेरी है; बेहतर रोशनी में जाएं",
+        "quality_too_bright": "छवि बहुत उजली है; सीधी धूप या चमक से बचें",
+        "quality_not_a_leaf": "कोई पत्ती नहीं मिली; फ्रेम में एक ही पत्ती रखें",
         "disease_info_header": "📋 रोग की जानकारी",
         "symptoms_header": "🔍 लक्षण",
         "treatment_header": "💊 उपचार और प्रबंधन",
         "footer_text": "🌱 पौधे रोग पहचान प्रणाली ",
-        "disclaimer": "केवल शैक्षिक उद्देश्यों के लिए। गंभीर संक्रमण के लिए कृषि विशेषज्ञों से परामर्श करें।"
+        "disclaimer": "केवल शैक्षिक उद्देश्यों के लिए। गंभीर संक्रमण के लिए कृषि विशेषज्ञों से परामर्श करें।",
+        "healthy_leaf": "🌱 पत्ती स्वस्थ दिखती है। किसी उपचार की आवश्यकता नहीं है।",
+        "no_info": "ℹ️ इस स्थिति की विस्तृत जानकारी अभी उपलब्ध नहीं है। कृपया स्थानीय कृषि विशेषज्ञ से परामर्श करें।",
+        "missing_info": "बिना रोग जानकारी वाली श्रेणियां"
     }
 }
 
-def load_and_preprocess_image(image_path, target_size=(224, 224)):
-    img = Image.open(image_path)
-    img = img.resize(target_size)
-    img_array = np.array(img)
-    img_array = np.expand_dims(img_array, axis=0)
-    img_array = img_array.astype('float32') / 255.
-    return img_array
-
-def predict_image_class(model, image_path, class_indices):
-    preprocessed_img = load_and_preprocess_image(image_path)
-    predictions = model.predict(preprocessed_img)
-    predicted_class_index = np.argmax(predictions, axis=1)[0]
-    confidence = np.max(predictions) * 100
-    predicted_class_name = class_indices[str(predicted_class_index)]
-    return predicted_class_name, confidence
-
-def translate_to_hindi(text):
-    try:
-        translation = translator.translate(text, src='en', dest='hi')
-        return translation.text
-    except:
-        return text
-
 # Get current language
 lang = st.session_state.language
 t = TRANSLATIONS[lang]
@@ -666,6 +337,7 @@ with st.sidebar:
     # Update language after selection
     lang = st.session_state.language
     t = TRANSLATIONS[lang]
+    lang_code = "hi" if lang == "Hindi" else "en"
     
     if os.path.exists(f"{working_dir}/logo.png"):
         st.image(f"{working_dir}/logo.png", width=100)
@@ -675,6 +347,25 @@ with st.sidebar:
     
     st.header(t["instructions_header"])
     st.markdown(t["instructions_text"])
+    
+    # Model readiness
+    if model_ready:
+        st.success(t["model_ready"])
+    elif load_error(model_path) is not None:
+        st.error(f"{t['model_error']}: {load_error(model_path)}")
+    else:
+        st.warning(t["model_loading"])
+    
+    with st.expander(t["startup_header"]):
+        for event, seconds in startup_metrics().items():
+            st.text(f"{event}: {seconds:.2f}s")
+        missing_info = registry.missing_info()
+        if missing_info:
+            st.caption(f"{t['missing_info']} ({len(missing_info)}/{len(registry)}): {', '.join(missing_info)}")
+    
+    # Debug panel, filled in after the analysis below has run
+    show_timings = st.checkbox(t["debug_timings"])
+    timings_panel = st.empty()
 
 # Header
 st.markdown(f'<p class="main-header">{t["title"]}</p>', unsafe_allow_html=True)
@@ -685,38 +376,202 @@ col1, col2 = st.columns([1, 1])
 
 with col1:
     st.subheader(t["upload_header"])
-    uploaded_image = st.file_uploader(t["upload_prompt"], type=["jpg", "jpeg", "png"])
+    batch_mode = st.checkbox(t["batch_mode"])
+    tta_mode = st.checkbox(t["tta_mode"], help=t["tta_help"])
+    tiled_mode = st.checkbox(t["tiled_mode"], help=t["tiled_help"])
+    scan_mode = st.checkbox(t["scan_mode"], help=t["scan_help"])
+    uploaded_image = None
+    uploaded_images = []
+    camera_frame = None
+    scan_video = None
     
-    if uploaded_image is not None:
+    if scan_mode:
+        camera_frame = st.camera_input(t["camera_prompt"], disabled=not model_ready)
+        scan_video = st.file_uploader(t["upload_video"], type=["mp4", "mov", "avi", "gif", "webp"])
+    elif batch_mode:
+        uploaded_images = st.file_uploader(t["upload_prompt_multiple"], type=["jpg", "jpeg", "png"], accept_multiple_files=True)
+    else:
+        uploaded_image = st.file_uploader(t["upload_prompt"], type=["jpg", "jpeg", "png"])
+    
+    if uploaded_images:
+        st.image(uploaded_images, caption=[f.name for f in uploaded_images], width=120)
+        
+        analyze_button = st.button(t["analyze_button"], use_container_width=True, disabled=not model_ready)
+    elif uploaded_image is not None:
         image = Image.open(uploaded_image)
         st.image(image, caption="Uploaded Image", use_column_width=True)
         
-        analyze_button = st.button(t["analyze_button"], use_container_width=True)
+        analyze_button = st.button(t["analyze_button"], use_container_width=True, disabled=not model_ready)
+    elif scan_video is not None:
+        analyze_button = st.button(t["analyze_button"], use_container_width=True, disabled=not model_ready)
+    elif scan_mode:
+        analyze_button = False
     else:
         st.info(t["upload_info"])
         analyze_button = False
 
+# Stage timings for this rerun
+timings = start_trace()
+
+# Thorough mode sends every augmented view of an upload through one batch and bypasses the cache
+if tta_mode:
+    analyze = partial(predict_images_tta, batcher, temperature=temperature)
+else:
+    analyze = partial(predict_images, batcher, cache=prediction_cache, temperature=temperature)
+
 with col2:
-    if uploaded_image is not None and analyze_button:
+    # Large batches run as a background job instead of blocking this session
+    if uploaded_images and analyze_button and len(uploaded_images) > JOB_THRESHOLD:
+        st.session_state.job_id = job_pool.submit(uploaded_images, [f.name for f in uploaded_images])
+        st.info(t["job_submitted"])
+    
+    if uploaded_images and analyze_button and len(uploaded_images) <= JOB_THRESHOLD:
+        with st.spinner(t["analyzing"]):
+            # Blurry, dark and non-leaf uploads are turned away before the model runs
+            with stage("quality_gate"):
+                reports = [check_quality(uploaded) if QUALITY_GATE else None for uploaded in uploaded_images]
+            accepted = [uploaded for uploaded, report in zip(uploaded_images, reports) if report is None or report.ok]
+            # Predict the remaining uploads in batched forward passes
+            results = analyze(accepted, registry) if accepted else []
+            # Metadata for every prediction in one take instead of a dict lookup per row
+            records = iter(registry.take([result.class_index for result in results]))
+            results = iter(results)
+            mark_startup("first_prediction")
+            
+            st.success(t["analysis_complete"])
+            st.markdown(f"### {t['batch_results_header']}")
+            rows = []
+            for uploaded, report in zip(uploaded_images, reports):
+                if report is not None and not report.ok:
+                    condition = "; ".join(t[f"quality_{reason}"] for reason in report.reasons)
+                    rows.append({t["file_column"]: uploaded.name, t["detected_condition"]: condition, t["confidence"]: "—"})
+                    continue
+                result, record = next(results), next(records)
+                rows.append({
+                    t["file_column"]: uploaded.name,
+                    t["detected_condition"]: t["retake_short"] if result.abstain else record.names[lang_code],
+                    t["confidence"]: f"{result.confidence:.2f}%",
+                })
+            st.dataframe(rows, use_container_width=True)
+    
+    # Progress and partial results of this session's background job
+    job_running = False
+    job_status = None
+    if job_pool is not None and st.session_state.get("job_id"):
+        job_status = job_pool.store.status(st.session_state.job_id)
+    if job_status is not None:
+        counts = job_status["counts"]
+        finished = counts["done"] + counts["rejected"] + counts["failed"]
+        st.markdown(f"### {t['job_header']}")
+        st.progress(finished / job_status["total"], text=f"{finished} / {job_status['total']}")
+        job_running = job_status["status"] not in TERMINAL
+        if job_running and st.button(t["job_cancel"]):
+            job_pool.store.cancel(job_status["id"])
+            job_running = False
+        if job_status["status"] == "cancelled" or counts["cancelled"]:
+            st.warning(t["job_cancelled"])
+        items = job_pool.store.results(job_status["id"])
+        done = [item for item in items if item["status"] == "done"]
+        records = dict(zip(
+            (item["position"] for item in done), registry.take([item["result"]["class_index"] for item in done])
+        ))
+        st.dataframe([
+            {
+                t["file_column"]: item["name"],
+                t["detected_condition"]: (
+                    "; ".join(t[f"quality_{reason}"] for reason in item["result"]["reasons"])
+                    if item["status"] == "rejected"
+                    else item["error"] if item["status"] != "done"
+                    else t["retake_short"] if item["result"]["abstain"]
+                    else records[item["position"]].names[lang_code]
+                ),
+                t["confidence"]: f"{item['result']['confidence']:.2f}%" if item["status"] == "done" else "—",
+            }
+            for item in items
+        ], use_container_width=True)
+    
+    # Blurry, dark and non-leaf photos get reject reasons instead of a forward pass
+    quality_report = None
+    if uploaded_image is not None and analyze_button and QUALITY_GATE:
+        with stage("quality_gate"):
+            quality_report = check_quality(uploaded_image)
+        if not quality_report.ok:
+            st.error(t["quality_rejected"])
+            for reason in quality_report.reasons:
+                st.markdown(f"• {t[f'quality_{reason}']}")
+    
+    if uploaded_image is not None and analyze_button and (quality_report is None or quality_report.ok):
+        similar_cases = []
         with st.spinner(t["analyzing"]):
             # Predict
-            prediction, confidence = predict_image_class(model, uploaded_image, class_indices)
+            if tiled_mode:
+                # Overlapping patches of the full-resolution photo, classified in batched chunks
+                tiled = analyze_tiled(batcher, uploaded_image, registry, temperature=temperature)
+                result = tiled.verdict
+            elif similar_index is not None and len(similar_index) and batcher.supports_embeddings and not tta_mode:
+                # The prediction pass also yields the embedding the similar-case search needs
+                results, embeddings = predict_images_with_embeddings(
+                    batcher, [uploaded_image], registry, temperature=temperature
+                )
+                result = results[0]
+                similar_cases = similar_index.similar(embeddings)[0]
+            else:
+                result = analyze([uploaded_image], registry)[0]
+            record = registry[result.class_index]
+            mark_startup("first_prediction")
             
             st.success(t["analysis_complete"])
-            st.metric(t["detected_condition"], prediction.replace('___', ' - ').replace('_', ' '))
-            st.metric(t["confidence"], f"{confidence:.2f}%")
+            if result.abstain:
+                st.warning(t["retake_photo"])
+            st.metric(t["detected_condition"], record.names[lang_code])
+            st.metric(t["confidence"], f"{result.confidence:.2f}%")
+            with st.expander(t["top_k_header"], expanded=result.abstain):
+                for name, probability in result.top_k[1:]:
+                    st.text(f"{registry.find(name).names[lang_code]}: {probability:.2f}%")
+            if similar_cases:
+                with st.expander(t["similar_header"], expanded=True):
+                    captions = [
+                        f"{registry[case['class_index']].names[lang_code]} ({t['similarity']} {case['similarity']:.2f})"
+                        for case in similar_cases
+                    ]
+                    # Archive images that have since moved are listed without a thumbnail
+                    shown = [i for i, case in enumerate(similar_cases) if os.path.exists(case["path"])]
+                    if shown:
+                        st.image([similar_cases[i]["path"] for i in shown], caption=[captions[i] for i in shown], width=120)
+                    for i, case in enumerate(similar_cases):
+                        if i not in shown:
+                            st.text(f"{case['name']}: {captions[i]}")
+            if tiled_mode:
+                st.image(heatmap_overlay(uploaded_image, tiled), caption=t["heatmap_caption"], use_column_width=True)
+                if tiled.disease_tiles:
+                    st.dataframe([
+                        {t["detected_condition"]: registry.find(name).names[lang_code], t["tile_count"]: count}
+                        for name, count in tiled.disease_tiles.most_common()
+                    ], use_container_width=True)
+            
+            # Get disease info; no treatment advice for an uncertain diagnosis
+            with stage("disease_info_lookup"):
+                disease_info = None if result.abstain or not record.description else record
             
-            # Get disease info
-            disease_info = DISEASE_INFO.get(prediction, None)
+            if not result.abstain and disease_info is None:
+                if record.healthy:
+                    st.success(t["healthy_leaf"])
+                else:
+                    st.info(t["no_info"])
             
             if disease_info:
                 st.markdown("---")
                 
                 # Display in selected language
                 if lang == "Hindi":
-                    # Translate to Hindi
-                    disease_name_hi = translate_to_hindi(disease_info['name'])
-                    disease_desc_hi = translate_to_hindi(disease_info['description'])
+                    # Prebuilt catalogue first; missing strings are translated live in one concurrent round
+                    with stage("translate"):
+                        hi = translate_many(
+                            [disease_info.title, disease_info.description, *disease_info.symptoms, *disease_info.cure],
+                            'en', 'hi'
+                        )
+                    disease_name_hi = hi[disease_info.title]
+                    disease_desc_hi = hi[disease_info.description]
                     
                     st.markdown(f"### {t['disease_info_header']}")
                     st.markdown(f'<div class="hindi-card">', unsafe_allow_html=True)
@@ -726,15 +581,15 @@ with col2:
                     
                     # Symptoms
                     with st.expander(t["symptoms_header"], expanded=True):
-                        for symptom in disease_info['symptoms']:
-                            symptom_hi = translate_to_hindi(symptom)
+                        for symptom in disease_info.symptoms:
+                            symptom_hi = hi[symptom]
                             st.markdown(f"• {symptom_hi}")
                     
                     # Treatment
                     st.markdown(f"### {t['treatment_header']}")
                     st.markdown(f'<div class="hindi-card">', unsafe_allow_html=True)
-                    for i, cure in enumerate(disease_info['cure'], 1):
-                        cure_hi = translate_to_hindi(cure)
+                    for i, cure in enumerate(disease_info.cure, 1):
+                        cure_hi = hi[cure]
                         st.markdown(f"**{i}.** {cure_hi}")
                     st.markdown('</div>', unsafe_allow_html=True)
                     
@@ -742,22 +597,87 @@ with col2:
                     # Display in English
                     st.markdown(f"### {t['disease_info_header']}")
                     st.markdown(f'<div class="disease-card">', unsafe_allow_html=True)
-                    st.markdown(f"**{disease_info['name']}**")
-                    st.write(disease_info['description'])
+                    st.markdown(f"**{disease_info.title}**")
+                    st.write(disease_info.description)
                     st.markdown('</div>', unsafe_allow_html=True)
                     
                     # Symptoms
                     with st.expander(t["symptoms_header"], expanded=True):
-                        for symptom in disease_info['symptoms']:
+                        for symptom in disease_info.symptoms:
                             st.markdown(f"• {symptom}")
                     
                     # Treatment
                     st.markdown(f"### {t['treatment_header']}")
                     st.markdown(f'<div class="cure-card">', unsafe_allow_html=True)
-                    for i, cure in enumerate(disease_info['cure'], 1):
+                    for i, cure in enumerate(disease_info.cure, 1):
                         st.markdown(f"**{i}.** {cure}")
                     st.markdown('</div>', unsafe_allow_html=True)
 
+# Row scan: camera snapshots build up a running tally for the session; a video is
+# streamed through its own FrameStream with near-duplicate frames skipped
+with col2:
+    if scan_mode and model_ready:
+        scan_stats = None
+        # Frames per second only means something for a video; camera snapshots arrive
+        # whenever the user takes one and the wall clock includes the gaps between them
+        show_fps = False
+        if scan_video is not None and analyze_button:
+            show_fps = True
+            with st.spinner(t["analyzing"]):
+                suffix = os.path.splitext(scan_video.name)[1]
+                with tempfile.NamedTemporaryFile(suffix=suffix) as video_file:
+                    video_file.write(scan_video.getvalue())
+                    video_file.flush()
+                    stream = FrameStream(batcher, registry, temperature=temperature)
+                    progress = st.empty()
+                    for scan_stats in stream.run(video_frames(video_file.name)):
+                        progress.text(f"{t['scan_frames']}: {scan_stats['frames']}  {t['scan_fps']}: {scan_stats['fps']:.1f}")
+                    progress.empty()
+        elif camera_frame is not None:
+            if st.button(t["scan_reset"]):
+                st.session_state.pop("scan", None)
+            if "scan" not in st.session_state:
+                st.session_state.scan = FrameStream(batcher, registry, temperature=temperature)
+            # A model reload closes the old batcher; the session's tally carries over to the new one
+            st.session_state.scan.model = batcher
+            if "scan_last" not in st.session_state:
+                st.session_state.scan_last = None
+            # Streamlit reruns on every interaction; only a new snapshot is pushed
+            frame_bytes = camera_frame.getvalue()
+            if st.session_state.scan_last != frame_bytes:
+                st.session_state.scan_last = frame_bytes
+                st.session_state.scan.push(Image.open(camera_frame))
+                st.session_state.scan.flush()
+            scan_stats = st.session_state.scan.stats()
+        
+        if scan_stats is not None:
+            st.markdown(f"### {t['scan_header']}")
+            metric_columns = st.columns(3 if show_fps else 2)
+            metric_columns[0].metric(t["scan_frames"], scan_stats["frames"])
+            metric_columns[1].metric(t["scan_skipped"], scan_stats["skipped"])
+            if show_fps:
+                metric_columns[2].metric(t["scan_fps"], f"{scan_stats['fps']:.1f}")
+            st.dataframe([
+                {t["detected_condition"]: registry.find(name).names[lang_code], t["scan_count"]: count}
+                for name, count in scan_stats["tally"]
+            ], use_container_width=True)
+
+# Export metrics and show this request's timings
+if timings:
+    write_textfile()
+if show_timings:
+    with timings_panel.container():
+        if timings:
+            st.dataframe(
+                [{t["stage_column"]: name, "ms": round(seconds * 1000, 2)} for name, seconds in timings],
+                use_container_width=True
+            )
+        # Which translation backends answered this process's lookups, and what the live ones cost
+        st.dataframe(
+            [{t["translation_backend"]: name, **stats} for name, stats in backend_stats().items()],
+            use_container_width=True
+        )
+
 # Footer
 st.markdown("---")
 st.markdown(f"""
@@ -765,4 +685,18 @@ st.markdown(f"""
     <p>{t["footer_text"]}</p>
     <p style='font-size: 0.8rem;'>{t["disclaimer"]}</p>
 </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+
+# The startup gauges reach PLANT_METRICS_FILE without waiting for the first analysis
+if mark_startup("first_paint"):
+    write_textfile()
+
+# Poll the background job until it finishes
+if job_running:
+    time.sleep(1)
+    st.rerun()
+
+# Rerun once the background load finishes so the Analyze button becomes enabled
+if not model_ready and load_error(model_path) is None:
+    wait_until_ready(model_path)
+    st.rerun()
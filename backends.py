@@ -0,0 +1,150 @@
+import os
+
+import numpy as np
+
+# Every backend exposes predict_on_batch(batch) -> (N, num_classes) float32
+# probabilities, the same call inference.predict_batch makes on a Keras model.
+# Backends with supports_embeddings also offer predict_with_embeddings(batch) ->
+# (probabilities, (N, dim) penultimate-layer activations) from the same forward pass.
+
+# Serve TFLite constants straight from the memory-mapped file so every worker
+# process on a host shares one page-cache copy of the weights
+SHARE_WEIGHTS = os.environ.get("PLANT_SHARE_WEIGHTS", "") == "1"
+
+
+class KerasBackend:
+    name = "keras"
+    supports_embeddings = True
+
+    def __init__(self, path, num_threads=None, inter_op_threads=None):
+        import tensorflow as tf
+        # Only takes effect before TensorFlow runs its first op in this process
+        if num_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+        if inter_op_threads:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+        self.model = tf.keras.models.load_model(path)
+        self._embedding_model = None
+
+    def predict_on_batch(self, batch):
+        return np.asarray(self.model.predict_on_batch(batch))
+
+    def predict_with_embeddings(self, batch):
+        if self._embedding_model is None:
+            import tensorflow as tf
+            # Shares the loaded layers and weights; only adds the penultimate layer as a second output
+            self._embedding_model = tf.keras.Model(self.model.inputs, [self.model.output, self.model.layers[-2].output])
+        probabilities, embeddings = self._embedding_model.predict_on_batch(batch)
+        return np.asarray(probabilities), np.asarray(embeddings)
+
+
+def _tflite_interpreter_module():
+    # Prefer the standalone runtimes so TFLite models work without full TensorFlow
+    try:
+        from ai_edge_litert import interpreter
+        return interpreter
+    except ImportError:
+        pass
+    try:
+        from tflite_runtime import interpreter
+        return interpreter
+    except ImportError:
+        pass
+    import tensorflow as tf
+    return tf.lite
+
+
+class TFLiteBackend:
+    name = "tflite"
+    supports_embeddings = False
+
+    def __init__(self, path, num_threads=None, inter_op_threads=None, share_weights=SHARE_WEIGHTS):
+        # inter_op_threads is accepted for a uniform interface; TFLite runs ops sequentially
+        module = _tflite_interpreter_module()
+        options = {}
+        if share_weights:
+            # model_path is always mmapped read-only, but XNNPACK repacks weights into
+            # private memory. Skipping the default delegates keeps them in the shared
+            # mapping at the cost of slower kernels.
+            resolver = getattr(module, "OpResolverType", None) or module.experimental.OpResolverType
+            options["experimental_op_resolver_type"] = resolver.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+        self.interpreter = module.Interpreter(model_path=path, num_threads=num_threads, **options)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+
+    def _resize(self, batch_size):
+        if self._input["shape"][0] != batch_size:
+            shape = [batch_size] + list(self._input["shape"][1:])
+            self.interpreter.resize_tensor_input(self._input["index"], shape)
+            self.interpreter.allocate_tensors()
+            self._input = self.interpreter.get_input_details()[0]
+            self._output = self.interpreter.get_output_details()[0]
+
+    def predict_on_batch(self, batch):
+        self._resize(len(batch))
+        dtype = self._input["dtype"]
+        if dtype != np.float32:
+            # Full-integer models take quantized input
+            scale, zero_point = self._input["quantization"]
+            batch = np.clip(np.round(batch / scale + zero_point), np.iinfo(dtype).min, np.iinfo(dtype).max)
+        self.interpreter.set_tensor(self._input["index"], batch.astype(dtype, copy=False))
+        self.interpreter.invoke()
+        output = self.interpreter.get_tensor(self._output["index"])
+        if output.dtype != np.float32:
+            scale, zero_point = self._output["quantization"]
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+
+class ONNXBackend:
+    name = "onnx"
+
+    def __init__(self, path, num_threads=None, inter_op_threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        if inter_op_threads:
+            options.inter_op_num_threads = inter_op_threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self._input_name = self.session.get_inputs()[0].name
+        self._output_names = [output.name for output in self.session.get_outputs()]
+        # Models exported with export_model.py --embeddings carry the penultimate layer as a second output
+        self.supports_embeddings = len(self._output_names) > 1
+
+    def predict_on_batch(self, batch):
+        return self.session.run(self._output_names[:1], {self._input_name: batch})[0]
+
+    def predict_with_embeddings(self, batch):
+        if not self.supports_embeddings:
+            raise ValueError("this ONNX model has no embedding output; re-export it with --embeddings")
+        return tuple(self.session.run(self._output_names[:2], {self._input_name: batch}))
+
+
+BACKENDS = {
+    ".h5": KerasBackend,
+    ".keras": KerasBackend,
+    ".tflite": TFLiteBackend,
+    ".onnx": ONNXBackend,
+}
+
+
+def load_backend(path, **kwargs):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in BACKENDS:
+        raise ValueError(f"unsupported model format {extension!r}; expected one of {sorted(BACKENDS)}")
+    return BACKENDS[extension](path, **kwargs)
+
+
+def memory_usage():
+    # Linux only: resident, proportional (shared pages split across processes)
+    # and private memory of this process, in MB
+    usage = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            field, _, value = line.partition(":")
+            if field in ("Rss", "Pss", "Shared_Clean", "Private_Clean", "Private_Dirty"):
+                usage[field.lower()] = int(value.split()[0]) / 1024
+    return usage
+
@@ -0,0 +1,266 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from backends import load_backend
+from calibration import ABSTAIN_THRESHOLD, CALIBRATION_PATH, apply_temperature, load_temperature
+from inference import decode_predictions, load_class_indices, predict_batch
+from model_registry import get_model
+from preprocessing import IMAGE_SIZE, list_images, preprocess_into
+
+working_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def read_manifest(source, path_column="path"):
+    # A directory of images, or a CSV/JSONL manifest whose paths are relative to the manifest
+    if os.path.isdir(source):
+        return list_images(source)
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, newline="") as f:
+        if source.endswith(".jsonl"):
+            rows = (json.loads(line) for line in f if line.strip())
+        elif source.endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            raise ValueError(f"manifest must be a directory, .csv or .jsonl file: {source}")
+        return [os.path.join(base, row[path_column]) for row in rows]
+
+
+def decode_batch(paths, target_size=IMAGE_SIZE, draft=False):
+    # Returns the decoded batch, the paths that made it in, and {path: error} for the rest.
+    # draft=True is faster for large JPEGs but changes pixels, so scores can differ from the app.
+    batch = np.empty((len(paths), target_size[1], target_size[0], 3), dtype=np.float32)
+    decoded = []
+    errors = {}
+    for path in paths:
+        try:
+            preprocess_into(batch[len(decoded)], path, draft)
+            decoded.append(path)
+        except (OSError, ValueError) as e:
+            errors[path] = str(e)
+    return batch[:len(decoded)], decoded, errors
+
+
+def prefetch(path_batches, executor, depth, draft=False):
+    # Keeps up to depth batches decoding on the pool while the model runs the current one
+    pending = deque()
+    for paths in path_batches:
+        pending.append(executor.submit(decode_batch, paths, IMAGE_SIZE, draft))
+        if len(pending) >= depth:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def format_record(path, result):
+    return {
+        "path": path,
+        "class": result.class_name,
+        "confidence": result.confidence,
+        "abstain": result.abstain,
+        "top_k": [{"class": name, "confidence": confidence} for name, confidence in result.top_k],
+    }
+
+
+def load_checkpoint(output_path):
+    # Paths already scored successfully in the JSONL output. A line cut short by a crash
+    # is truncated away so appended records start on a clean line. Error records are
+    # dropped from the file so their images are retried (read errors are often transient)
+    # without leaving a stale error next to the new result.
+    if not os.path.exists(output_path):
+        return set()
+    with open(output_path, "rb") as f:
+        data = f.read()
+    lines = [line for line in data[:data.rfind(b"\n") + 1].splitlines(keepends=True) if line.strip()]
+    records = [json.loads(line) for line in lines]
+    kept = [line for line, record in zip(lines, records) if "error" not in record]
+    if len(kept) != len(lines) or sum(map(len, lines)) != len(data):
+        tmp_path = f"{output_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(b"".join(kept))
+        os.replace(tmp_path, output_path)
+    return {record["path"] for record in records if "error" not in record}
+
+
+def score_decoded(model, class_indices, batch, decoded, errors, k=5, temperature=1.,
+                  abstain_threshold=ABSTAIN_THRESHOLD):
+    # Calibrated like the app and the server, so confidences and abstain flags agree
+    records = []
+    if decoded:
+        predictions = apply_temperature(predict_batch(model, batch), temperature)
+        results = decode_predictions(predictions, class_indices, k, abstain_threshold)
+        records.extend(format_record(path, result) for path, result in zip(decoded, results))
+    records.extend({"path": path, "error": error} for path, error in errors.items())
+    return records
+
+
+def write_records(output, records):
+    output.write("".join(json.dumps(record) + "\n" for record in records))
+    output.flush()
+    failed = sum(1 for record in records if "error" in record)
+    return len(records) - failed, failed
+
+
+def batched(paths, batch_size):
+    return [paths[start:start + batch_size] for start in range(0, len(paths), batch_size)]
+
+
+def score(model, class_indices, paths, output, batch_size=32, k=5, decode_workers=4, prefetch_depth=8,
+          draft=False, temperature=1., abstain_threshold=ABSTAIN_THRESHOLD):
+    # Streams paths through decode and batched inference, appending one JSON line per image
+    scored = failed = 0
+    with ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix="decode") as executor:
+        for batch, decoded, errors in prefetch(batched(paths, batch_size), executor, prefetch_depth, draft):
+            records = score_decoded(model, class_indices, batch, decoded, errors, k, temperature, abstain_threshold)
+            counts = write_records(output, records)
+            scored += counts[0]
+            failed += counts[1]
+    return scored, failed
+
+
+# Process-pool mode: each worker loads the model once and both decodes and scores
+# its batches, so decoded tensors never cross a process boundary; only the small
+# result records are pickled back to the parent.
+_worker = {}
+
+
+def _init_worker(model_path, class_indices, num_threads, inter_op_threads, k, draft, temperature, abstain_threshold):
+    loader = partial(load_backend, num_threads=num_threads, inter_op_threads=inter_op_threads)
+    _worker.update(model=get_model(model_path, loader=loader), class_indices=class_indices, k=k, draft=draft,
+                   temperature=temperature, abstain_threshold=abstain_threshold)
+
+
+def _score_shard(paths):
+    batch, decoded, errors = decode_batch(paths, IMAGE_SIZE, _worker["draft"])
+    return score_decoded(_worker["model"], _worker["class_indices"], batch, decoded, errors, _worker["k"],
+                         _worker["temperature"], _worker["abstain_threshold"])
+
+
+def worker_pool(model_path, class_indices, workers, num_threads=None, inter_op_threads=1, k=5, draft=False,
+                temperature=1., abstain_threshold=ABSTAIN_THRESHOLD):
+    # Intra-op threads are split evenly so N workers do not oversubscribe the cores
+    num_threads = num_threads or max(1, (os.cpu_count() or 1) // workers)
+    # spawn: TensorFlow is not fork-safe
+    context = multiprocessing.get_context("spawn")
+    return context.Pool(
+        workers, initializer=_init_worker,
+        initargs=(model_path, class_indices, num_threads, inter_op_threads, k, draft, temperature, abstain_threshold),
+    )
+
+
+def score_parallel(pool, paths, output, batch_size=32):
+    scored = failed = 0
+    # imap hands out batches to whichever worker is free but yields them in input order
+    for records in pool.imap(_score_shard, batched(paths, batch_size)):
+        counts = write_records(output, records)
+        scored += counts[0]
+        failed += counts[1]
+    return scored, failed
+
+
+def benchmark_scaling(model_path, class_indices, paths, worker_counts, batch_size=32, **pool_options):
+    # Throughput per worker count, timed after a warm-up pass so model loading is excluded
+    results = []
+    for workers in worker_counts:
+        with worker_pool(model_path, class_indices, workers, **pool_options) as pool, open(os.devnull, "w") as sink:
+            score_parallel(pool, paths[:batch_size * workers * 2], sink, batch_size)
+            start = time.perf_counter()
+            scored, _ = score_parallel(pool, paths, sink, batch_size)
+            elapsed = time.perf_counter() - start
+        results.append({"workers": workers, "images_per_second": scored / elapsed})
+    base = results[0]["images_per_second"]
+    for result in results:
+        result["speedup"] = result["images_per_second"] / base if base else 0.
+    return results
+
+
+def write_parquet(jsonl_path, parquet_path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    with open(jsonl_path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    pq.write_table(pa.Table.from_pylist(records), parquet_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a directory or manifest of leaf images offline")
+    parser.add_argument("source", help="image directory, or a .csv/.jsonl manifest")
+    parser.add_argument("output", help="results file (.jsonl, or .parquet which needs pyarrow)")
+    parser.add_argument("--model", default=f"{working_dir}/plant_disease_prediction_model.h5")
+    parser.add_argument("--class-indices", default=f"{working_dir}/class_indices.json")
+    parser.add_argument("--path-column", default="path", help="manifest field holding the image path")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--calibration", default=CALIBRATION_PATH, help="temperature file from calibration.py")
+    parser.add_argument("--abstain-threshold", type=float, default=ABSTAIN_THRESHOLD,
+                        help="top-1 probability below which results are flagged for a retake")
+    parser.add_argument("--decode-workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--prefetch", type=int, default=8, help="batches decoded ahead of the model")
+    parser.add_argument("--draft", action="store_true",
+                        help="reduced-scale JPEG decode: faster, but scores can differ slightly from the app's")
+    parser.add_argument("--workers", type=int, default=1, help="model processes; 1 scores in this process")
+    parser.add_argument("--threads-per-worker", type=int, help="intra-op threads per worker (default: cores / workers)")
+    parser.add_argument("--inter-op-threads", type=int, default=1)
+    parser.add_argument("--scaling", type=int, nargs="+", metavar="WORKERS",
+                        help="benchmark throughput at these worker counts instead of scoring")
+    args = parser.parse_args()
+    pool_options = dict(
+        num_threads=args.threads_per_worker, inter_op_threads=args.inter_op_threads,
+        k=args.top_k, draft=args.draft, temperature=load_temperature(args.calibration),
+        abstain_threshold=args.abstain_threshold,
+    )
+
+    if args.scaling:
+        paths = read_manifest(args.source, args.path_column)
+        results = benchmark_scaling(
+            args.model, load_class_indices(args.class_indices), paths, args.scaling, args.batch_size, **pool_options
+        )
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        for result in results:
+            print(f"{result['workers']:>3} workers: {result['images_per_second']:8.1f} images/s "
+                  f"({result['speedup']:.2f}x)", file=sys.stderr)
+        return
+
+    # Progress is always tracked in JSONL; Parquet is written from it once the run completes
+    parquet = args.output.endswith(".parquet")
+    jsonl_path = args.output + ".partial.jsonl" if parquet else args.output
+
+    paths = read_manifest(args.source, args.path_column)
+    done = load_checkpoint(jsonl_path)
+    todo = [path for path in paths if path not in done]
+    print(f"{len(paths)} images, {len(done)} already scored, {len(todo)} to go", file=sys.stderr)
+
+    class_indices = load_class_indices(args.class_indices)
+    start = time.perf_counter()
+    with open(jsonl_path, "a") as output:
+        if args.workers > 1:
+            with worker_pool(args.model, class_indices, args.workers, **pool_options) as pool:
+                scored, failed = score_parallel(pool, todo, output, args.batch_size)
+        else:
+            scored, failed = score(
+                get_model(args.model), class_indices, todo, output,
+                batch_size=args.batch_size, k=args.top_k, decode_workers=args.decode_workers,
+                prefetch_depth=args.prefetch, draft=args.draft,
+                temperature=pool_options["temperature"], abstain_threshold=args.abstain_threshold,
+            )
+    elapsed = time.perf_counter() - start
+    print(f"scored {scored}, failed {failed} in {elapsed:.1f}s ({scored / elapsed if elapsed else 0:.1f} images/s)",
+          file=sys.stderr)
+
+    if parquet:
+        write_parquet(jsonl_path, args.output)
+        os.remove(jsonl_path)
+
+
+if __name__ == "__main__":
+    main()
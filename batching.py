@@ -0,0 +1,222 @@
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import numpy as np
+
+from metrics import counter, histogram
+
+_STOP = object()
+
+# Defaults for the shared batcher, overridable per deployment
+MAX_BATCH_SIZE = int(os.environ.get("PLANT_MAX_BATCH_SIZE", 32))
+MAX_WAIT_MS = float(os.environ.get("PLANT_MAX_WAIT_MS", 5))
+MAX_QUEUE_SIZE = int(os.environ.get("PLANT_MAX_QUEUE_SIZE", 256))
+# How long a multi-image request waits for queue room, and for its results, before giving up
+SUBMIT_TIMEOUT = float(os.environ.get("PLANT_SUBMIT_TIMEOUT", 5))
+RESULT_TIMEOUT = float(os.environ.get("PLANT_RESULT_TIMEOUT", 120))
+
+BATCH_SIZE = histogram("plant_batch_size", "Images per micro-batch forward pass", buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+BATCH_SECONDS = histogram("plant_batch_forward_seconds", "Duration of micro-batch forward passes")
+REJECTED = counter("plant_batcher_rejected", "Requests rejected because the batch queue was full")
+
+
+class MicroBatcher:
+    # Coalesces single preprocessed images from many threads into one forward pass.
+    # predict_fn takes a (N, H, W, C) float32 array and returns (N, num_classes).
+    # embed_fn, if given, returns (probabilities, embeddings) from one forward pass and is
+    # used instead of predict_fn for any batch in which an image asked for its embedding.
+
+    def __init__(self, predict_fn, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS,
+                 max_queue_size=MAX_QUEUE_SIZE, embed_fn=None):
+        self.predict_fn = predict_fn
+        self.embed_fn = embed_fn
+        self.supports_embeddings = embed_fn is not None
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_queue_size = max_queue_size
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stats_lock = threading.Lock()
+        self._submitted = 0
+        self._rejected = 0
+        self._failed = 0
+        self._batches = 0
+        self._predict_seconds = 0.
+        self._max_queue_depth = 0
+        self._batch_sizes = Counter()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, image_array, block=False, timeout=None, embedding=False):
+        # Raises queue.Full when max_queue_size requests are already waiting, and
+        # RuntimeError once the batcher is closed (e.g. replaced after a model reload).
+        # With embedding=True the future resolves to (probabilities, embedding).
+        if embedding and self.embed_fn is None:
+            raise ValueError("this batcher was created without an embed_fn")
+        if self._closed:
+            raise RuntimeError("the micro-batcher is closed")
+        future = Future()
+        try:
+            self._queue.put((image_array, future, embedding), block=block, timeout=timeout)
+        except queue.Full:
+            with self._stats_lock:
+                self._rejected += 1
+            REJECTED.inc()
+            raise
+        with self._stats_lock:
+            self._submitted += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+        # Lost a race with close() after the worker drained the queue: fail it here instead
+        if self._closed and not self._thread.is_alive():
+            self._fail_pending()
+        return future
+
+    def submit_many(self, arrays, timeout=SUBMIT_TIMEOUT, embedding=False):
+        # Queues every array or none. Waits up to timeout in total for queue room, so a
+        # request larger than max_queue_size still goes through while the queue drains;
+        # on failure the futures already queued are cancelled and skip the forward pass.
+        deadline = time.monotonic() + timeout
+        futures = []
+        try:
+            for array in arrays:
+                remaining = max(0., deadline - time.monotonic())
+                futures.append(self.submit(array, block=True, timeout=remaining, embedding=embedding))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        return futures
+
+    def gather(self, futures, timeout=RESULT_TIMEOUT):
+        # Results in order; raises TimeoutError (cancelling what is still queued) after timeout
+        deadline = time.monotonic() + timeout
+        try:
+            return [future.result(max(0., deadline - time.monotonic())) for future in futures]
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    def predict(self, image_array, timeout=RESULT_TIMEOUT):
+        return self.submit(image_array).result(timeout)
+
+    def predict_on_batch(self, batch):
+        # Same interface as a Keras model, so inference.predict_images can run through the batcher
+        return np.stack(self.gather(self.submit_many(batch)))
+
+    def predict_with_embeddings(self, batch):
+        probabilities, embeddings = zip(*self.gather(self.submit_many(batch, embedding=True)))
+        return np.stack(probabilities), np.stack(embeddings)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        with self._stats_lock:
+            processed = sum(size * count for size, count in self._batch_sizes.items())
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "max_queue_size": self.max_queue_size,
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_queue_depth,
+                "submitted": self._submitted,
+                "rejected": self._rejected,
+                "failed": self._failed,
+                "batches": self._batches,
+                "mean_batch_size": processed / self._batches if self._batches else 0.,
+                "batch_sizes": dict(sorted(self._batch_sizes.items())),
+                "predict_seconds": self._predict_seconds,
+            }
+
+    def close(self):
+        # New submits raise from now on; anything still queued behind the stop marker fails
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._fail_pending()
+
+    def _fail_pending(self):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not _STOP and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(RuntimeError("the micro-batcher was closed before this image was predicted"))
+
+    def _collect(self, first):
+        items = [first]
+        deadline = time.monotonic() + self.max_wait_ms / 1000.
+        while len(items) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Finish this batch, then let _run see the stop marker
+                self._queue.put(_STOP)
+                break
+            items.append(item)
+        return items
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                self._fail_pending()
+                return
+            items = self._collect(first)
+            items = [item for item in items if item[1].set_running_or_notify_cancel()]
+            if not items:
+                continue
+            futures = [future for _, future, _ in items]
+            wants_embedding = [embedding for _, _, embedding in items]
+            start = time.perf_counter()
+            try:
+                batch = np.stack([array for array, _, _ in items])
+                if any(wants_embedding):
+                    predictions, embeddings = self.embed_fn(batch)
+                else:
+                    predictions, embeddings = self.predict_fn(batch), [None] * len(items)
+            except Exception as e:
+                with self._stats_lock:
+                    self._failed += len(futures)
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            with self._stats_lock:
+                self._batches += 1
+                self._batch_sizes[len(futures)] += 1
+                self._predict_seconds += time.perf_counter() - start
+            BATCH_SIZE.observe(len(futures))
+            BATCH_SECONDS.observe(time.perf_counter() - start)
+            for future, prediction, embedding, wanted in zip(futures, predictions, embeddings, wants_embedding):
+                future.set_result((prediction, embedding) if wanted else prediction)
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(key, model, predict_fn, **config):
+    # One batcher per model path, shared by every session in the process.
+    # A reloaded model gets a fresh batcher and the old one is shut down.
+    with _batchers_lock:
+        entry = _batchers.get(key)
+        if entry is not None and entry[0] is model:
+            return entry[1]
+        if entry is not None:
+            entry[1].close()
+        batcher = MicroBatcher(predict_fn, **config)
+        _batchers[key] = (model, batcher)
+        return batcher
@@ -0,0 +1,157 @@
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import time
+
+import numpy as np
+from PIL import Image
+
+from inference import load_and_preprocess_image, predict_batch
+from isolation import run_isolated
+from preprocessing import IMAGE_SIZE, decode_rgb, fit_rgb, normalize_into
+
+NUM_CLASSES = 38
+
+
+def synthetic_leaf(rng, size=(1024, 768)):
+    # Green leaf-like texture with a few brown lesions, JPEG encoded like a phone upload
+    width, height = size
+    y, x = np.mgrid[0:height, 0:width]
+    image = np.empty((height, width, 3), dtype=np.float32)
+    image[..., 0] = 60 + 20 * np.sin(x / 37.)
+    image[..., 1] = 140 + 40 * np.cos(y / 53.)
+    image[..., 2] = 50
+    for _ in range(rng.integers(3, 8)):
+        cx, cy, r = rng.integers(0, width), rng.integers(0, height), rng.integers(10, 60)
+        lesion = (x - cx) ** 2 + (y - cy) ** 2 < r ** 2
+        image[lesion] = (120, 80, 30)
+    image += rng.normal(0, 12, image.shape)
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(image, 0, 255).astype(np.uint8)).save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def stand_in_model():
+    # Randomly initialised model with the production input and output shapes
+    import tensorflow as tf
+    return tf.keras.Sequential([
+        tf.keras.Input(shape=IMAGE_SIZE[::-1] + (3,)),
+        tf.keras.layers.Conv2D(32, 3, strides=2, activation="relu"),
+        tf.keras.layers.Conv2D(64, 3, strides=2, activation="relu"),
+        tf.keras.layers.Conv2D(128, 3, strides=2, activation="relu"),
+        tf.keras.layers.GlobalAveragePooling2D(),
+        tf.keras.layers.Dense(256, activation="relu"),
+        tf.keras.layers.Dense(NUM_CLASSES, activation="softmax"),
+    ])
+
+
+def summarize(seconds, images_per_call=1):
+    seconds = np.asarray(seconds)
+    return {
+        "p50_ms": float(np.percentile(seconds, 50) * 1000),
+        "p95_ms": float(np.percentile(seconds, 95) * 1000),
+        "p99_ms": float(np.percentile(seconds, 99) * 1000),
+        "images_per_second": float(images_per_call / np.median(seconds)),
+    }
+
+
+def timed(fn, repeats):
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def bench_preprocessing(images, repeats):
+    # The functions load_and_preprocess_image runs, each timed on its own: decode_rgb
+    # (decode plus fit_rgb), fit_rgb on an already decoded image, then normalize_into
+    out = np.empty(IMAGE_SIZE[::-1] + (3,), dtype=np.float32)
+    stages = {"decode_rgb": [], "fit_rgb": [], "normalize_into": [], "load_and_preprocess_image": []}
+    for _ in range(repeats):
+        for data in images:
+            stages["decode_rgb"].extend(timed(lambda: decode_rgb(io.BytesIO(data)), 1))
+            img = Image.open(io.BytesIO(data))
+            img.load()
+            stages["fit_rgb"].extend(timed(lambda: fit_rgb(img), 1))
+            fitted = fit_rgb(img)
+            stages["normalize_into"].extend(timed(lambda: normalize_into(out, fitted), 1))
+            stages["load_and_preprocess_image"].extend(timed(lambda: load_and_preprocess_image(io.BytesIO(data)), 1))
+    return {stage: summarize(seconds) for stage, seconds in stages.items()}
+
+
+def _bench_forward(model_path, threads, batch_sizes, repeats, result_queue):
+    # Runs in a fresh process: thread pools are fixed once TensorFlow initialises
+    if model_path:
+        from backends import load_backend
+        model = load_backend(model_path, num_threads=threads, inter_op_threads=1)
+    else:
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+        model = stand_in_model()
+    rng = np.random.default_rng(0)
+    results = []
+    for batch_size in batch_sizes:
+        batch = rng.random((batch_size,) + IMAGE_SIZE[::-1] + (3,), dtype=np.float32)
+        predict_batch(model, batch)
+        results.append(dict(
+            threads=threads, batch_size=batch_size,
+            **summarize(timed(lambda: predict_batch(model, batch), repeats), batch_size),
+        ))
+    result_queue.put({"forward": results, "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024})
+
+
+def bench_forward(model_path, threads, batch_sizes, repeats):
+    return run_isolated(_bench_forward, (model_path, threads, batch_sizes, repeats))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark preprocessing and the forward pass offline")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--model", help="benchmark this model file instead of the random stand-in")
+    parser.add_argument("--images", type=int, default=16, help="synthetic images to generate")
+    parser.add_argument("--image-size", type=int, nargs=2, default=(1024, 768), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    images = [synthetic_leaf(rng, tuple(args.image_size)) for _ in range(args.images)]
+    report = {
+        "config": dict(vars(args), cpu_count=os.cpu_count(), python=platform.python_version(),
+                       numpy=np.__version__),
+        "preprocessing": bench_preprocessing(images, max(1, args.repeats // 10)),
+        "forward": [],
+        "peak_rss_mb": {},
+        "errors": {},
+    }
+    for threads in dict.fromkeys(args.threads):
+        try:
+            result = bench_forward(args.model, threads, args.batch_sizes, args.repeats)
+        except RuntimeError as e:
+            # Keep the other thread counts rather than losing the whole run
+            report["errors"][f"threads={threads}"] = str(e)
+            print(f"forward threads={threads}: failed: {e}")
+            continue
+        report["forward"].extend(result["forward"])
+        report["peak_rss_mb"][f"threads={threads}"] = result["peak_rss_mb"]
+    report["peak_rss_mb"]["preprocessing"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    for stage, stats in report["preprocessing"].items():
+        print(f"{stage:>26}: p50 {stats['p50_ms']:7.2f} ms  p99 {stats['p99_ms']:7.2f} ms")
+    for row in report["forward"]:
+        print(f"forward threads={row['threads']:<3} batch={row['batch_size']:<4}: p50 {row['p50_ms']:8.2f} ms  "
+              f"{row['images_per_second']:8.1f} images/s")
+    print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
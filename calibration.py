@@ -0,0 +1,120 @@
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+working_dir = os.path.dirname(os.path.abspath(__file__))
+# Written by `python calibration.py`; without it probabilities are used as-is (temperature 1)
+CALIBRATION_PATH = os.environ.get("PLANT_CALIBRATION", f"{working_dir}/calibration.json")
+# Calibrated top-1 probability below which the user is asked to retake the photo
+ABSTAIN_THRESHOLD = float(os.environ.get("PLANT_ABSTAIN_THRESHOLD", 0.5))
+
+
+def load_temperature(path=CALIBRATION_PATH):
+    if not path or not os.path.exists(path):
+        return 1.
+    with open(path) as f:
+        return float(json.load(f)["temperature"])
+
+
+def apply_temperature(probabilities, temperature):
+    # The model ends in a softmax, so log-probabilities are the logits up to a
+    # per-row constant, which the softmax below cancels out
+    if temperature == 1.:
+        return probabilities
+    logits = np.log(np.maximum(probabilities, 1e-12, dtype=np.float64)) / temperature
+    logits -= logits.max(axis=1, keepdims=True)
+    np.exp(logits, out=logits)
+    logits /= logits.sum(axis=1, keepdims=True)
+    return logits.astype(np.float32)
+
+
+def negative_log_likelihood(probabilities, labels):
+    return float(-np.mean(np.log(np.maximum(probabilities[np.arange(len(labels)), labels], 1e-12))))
+
+
+def expected_calibration_error(probabilities, labels, bins=15):
+    # Gap between confidence and accuracy, averaged over equal-width confidence bins
+    confidences = probabilities.max(axis=1)
+    correct = probabilities.argmax(axis=1) == labels
+    bin_ids = np.minimum((confidences * bins).astype(int), bins - 1)
+    counts = np.bincount(bin_ids, minlength=bins)
+    gaps = np.abs(
+        np.bincount(bin_ids, weights=confidences, minlength=bins) - np.bincount(bin_ids, weights=correct, minlength=bins)
+    )
+    return float(gaps.sum() / max(counts.sum(), 1))
+
+
+def fit_temperature(probabilities, labels, low=0.05, high=20., iterations=60):
+    # Golden-section search on log(T); the NLL is unimodal in T
+    def loss(log_t):
+        return negative_log_likelihood(apply_temperature(probabilities, np.exp(log_t)), labels)
+
+    ratio = (np.sqrt(5) - 1) / 2
+    a, b = np.log(low), np.log(high)
+    c, d = b - ratio * (b - a), a + ratio * (b - a)
+    loss_c, loss_d = loss(c), loss(d)
+    for _ in range(iterations):
+        if loss_c < loss_d:
+            b, d, loss_d = d, c, loss_c
+            c = b - ratio * (b - a)
+            loss_c = loss(c)
+        else:
+            a, c, loss_c = c, d, loss_d
+            d = a + ratio * (b - a)
+            loss_d = loss(d)
+    return float(np.exp((a + b) / 2))
+
+
+def labelled_images(data_dir, class_indices, limit=None):
+    # PlantVillage layout: one subdirectory per class, named as in class_indices.json
+    from preprocessing import list_images
+    class_ids = {name: int(idx) for idx, name in class_indices.items()}
+    paths, labels = [], []
+    for name in sorted(os.listdir(data_dir)):
+        if name not in class_ids:
+            continue
+        images = list_images(os.path.join(data_dir, name), limit)
+        paths.extend(images)
+        labels.extend([class_ids[name]] * len(images))
+    return paths, np.asarray(labels)
+
+
+def main():
+    from inference import load_class_indices, predict_probabilities
+    from model_registry import get_model, model_version
+
+    parser = argparse.ArgumentParser(description="Fit a softmax temperature on a held-out labelled image set")
+    parser.add_argument("data_dir", help="directory with one subdirectory of images per class")
+    parser.add_argument("--model", default=f"{working_dir}/plant_disease_prediction_model.h5")
+    parser.add_argument("--class-indices", default=f"{working_dir}/class_indices.json")
+    parser.add_argument("--output", default=CALIBRATION_PATH)
+    parser.add_argument("--limit-per-class", type=int, help="use at most this many images per class")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    paths, labels = labelled_images(args.data_dir, load_class_indices(args.class_indices), args.limit_per_class)
+    if not paths:
+        sys.exit(f"no images for known classes under {args.data_dir}")
+    probabilities = predict_probabilities(get_model(args.model), paths, args.batch_size)
+    temperature = fit_temperature(probabilities, labels)
+    calibrated = apply_temperature(probabilities, temperature)
+    report = {
+        "temperature": temperature,
+        "model_version": model_version(args.model),
+        "images": len(paths),
+        "accuracy": float(np.mean(probabilities.argmax(axis=1) == labels)),
+        "nll_before": negative_log_likelihood(probabilities, labels),
+        "nll_after": negative_log_likelihood(calibrated, labels),
+        "ece_before": expected_calibration_error(probabilities, labels),
+        "ece_after": expected_calibration_error(calibrated, labels),
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import argparse
+import hashlib
+import json
+import os
+from functools import lru_cache
+
+from disease_info import DISEASE_INFO
+from translation import translate
+
+working_dir = os.path.dirname(os.path.abspath(__file__))
+CATALOGUE_DIR = os.environ.get("PLANT_CATALOGUE_DIR", f"{working_dir}/catalogue")
+
+
+def catalogue_version():
+    # Changes whenever any DISEASE_INFO text changes
+    source = json.dumps(DISEASE_INFO, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:12]
+
+
+def catalogue_path(language):
+    return f"{CATALOGUE_DIR}/disease_info.{language}.json"
+
+
+def disease_strings():
+    strings = []
+    for info in DISEASE_INFO.values():
+        strings.append(info["name"])
+        strings.append(info["description"])
+        strings.extend(info["symptoms"])
+        strings.extend(info["cure"])
+    return list(dict.fromkeys(strings))
+
+
+def build_catalogue(language, translate_fn=translate):
+    strings = {}
+    missing = []
+    for text in disease_strings():
+        translation = translate_fn(text, 'en', language)
+        # translate() falls back to the source text when the request fails
+        if translation and translation != text:
+            strings[text] = translation
+        else:
+            missing.append(text)
+    catalogue = {"version": catalogue_version(), "language": language, "strings": strings}
+    return catalogue, missing
+
+
+def write_catalogue(catalogue):
+    os.makedirs(CATALOGUE_DIR, exist_ok=True)
+    path = catalogue_path(catalogue["language"])
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(catalogue, f, ensure_ascii=False, indent=2, sort_keys=True)
+    return path
+
+
+@lru_cache(maxsize=None)
+def load_catalogue(language):
+    # Read once per process; a missing file just means every string goes to the next backend
+    try:
+        with open(catalogue_path(language), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"version": None, "language": language, "strings": {}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prebuild translated DISEASE_INFO catalogues")
+    parser.add_argument("languages", nargs="*", default=["hi"], help="target language codes (default: hi)")
+    args = parser.parse_args()
+
+    for language in args.languages:
+        catalogue, missing = build_catalogue(language)
+        path = write_catalogue(catalogue)
+        print(f"{path}: {len(catalogue['strings'])} strings, version {catalogue['version']}")
+        if missing:
+            print(f"  {len(missing)} strings could not be translated and will fall back to live translation")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import argparse
+import json
+import os
+import sys
+from collections import namedtuple
+from functools import lru_cache
+from types import MappingProxyType
+
+import numpy as np
+
+from catalogue import load_catalogue
+from disease_info import DISEASE_INFO
+
+working_dir = os.path.dirname(os.path.abspath(__file__))
+LANGUAGES = ("hi",)
+
+# One immutable record per model output index, built once per process.
+# label is the display name ("Pepper, bell - Bacterial spot"); names maps a language
+# code to the display name in that language. title, description, symptoms and cure
+# come from DISEASE_INFO and are empty for classes without an entry.
+ClassRecord = namedtuple(
+    "ClassRecord", "index key plant disease healthy label names title description symptoms cure"
+)
+
+
+def parse_key(key):
+    # "Corn_(maize)___Common_rust_" -> ("Corn (maize)", "Common rust")
+    plant, _, disease = key.partition("___")
+    return plant.replace("_", " ").strip(), disease.replace("_", " ").strip()
+
+
+class ClassRegistry:
+    # Integer-indexed array of ClassRecords; model outputs map to metadata with np.take
+
+    def __init__(self, class_indices, disease_info=DISEASE_INFO, languages=LANGUAGES):
+        count = len(class_indices)
+        self.keys = np.array([class_indices[str(idx)] for idx in range(count)], dtype=object)
+        self.records = np.empty(count, dtype=object)
+        catalogues = {language: load_catalogue(language)["strings"] for language in languages}
+        for idx, key in enumerate(self.keys):
+            plant, disease = parse_key(key)
+            info = disease_info.get(key, {})
+            label = f"{plant} - {disease}"
+            title = info.get("name", label)
+            names = {"en": label}
+            names.update({language: strings.get(title, label) for language, strings in catalogues.items()})
+            self.records[idx] = ClassRecord(
+                idx, key, plant, disease, disease == "healthy", label, MappingProxyType(names), title,
+                info.get("description", ""), tuple(info.get("symptoms", ())), tuple(info.get("cure", ())),
+            )
+        self.healthy = np.array([record.healthy for record in self.records])
+        self._index = {key: idx for idx, key in enumerate(self.keys)}
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, idx):
+        return self.records[idx]
+
+    def find(self, key):
+        return self.records[self._index[key]]
+
+    def take(self, indices):
+        return np.take(self.records, indices)
+
+    def missing_info(self):
+        return [record.key for record in self.records if not record.description]
+
+    def unknown_info(self, disease_info=DISEASE_INFO):
+        # DISEASE_INFO keys no class maps to, usually a spelling mismatch
+        return sorted(set(disease_info) - set(self._index))
+
+
+@lru_cache(maxsize=None)
+def load_registry(path=f"{working_dir}/class_indices.json"):
+    with open(path) as f:
+        return ClassRegistry(json.load(f))
+
+
+def class_names(class_indices):
+    # Index-aligned class keys from a ClassRegistry or the raw class_indices.json mapping
+    if isinstance(class_indices, ClassRegistry):
+        return class_indices.keys
+    return np.array([class_indices[str(idx)] for idx in range(len(class_indices))], dtype=object)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report classes without disease information")
+    parser.add_argument("--class-indices", default=f"{working_dir}/class_indices.json")
+    args = parser.parse_args()
+
+    registry = load_registry(args.class_indices)
+    missing = registry.missing_info()
+    unknown = registry.unknown_info()
+    print(f"{len(registry) - len(missing)} of {len(registry)} classes have disease information")
+    for key in missing:
+        print(f"  missing: {key}")
+    for key in unknown:
+        print(f"  DISEASE_INFO entry matches no class: {key}")
+    if unknown:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
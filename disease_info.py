@@ -0,0 +1,423 @@
+# Disease Information Database
+DISEASE_INFO = {
+    "Apple___Apple_scab": {
+        "name": "Apple Scab",
+        "description": "Apple scab is a fungal disease caused by Venturia inaequalis. It causes dark, scabby lesions on leaves, fruit, and twigs, leading to premature leaf drop and reduced fruit quality.",
+        "symptoms": [
+            "Olive-green to brown spots on leaves",
+            "Velvety lesions on fruit",
+            "Premature leaf drop",
+            "Cracked and distorted fruit"
+        ],
+        "cure": [
+            "Remove and destroy infected leaves and fruit",
+            "Apply fungicides containing captan or myclobutanil",
+            "Prune trees to improve air circulation",
+            "Plant resistant apple varieties",
+            "Apply fungicides in early spring before bud break"
+        ]
+    },
+    "Apple___Black_rot": {
+        "name": "Apple Black Rot",
+        "description": "Black rot is caused by the fungus Botryosphaeria obtusa. It affects leaves, fruit, and bark, causing significant damage to apple trees.",
+        "symptoms": [
+            "Purple spots on leaves that turn brown",
+            "Black, sunken lesions on fruit",
+            "Mummified fruit remains on tree",
+            "Cankers on branches"
+        ],
+        "cure": [
+            "Prune out dead and diseased branches",
+            "Remove mummified fruit from tree and ground",
+            "Apply fungicides like captan or thiophanate-methyl",
+            "Maintain good tree hygiene",
+            "Ensure proper drainage around trees"
+        ]
+    },
+    "Apple___Cedar_apple_rust": {
+        "name": "Cedar Apple Rust",
+        "description": "Cedar apple rust is caused by Gymnosporangium juniperi-virginianae. It requires both apple and cedar trees to complete its life cycle.",
+        "symptoms": [
+            "Yellow-orange spots on upper leaf surface",
+            "Small, raised, orange lesions on fruit",
+            "Premature leaf drop",
+            "Reduced fruit quality"
+        ],
+        "cure": [
+            "Remove nearby cedar trees if possible",
+            "Apply fungicides containing myclobutanil",
+            "Plant resistant apple varieties",
+            "Rake and destroy fallen leaves",
+            "Apply fungicides from bud break to 4 weeks after petal fall"
+        ]
+    },
+    "Apple___healthy": {
+        "name": "Healthy Apple Plant",
+        "description": "Your apple plant appears healthy with no signs of disease. Continue maintaining good practices.",
+        "symptoms": [
+            "Vibrant green leaves",
+            "No spots or discoloration",
+            "Healthy fruit development"
+        ],
+        "cure": [
+            "Continue regular watering schedule",
+            "Apply balanced fertilizer as needed",
+            "Prune regularly for air circulation",
+            "Monitor for early signs of disease",
+            "Maintain mulch around base of tree"
+        ]
+    },
+    "Corn_(maize)___Cercospora_leaf_spot Gray_leaf_spot": {
+        "name": "Corn Gray Leaf Spot",
+        "description": "Gray leaf spot is caused by the fungus Cercospora zeae-maydis. It thrives in warm, humid conditions and can significantly reduce yield.",
+        "symptoms": [
+            "Rectangular gray-brown lesions on leaves",
+            "Lesions parallel to leaf veins",
+            "Premature leaf death",
+            "Reduced photosynthesis"
+        ],
+        "cure": [
+            "Plant resistant corn hybrids",
+            "Rotate crops with non-host plants",
+            "Apply fungicides containing strobilurins",
+            "Till crop residue into soil",
+            "Avoid overhead irrigation"
+        ]
+    },
+    "Corn_(maize)___Common_rust_": {
+        "name": "Corn Common Rust",
+        "description": "Common rust is caused by Puccinia sorghi. It appears as small, circular to elongated pustules on leaves.",
+        "symptoms": [
+            "Reddish-brown pustules on both leaf surfaces",
+            "Pustules release rust-colored spores",
+            "Yellowing of leaves",
+            "Reduced plant vigor"
+        ],
+        "cure": [
+            "Plant resistant corn varieties",
+            "Apply fungicides if severe",
+            "Scout fields regularly",
+            "Remove volunteer corn plants",
+            "Ensure adequate plant nutrition"
+        ]
+    },
+    "Corn_(maize)___Northern_Leaf_Blight": {
+        "name": "Northern Corn Leaf Blight",
+        "description": "Northern leaf blight is caused by Exserohilum turcicum. It can cause significant yield losses in susceptible corn varieties.",
+        "symptoms": [
+            "Long, elliptical gray-green lesions on leaves",
+            "Lesions may span the entire leaf width",
+            "Premature leaf death",
+            "Reduced grain fill"
+        ],
+        "cure": [
+            "Plant resistant hybrids",
+            "Rotate crops for 2-3 years",
+            "Apply fungicides at early infection stages",
+            "Bury crop debris through deep tillage",
+            "Scout fields early and often"
+        ]
+    },
+    "Corn_(maize)___healthy": {
+        "name": "Healthy Corn Plant",
+        "description": "Your corn plant is healthy with no visible disease symptoms. Maintain current management practices.",
+        "symptoms": [
+            "Dark green, vigorous leaves",
+            "No lesions or spots",
+            "Good ear development"
+        ],
+        "cure": [
+            "Maintain adequate soil moisture",
+            "Apply nitrogen fertilizer as recommended",
+            "Control weeds effectively",
+            "Monitor for pests and diseases",
+            "Ensure proper plant spacing"
+        ]
+    },
+    "Grape___Black_rot": {
+        "name": "Grape Black Rot",
+        "description": "Black rot is caused by Guignardia bidwellii. It's one of the most serious diseases of grapes in humid climates.",
+        "symptoms": [
+            "Circular tan spots on leaves with dark borders",
+            "Black, shriveled, mummified berries",
+            "Brown lesions on shoots",
+            "Infected fruit drops prematurely"
+        ],
+        "cure": [
+            "Remove and destroy mummified fruit",
+            "Prune to improve air circulation",
+            "Apply fungicides from bud break through harvest",
+            "Remove wild grape vines nearby",
+            "Maintain good canopy management"
+        ]
+    },
+    "Grape___Esca_(Black_Measles)": {
+        "name": "Grape Esca (Black Measles)",
+        "description": "Esca is a complex disease involving multiple fungi. It affects the wood and vascular system of grapevines.",
+        "symptoms": [
+            "Tiger stripe pattern on leaves",
+            "Sudden wilting of shoots (apoplexy)",
+            "Dark streaking in wood",
+            "Berry spots and shriveling"
+        ],
+        "cure": [
+            "Remove and destroy infected wood",
+            "Avoid wounding during pruning",
+            "Delay pruning until late winter",
+            "Apply wound protectants after pruning",
+            "Currently no effective chemical control"
+        ]
+    },
+    "Grape___Leaf_blight_(Isariopsis_Leaf_Spot)": {
+        "name": "Grape Leaf Blight",
+        "description": "Leaf blight is caused by Pseudocercospora vitis. It causes leaf spots and premature defoliation.",
+        "symptoms": [
+            "Angular brown spots on leaves",
+            "Spots may have yellow halos",
+            "Premature leaf drop",
+            "Reduced photosynthesis"
+        ],
+        "cure": [
+            "Remove infected leaves",
+            "Apply copper-based fungicides",
+            "Improve air circulation through pruning",
+            "Avoid overhead irrigation",
+            "Maintain balanced nutrition"
+        ]
+    },
+    "Grape___healthy": {
+        "name": "Healthy Grape Plant",
+        "description": "Your grapevine is healthy with no disease symptoms present. Continue good vineyard management.",
+        "symptoms": [
+            "Lush green foliage",
+            "No leaf spots or discoloration",
+            "Healthy fruit clusters"
+        ],
+        "cure": [
+            "Continue regular irrigation",
+            "Maintain proper canopy management",
+            "Apply balanced fertilizers",
+            "Monitor for early disease signs",
+            "Ensure good air circulation"
+        ]
+    },
+    "Potato___Early_blight": {
+        "name": "Potato Early Blight",
+        "description": "Early blight is caused by Alternaria solani. It affects leaves, stems, and tubers of potato plants.",
+        "symptoms": [
+            "Dark brown spots with concentric rings (target pattern)",
+            "Yellowing around lesions",
+            "Premature leaf drop",
+            "Lesions on stems and tubers"
+        ],
+        "cure": [
+            "Plant resistant varieties",
+            "Apply fungicides containing chlorothalonil",
+            "Remove infected plant debris",
+            "Rotate crops with non-solanaceous plants",
+            "Ensure adequate plant spacing"
+        ]
+    },
+    "Potato___Late_blight": {
+        "name": "Potato Late Blight",
+        "description": "Late blight is caused by Phytophthora infestans. It's the same pathogen that caused the Irish potato famine.",
+        "symptoms": [
+            "Water-soaked lesions on leaves",
+            "White fungal growth on undersides of leaves",
+            "Blackened stems",
+            "Brown, firm rot on tubers"
+        ],
+        "cure": [
+            "Apply fungicides preventatively (mancozeb, chlorothalonil)",
+            "Destroy infected plants immediately",
+            "Plant certified disease-free seed potatoes",
+            "Avoid overhead irrigation",
+            "Hill up soil to protect tubers"
+        ]
+    },
+    "Potato___healthy": {
+        "name": "Healthy Potato Plant",
+        "description": "Your potato plant is healthy with no disease symptoms. Maintain current growing practices.",
+        "symptoms": [
+            "Green, vigorous foliage",
+            "No leaf spots or blight",
+            "Healthy plant growth"
+        ],
+        "cure": [
+            "Maintain consistent soil moisture",
+            "Apply balanced fertilizer",
+            "Hill soil around plants",
+            "Monitor for Colorado potato beetles",
+            "Harvest at proper maturity"
+        ]
+    },
+    "Tomato___Bacterial_spot": {
+        "name": "Tomato Bacterial Spot",
+        "description": "Bacterial spot is caused by Xanthomonas species. It affects leaves, stems, and fruit of tomato plants.",
+        "symptoms": [
+            "Small, dark, greasy-looking spots on leaves",
+            "Raised spots on fruit",
+            "Yellow halos around leaf spots",
+            "Premature leaf drop"
+        ],
+        "cure": [
+            "Use disease-free seeds and transplants",
+            "Apply copper-based bactericides",
+            "Remove infected plant material",
+            "Avoid overhead watering",
+            "Rotate crops for 2-3 years"
+        ]
+    },
+    "Tomato___Early_blight": {
+        "name": "Tomato Early Blight",
+        "description": "Early blight is caused by Alternaria solani. It's common in warm, humid conditions.",
+        "symptoms": [
+            "Dark spots with concentric rings on lower leaves",
+            "Yellowing around spots",
+            "Defoliation from bottom up",
+            "Lesions on fruit (usually at stem end)"
+        ],
+        "cure": [
+            "Remove infected lower leaves",
+            "Apply fungicides containing chlorothalonil",
+            "Mulch around plants",
+            "Stake and prune for air circulation",
+            "Water at base of plants"
+        ]
+    },
+    "Tomato___Late_blight": {
+        "name": "Tomato Late Blight",
+        "description": "Late blight is caused by Phytophthora infestans. It can destroy entire tomato crops rapidly.",
+        "symptoms": [
+            "Large, irregular brown lesions on leaves",
+            "White fungal growth on leaf undersides",
+            "Brown, greasy-looking spots on fruit",
+            "Rapid plant collapse"
+        ],
+        "cure": [
+            "Apply fungicides immediately (copper, chlorothalonil)",
+            "Remove and destroy infected plants",
+            "Improve air circulation",
+            "Avoid wetting foliage",
+            "Plant resistant varieties if available"
+        ]
+    },
+    "Tomato___Leaf_Mold": {
+        "name": "Tomato Leaf Mold",
+        "description": "Leaf mold is caused by Passalora fulva. It's most common in greenhouse and high tunnel production.",
+        "symptoms": [
+            "Pale green or yellow spots on upper leaf surfaces",
+            "Olive-green to gray fuzzy growth on undersides",
+            "Curling and browning of leaves",
+            "Rarely affects fruit"
+        ],
+        "cure": [
+            "Reduce humidity through ventilation",
+            "Space plants for air circulation",
+            "Apply fungicides containing chlorothalonil",
+            "Remove infected leaves",
+            "Plant resistant varieties"
+        ]
+    },
+    "Tomato___Septoria_leaf_spot": {
+        "name": "Tomato Septoria Leaf Spot",
+        "description": "Septoria leaf spot is caused by Septoria lycopersici. It's one of the most destructive tomato diseases.",
+        "symptoms": [
+            "Small, circular spots with gray centers",
+            "Dark borders around spots",
+            "Tiny black specks in center of spots",
+            "Defoliation starting from bottom"
+        ],
+        "cure": [
+            "Remove infected leaves immediately",
+            "Apply fungicides containing chlorothalonil or copper",
+            "Mulch to prevent soil splash",
+            "Rotate crops",
+            "Avoid overhead irrigation"
+        ]
+    },
+    "Tomato___Spider_mites Two-spotted_spider_mite": {
+        "name": "Two-Spotted Spider Mites",
+        "description": "Spider mites are tiny arachnids that feed on plant sap. They thrive in hot, dry conditions.",
+        "symptoms": [
+            "Stippling or tiny yellow spots on leaves",
+            "Fine webbing on plants",
+            "Bronzed or silvery leaves",
+            "Leaf drop in severe cases"
+        ],
+        "cure": [
+            "Spray with strong water jet to dislodge mites",
+            "Apply insecticidal soap or neem oil",
+            "Release predatory mites",
+            "Maintain adequate soil moisture",
+            "Remove heavily infested leaves"
+        ]
+    },
+    "Tomato___Target_Spot": {
+        "name": "Tomato Target Spot",
+        "description": "Target spot is caused by Corynespora cassiicola. It affects tomato leaves, stems, and fruit.",
+        "symptoms": [
+            "Brown spots with concentric rings (target pattern)",
+            "Lesions larger than early blight",
+            "Defoliation",
+            "Fruit lesions can occur"
+        ],
+        "cure": [
+            "Apply fungicides containing chlorothalonil",
+            "Remove infected plant debris",
+            "Improve air circulation",
+            "Avoid overhead watering",
+            "Rotate with non-host crops"
+        ]
+    },
+    "Tomato___Tomato_Yellow_Leaf_Curl_Virus": {
+        "name": "Tomato Yellow Leaf Curl Virus",
+        "description": "TYLCV is transmitted by whiteflies. It's a serious viral disease in warm climates.",
+        "symptoms": [
+            "Upward curling of leaves",
+            "Yellowing of leaf margins",
+            "Stunted plant growth",
+            "Reduced fruit production"
+        ],
+        "cure": [
+            "Control whiteflies with insecticides or yellow sticky traps",
+            "Remove infected plants immediately",
+            "Use reflective mulches",
+            "Plant virus-resistant varieties",
+            "Use insect-proof netting in greenhouses"
+        ]
+    },
+    "Tomato___Tomato_mosaic_virus": {
+        "name": "Tomato Mosaic Virus",
+        "description": "Tomato mosaic virus (ToMV) causes mottled foliage and reduced yield. It spreads through contact and tools.",
+        "symptoms": [
+            "Mottled light and dark green pattern on leaves",
+            "Distorted leaves",
+            "Stunted growth",
+            "Reduced fruit set and quality"
+        ],
+        "cure": [
+            "Remove and destroy infected plants",
+            "Sanitize tools and hands",
+            "Plant resistant varieties",
+            "Control weeds that harbor virus",
+            "Avoid handling plants when wet"
+        ]
+    },
+    "Tomato___healthy": {
+        "name": "Healthy Tomato Plant",
+        "description": "Your tomato plant is healthy with no disease or pest issues. Continue your current care routine.",
+        "symptoms": [
+            "Dark green, lush foliage",
+            "No spots or discoloration",
+            "Good fruit set and development"
+        ],
+        "cure": [
+            "Water consistently at base of plant",
+            "Apply balanced fertilizer regularly",
+            "Stake or cage plants for support",
+            "Prune suckers for better air flow",
+            "Monitor regularly for early issues"
+        ]
+    }
+}
@@ -0,0 +1,301 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from functools import lru_cache
+
+import numpy as np
+
+from calibration import ABSTAIN_THRESHOLD, CALIBRATION_PATH, apply_temperature, load_temperature
+from inference import decode_predictions, preprocess_images
+from metrics import stage
+from prediction_cache import TOP_K
+from preprocessing import list_images, thread_buffer
+
+# Similar-case index: unit-length penultimate-layer embeddings of past images, stored
+# as a float16 memory-mapped matrix and searched by cosine similarity. Embeddings come
+# out of the prediction forward pass, so indexing and querying never run the model twice.
+working_dir = os.path.dirname(os.path.abspath(__file__))
+EMBEDDINGS_DIR = os.environ.get("PLANT_EMBEDDINGS_DIR", f"{working_dir}/embeddings")
+SIMILAR_K = int(os.environ.get("PLANT_SIMILAR_K", 5))
+# Rows scored per matrix product; bounds the float32 working set of a brute-force search
+SEARCH_CHUNK_ROWS = int(os.environ.get("PLANT_SEARCH_CHUNK_ROWS", 65536))
+# Partitions searched per query once an IVF partitioning has been built
+IVF_PROBES = int(os.environ.get("PLANT_IVF_PROBES", 8))
+IVF_SAMPLE_SIZE = int(os.environ.get("PLANT_IVF_SAMPLE_SIZE", 100000))
+
+
+def normalize(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def embed_batch(model, batch, temperature=1.):
+    # One forward pass over a preprocessed batch -> (calibrated probabilities, unit-length embeddings).
+    # model: a backend or MicroBatcher with supports_embeddings.
+    if not getattr(model, "supports_embeddings", False):
+        raise ValueError("this model cannot return embeddings; use a Keras model or an ONNX export with --embeddings")
+    with stage("predict"):
+        probabilities, embeddings = model.predict_with_embeddings(batch)
+    return apply_temperature(np.asarray(probabilities), temperature), normalize(embeddings)
+
+
+def predict_with_embeddings(model, images, batch_size=32, temperature=1.):
+    probabilities, embeddings = [], []
+    for start in range(0, len(images), batch_size):
+        with stage("preprocess"):
+            batch = preprocess_images(images[start:start + batch_size], buffer=thread_buffer())
+        batch_probabilities, batch_embeddings = embed_batch(model, batch, temperature)
+        probabilities.append(batch_probabilities)
+        embeddings.append(batch_embeddings)
+    return np.concatenate(probabilities), np.concatenate(embeddings)
+
+
+def predict_images_with_embeddings(model, images, class_indices, batch_size=32, temperature=1., k=TOP_K,
+                                   abstain_threshold=ABSTAIN_THRESHOLD):
+    probabilities, embeddings = predict_with_embeddings(model, images, batch_size, temperature)
+    return decode_predictions(probabilities, class_indices, k, abstain_threshold), embeddings
+
+
+def cosine_top_k(vectors, queries, k=SIMILAR_K, rows=None, chunk_rows=SEARCH_CHUNK_ROWS):
+    # (row ids, similarities), each (Q, <=k) and most similar first, of the unit-length
+    # rows of vectors against unit-length queries. rows restricts the search to those ids.
+    # Only chunk_rows rows are widened to float32 at a time and only the running best k are kept.
+    count = len(vectors) if rows is None else len(rows)
+    best_rows = np.empty((len(queries), 0), dtype=np.int64)
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+    for start in range(0, count, chunk_rows):
+        stop = min(start + chunk_rows, count)
+        if rows is None:
+            ids, chunk = np.arange(start, stop), vectors[start:stop]
+        else:
+            ids = rows[start:stop]
+            chunk = vectors[ids]
+        scores = np.concatenate([best_scores, queries @ chunk.astype(np.float32).T], axis=1)
+        ids = np.concatenate([best_rows, np.broadcast_to(ids, (len(queries), len(ids)))], axis=1)
+        keep = np.argpartition(-scores, min(k, scores.shape[1]) - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, keep, axis=1)
+        best_rows = np.take_along_axis(ids, keep, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+def spherical_kmeans(vectors, clusters, iterations=10, seed=0):
+    # Unit-length centroids maximising cosine similarity to their members
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)]
+    for _ in range(iterations):
+        assignment = (vectors @ centroids.T).argmax(axis=1)
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=clusters)
+        sums = centroids.copy()
+        # Clusters that lost every member keep their old centroid
+        filled = counts > 0
+        sums[filled] = np.add.reduceat(vectors[order], (np.cumsum(counts) - counts)[filled], axis=0)
+        centroids = normalize(sums)
+    return centroids
+
+
+class EmbeddingIndex:
+    # Append-only similar-case store in one directory:
+    #   vectors.f16  rows x dim float16, memory-mapped for search
+    #   cases.jsonl  one JSON object per row: path, name, class_index, confidence, added
+    #   ivf.npz      optional partitioning from build_ivf(); rows added later are searched exhaustively
+    # A row counts once both its vector and its case line are on disk, so a crash mid-append
+    # leaves the index readable.
+
+    def __init__(self, directory=EMBEDDINGS_DIR):
+        self.directory = directory
+        self._vectors_path = os.path.join(directory, "vectors.f16")
+        self._cases_path = os.path.join(directory, "cases.jsonl")
+        self._ivf_path = os.path.join(directory, "ivf.npz")
+        self._lock = threading.Lock()
+        self.dim = None
+        self.cases = []
+        self._cases_offset = 0
+        self._mapped = None
+        self._ivf = None
+        self.refresh()
+
+    def __len__(self):
+        return len(self.cases)
+
+    def refresh(self):
+        # Picks up rows and partitions written by other processes since the last call
+        with self._lock:
+            manifest = os.path.join(self.directory, "index.json")
+            if self.dim is None and os.path.exists(manifest):
+                with open(manifest) as f:
+                    self.dim = json.load(f)["dim"]
+            if self.dim is None:
+                return
+            if os.path.getsize(self._cases_path) > self._cases_offset:
+                with open(self._cases_path, "rb") as f:
+                    f.seek(self._cases_offset)
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break
+                        self.cases.append(json.loads(line))
+                        self._cases_offset += len(line)
+            if os.path.exists(self._ivf_path) and (
+                self._ivf is None or self._ivf["mtime"] != os.path.getmtime(self._ivf_path)
+            ):
+                with np.load(self._ivf_path) as ivf:
+                    self._ivf = dict(ivf, mtime=os.path.getmtime(self._ivf_path))
+
+    def vectors(self):
+        # Read-only float16 memmap of every complete row; the OS pages it in on demand
+        rows = min(len(self.cases), os.path.getsize(self._vectors_path) // (2 * self.dim)) if self.dim else 0
+        if rows == 0:
+            return np.empty((0, self.dim or 0), dtype=np.float16)
+        if self._mapped is None or len(self._mapped) != rows:
+            self._mapped = np.memmap(self._vectors_path, dtype=np.float16, mode="r", shape=(rows, self.dim))
+        return self._mapped
+
+    def add(self, embeddings, cases):
+        # embeddings: (N, dim) from predict_with_embeddings; cases: N JSON-serialisable dicts
+        embeddings = normalize(embeddings).astype(np.float16)
+        with self._lock:
+            if self.dim is None:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(os.path.join(self.directory, "index.json"), "w") as f:
+                    json.dump({"dim": embeddings.shape[1]}, f)
+                self.dim = embeddings.shape[1]
+                open(self._cases_path, "a").close()
+            if embeddings.shape[1] != self.dim:
+                raise ValueError(f"embedding size {embeddings.shape[1]} does not match the index ({self.dim})")
+            # Vectors first: a case line is only written once its vector is on disk
+            with open(self._vectors_path, "ab") as f:
+                f.write(embeddings.tobytes())
+            lines = "".join(json.dumps(case, ensure_ascii=False) + "\n" for case in cases)
+            with open(self._cases_path, "a") as f:
+                f.write(lines)
+            self.cases.extend(cases)
+            self._cases_offset += len(lines.encode("utf-8"))
+
+    def build_ivf(self, lists=None, iterations=10, sample_size=IVF_SAMPLE_SIZE, seed=0):
+        # Coarse partitioning for large archives: k-means on a sample, then every row is
+        # filed under its nearest centroid. A query then scores only the rows of its
+        # nearest few partitions instead of the whole matrix.
+        vectors = self.vectors()
+        if not len(vectors):
+            raise ValueError("the index is empty")
+        lists = min(lists or max(1, int(np.sqrt(len(vectors)))), len(vectors))
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(len(vectors), min(len(vectors), max(sample_size, lists)), replace=False))
+        centroids = spherical_kmeans(vectors[sample].astype(np.float32), lists, iterations, seed)
+        assignment = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), SEARCH_CHUNK_ROWS):
+            chunk = vectors[start:start + SEARCH_CHUNK_ROWS].astype(np.float32)
+            assignment[start:start + len(chunk)] = (chunk @ centroids.T).argmax(axis=1)
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.searchsorted(assignment[order], np.arange(lists + 1))
+        np.savez(self._ivf_path, centroids=centroids, order=order, offsets=offsets, rows=len(vectors))
+        self._ivf = None
+        self.refresh()
+        return np.diff(offsets)
+
+    def search(self, queries, k=SIMILAR_K, probes=IVF_PROBES):
+        # queries: (Q, dim) embeddings -> (row ids, cosine similarities), each (Q, <=k)
+        self.refresh()
+        vectors = self.vectors()
+        queries = normalize(np.atleast_2d(queries))
+        if not len(vectors):
+            return np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0), dtype=np.float32)
+        with stage("similar_search"):
+            ivf = self._ivf
+            if ivf is None or not probes or probes >= len(ivf["centroids"]):
+                return cosine_top_k(vectors, queries, k)
+            order, offsets = ivf["order"], ivf["offsets"]
+            nearest = np.argpartition(-(queries @ ivf["centroids"].T), probes - 1, axis=1)[:, :probes]
+            results = []
+            for query, lists in zip(queries, nearest):
+                rows = [order[offsets[idx]:offsets[idx + 1]] for idx in lists]
+                rows.append(np.arange(int(ivf["rows"]), len(vectors)))
+                # Sorted ids read the memmap front to back
+                results.append(cosine_top_k(vectors, query[None], k, np.sort(np.concatenate(rows))))
+            width = min(len(ids[0]) for ids, _ in results)
+            return (np.concatenate([ids[:, :width] for ids, _ in results]),
+                    np.concatenate([scores[:, :width] for _, scores in results]))
+
+    def similar(self, embeddings, k=SIMILAR_K, probes=IVF_PROBES):
+        # Per query, the k most similar stored cases as dicts with a similarity field
+        rows, scores = self.search(embeddings, k, probes)
+        return [
+            # float16 storage can push exact duplicates a hair above 1
+            [dict(self.cases[row], similarity=min(float(score), 1.)) for row, score in zip(row_ids, row_scores)]
+            for row_ids, row_scores in zip(rows, scores)
+        ]
+
+
+@lru_cache(maxsize=None)
+def get_index(directory=EMBEDDINGS_DIR):
+    # One index per directory, shared by every session in the process
+    return EmbeddingIndex(directory)
+
+
+def main():
+    from batch_score import decode_batch
+    from class_registry import load_registry
+    from model_registry import get_model
+
+    parser = argparse.ArgumentParser(description="Build and query the similar-case embedding index")
+    parser.add_argument("--index", default=EMBEDDINGS_DIR)
+    parser.add_argument("--model", default=f"{working_dir}/plant_disease_prediction_model.h5")
+    parser.add_argument("--class-indices", default=f"{working_dir}/class_indices.json")
+    parser.add_argument("--calibration", default=CALIBRATION_PATH)
+    parser.add_argument("--batch-size", type=int, default=32)
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="predict archive images and store their embeddings")
+    add.add_argument("paths", nargs="+", help="images or directories of images")
+    ivf = commands.add_parser("build-ivf", help="partition the index for faster search over large archives")
+    ivf.add_argument("--lists", type=int, help="number of partitions (default: sqrt of the row count)")
+    ivf.add_argument("--iterations", type=int, default=10)
+    query = commands.add_parser("query", help="print the most similar stored cases for images")
+    query.add_argument("paths", nargs="+")
+    query.add_argument("--k", type=int, default=SIMILAR_K)
+    query.add_argument("--probes", type=int, default=IVF_PROBES, help="IVF partitions to search; 0 searches all rows")
+    args = parser.parse_args()
+
+    index = EmbeddingIndex(args.index)
+    if args.command == "build-ivf":
+        sizes = index.build_ivf(args.lists, args.iterations)
+        print(f"{len(index)} rows in {len(sizes)} partitions (largest {sizes.max()}, empty {(sizes == 0).sum()})")
+        return
+
+    paths = [path for arg in args.paths for path in (list_images(arg) if os.path.isdir(arg) else [arg])]
+    if not paths:
+        sys.exit("no images found")
+    model = get_model(args.model)
+    registry = load_registry(args.class_indices)
+    temperature = load_temperature(args.calibration)
+    for start in range(0, len(paths), args.batch_size):
+        # Unreadable files are reported and skipped; each batch is stored as soon as it is scored
+        batch, decoded, errors = decode_batch(paths[start:start + args.batch_size], draft=False)
+        for path, error in errors.items():
+            print(f"skipped {path}: {error}", file=sys.stderr)
+        if not decoded:
+            continue
+        probabilities, embeddings = embed_batch(model, batch, temperature)
+        results = decode_predictions(probabilities, registry)
+        if args.command == "add":
+            now = time.time()
+            index.add(embeddings, [
+                {"path": os.path.abspath(path), "name": os.path.basename(path), "class_index": result.class_index,
+                 "confidence": round(result.confidence, 4), "added": now}
+                for path, result in zip(decoded, results)
+            ])
+            continue
+        for path, result, neighbours in zip(decoded, results, index.similar(embeddings, args.k, args.probes)):
+            print(f"{path}: {result.class_name} ({result.confidence:.2f}%)")
+            for case in neighbours:
+                print(f"  {case['similarity']:.4f}  {registry[case['class_index']].label:<45} {case['path']}")
+    if args.command == "add":
+        print(f"the index now holds {len(index)} images")
+
+
+if __name__ == "__main__":
+    main()
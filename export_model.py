@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import resource
+import time
+
+import numpy as np
+
+from inference import load_class_indices, preprocess_images
+from isolation import run_isolated
+from preprocessing import list_images
+
+working_dir = os.path.dirname(os.path.abspath(__file__))
+VARIANTS = ("float32", "dynamic", "fp16", "int8")
+
+
+def export_tflite(model, variant, calibration_paths, output_path):
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if variant == "dynamic":
+        # int8 weights, float activations; no calibration data needed
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif variant == "fp16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == "int8":
+        if not calibration_paths:
+            raise ValueError("int8 export needs --calibration-dir with representative leaf images")
+
+        def representative_dataset():
+            for path in calibration_paths:
+                yield [preprocess_images([path])]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    with open(output_path, "wb") as f:
+        f.write(converter.convert())
+    return output_path
+
+
+def export_onnx(model, output_path, embeddings=False):
+    import tensorflow as tf
+    import tf2onnx
+    if embeddings:
+        # Second output: penultimate-layer activations for the similar-case index
+        model = tf.keras.Model(model.inputs, [model.output, model.layers[-2].output])
+    spec = (tf.TensorSpec((None, 224, 224, 3), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=17, output_path=output_path)
+    return output_path
+
+
+def load_eval_set(directory, class_indices):
+    # ImageFolder layout: <directory>/<class name from class_indices.json>/<image>
+    label_of = {name: int(idx) for idx, name in class_indices.items()}
+    paths, labels = [], []
+    for path in list_images(directory):
+        label = label_of.get(os.path.basename(os.path.dirname(path)))
+        if label is not None:
+            paths.append(path)
+            labels.append(label)
+    return paths, np.array(labels)
+
+
+def _evaluate(model_path, eval_paths, batch_size, result_queue):
+    # Runs in a fresh process so peak RSS reflects this variant alone
+    from backends import load_backend, memory_usage
+    backend = load_backend(model_path)
+    probabilities = []
+    latencies = []
+    for start in range(0, len(eval_paths), batch_size):
+        batch = preprocess_images(eval_paths[start:start + batch_size])
+        begin = time.perf_counter()
+        probabilities.append(np.asarray(backend.predict_on_batch(batch), dtype=np.float32))
+        latencies.append((time.perf_counter() - begin) / len(batch))
+    single = preprocess_images(eval_paths[:1])
+    single_latencies = []
+    for _ in range(20):
+        begin = time.perf_counter()
+        backend.predict_on_batch(single)
+        single_latencies.append(time.perf_counter() - begin)
+    result_queue.put({
+        "probabilities": np.concatenate(probabilities),
+        "ms_per_image_batched": float(np.median(latencies) * 1000),
+        "ms_batch_1_p50": float(np.median(single_latencies) * 1000),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "memory_mb": memory_usage(),
+    })
+
+
+def evaluate(model_path, eval_paths, batch_size=32):
+    return run_isolated(_evaluate, (model_path, eval_paths, batch_size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the Keras model to TFLite/ONNX and compare variants")
+    parser.add_argument("--model", default=f"{working_dir}/plant_disease_prediction_model.h5")
+    parser.add_argument("--class-indices", default=f"{working_dir}/class_indices.json")
+    parser.add_argument("--out-dir", default=f"{working_dir}/exported")
+    parser.add_argument("--variants", nargs="+", choices=VARIANTS, default=list(VARIANTS))
+    parser.add_argument("--onnx", action="store_true", help="also export ONNX (needs tf2onnx)")
+    parser.add_argument("--embeddings", action="store_true",
+                        help="add the penultimate-layer embedding as a second ONNX output")
+    parser.add_argument("--calibration-dir", help="representative images for int8 calibration")
+    parser.add_argument("--calibration-size", type=int, default=200)
+    parser.add_argument("--eval-dir", help="held-out images in <class name>/<image> folders")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    import tensorflow as tf
+    model = tf.keras.models.load_model(args.model)
+    os.makedirs(args.out_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(args.model))[0]
+    calibration_paths = list_images(args.calibration_dir, args.calibration_size) if args.calibration_dir else []
+
+    exported = {"keras": args.model}
+    for variant in args.variants:
+        output_path = f"{args.out_dir}/{stem}.{variant}.tflite"
+        exported[f"tflite-{variant}"] = export_tflite(model, variant, calibration_paths, output_path)
+        print(f"wrote {output_path}")
+    if args.onnx:
+        output_path = f"{args.out_dir}/{stem}.onnx"
+        exported["onnx"] = export_onnx(model, output_path, args.embeddings)
+        print(f"wrote {output_path}")
+    del model
+
+    report = {
+        name: {"path": path, "size_mb": os.path.getsize(path) / 2 ** 20}
+        for name, path in exported.items()
+    }
+    if args.eval_dir:
+        eval_paths, labels = load_eval_set(args.eval_dir, load_class_indices(args.class_indices))
+        if not eval_paths:
+            parser.error(f"no images under {args.eval_dir} match class names in {args.class_indices}")
+        reference = None
+        for name, path in exported.items():
+            try:
+                result = evaluate(path, eval_paths, args.batch_size)
+            except RuntimeError as e:
+                # One broken variant is reported and the others are still compared
+                report[name]["error"] = str(e)
+                print(f"{name:>16}: evaluation failed: {e}")
+                continue
+            probabilities = result.pop("probabilities")
+            predicted = probabilities.argmax(axis=1)
+            if reference is None:
+                reference = probabilities
+            result["accuracy"] = float((predicted == labels).mean())
+            result["accuracy_delta_vs_keras"] = result["accuracy"] - report["keras"].get("accuracy", result["accuracy"])
+            result["top1_agreement_vs_keras"] = float((predicted == reference.argmax(axis=1)).mean())
+            result["max_prob_diff_vs_keras"] = float(np.abs(probabilities - reference).max())
+            report[name].update(result)
+            print(f"{name:>16}: acc {result['accuracy']:.4f} ({result['accuracy_delta_vs_keras']:+.4f}), "
+                  f"{result['ms_batch_1_p50']:.1f} ms/img @1, {result['ms_per_image_batched']:.2f} ms/img "
+                  f"@{args.batch_size}, peak RSS {result['peak_rss_mb']:.0f} MB")
+
+    report_path = f"{args.out_dir}/export_report.json"
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import io
+import json
+from collections import namedtuple
+
+import numpy as np
+
+from calibration import ABSTAIN_THRESHOLD, apply_temperature
+from class_registry import class_names
+from metrics import stage
+from prediction_cache import TOP_K, image_bytes, predict_with_cache, top_k
+from preprocessing import IMAGE_SIZE, PreprocessBuffer, preprocess_into, thread_buffer
+
+
+def load_class_indices(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_and_preprocess_image(image_path, target_size=IMAGE_SIZE):
+    img_array = np.empty((1, target_size[1], target_size[0], 3), dtype=np.float32)
+    preprocess_into(img_array[0], image_path)
+    return img_array
+
+
+def preprocess_images(images, target_size=IMAGE_SIZE, buffer=None):
+    # One contiguous float32 array for the whole list; pass a PreprocessBuffer to reuse its memory
+    if buffer is None:
+        buffer = PreprocessBuffer(len(images), target_size)
+    return buffer.fill(images)
+
+
+# class_name and confidence (%) are the top-1; top_k lists (class name, confidence %)
+# pairs, most likely first. abstain is set when the top-1 is too unsure to act on.
+# class_index indexes a ClassRegistry for the top-1's metadata.
+Prediction = namedtuple("Prediction", "class_name confidence top_k abstain class_index")
+
+
+def decode_top_k(top, class_indices, abstain_threshold=ABSTAIN_THRESHOLD):
+    # top: [(class_index, probability), ...] per image, as returned by prediction_cache.top_k.
+    # class_indices: a ClassRegistry or the class_indices.json mapping.
+    if not top:
+        return []
+    pairs = np.asarray(top)
+    indices = pairs[..., 0].astype(np.intp)
+    names = np.take(class_names(class_indices), indices)
+    results = []
+    for row_indices, row_names, row in zip(indices, names, pairs):
+        named = [(name, float(prob) * 100) for name, prob in zip(row_names, row[:, 1])]
+        results.append(Prediction(*named[0], named, bool(row[0, 1] < abstain_threshold), int(row_indices[0])))
+    return results
+
+
+def decode_predictions(predictions, class_indices, k=TOP_K, abstain_threshold=ABSTAIN_THRESHOLD):
+    return decode_top_k(top_k(predictions, k), class_indices, abstain_threshold)
+
+
+def predict_batch(model, batch):
+    # predict_on_batch skips the tf.data pipeline model.predict builds per call
+    return np.asarray(model.predict_on_batch(batch))
+
+
+def predict_probabilities(model, images, batch_size=32, temperature=1.):
+    predictions = []
+    for start in range(0, len(images), batch_size):
+        with stage("preprocess"):
+            batch = preprocess_images(images[start:start + batch_size], buffer=thread_buffer())
+        with stage("predict"):
+            predictions.append(predict_batch(model, batch))
+    return apply_temperature(np.concatenate(predictions), temperature)
+
+
+def predict_images(model, images, class_indices, batch_size=32, cache=None, temperature=1., k=TOP_K,
+                   abstain_threshold=ABSTAIN_THRESHOLD):
+    # The cache stores calibrated top-k lists, so its namespace must include the temperature
+    if cache is None:
+        return decode_predictions(
+            predict_probabilities(model, images, batch_size, temperature), class_indices, k, abstain_threshold
+        )
+    # Seen images are answered from the cache; repeats within the list run once
+    with stage("upload_read"):
+        blobs = [image_bytes(image) for image in images]
+    top = predict_with_cache(
+        cache,
+        blobs,
+        lambda blobs: predict_probabilities(model, [io.BytesIO(data) for data in blobs], batch_size, temperature),
+    )
+    return decode_top_k([row[:k] for row in top], class_indices, abstain_threshold)
+
+
+def predict_image_class(model, image_path, class_indices, cache=None, temperature=1.):
+    return predict_images(model, [image_path], class_indices, cache=cache, temperature=temperature)[0]
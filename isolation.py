@@ -0,0 +1,32 @@
+import multiprocessing
+import queue
+
+# Runs a function in a fresh spawned process, for measurements that need their own
+# thread pools or memory high-water mark (export_model.py, benchmark.py)
+
+
+def run_isolated(target, args, poll_interval=1.):
+    # Runs target(*args, result_queue) in a spawned process and returns what it puts on the
+    # queue. Raises RuntimeError if the child dies first (missing runtime, OOM kill, bad model
+    # file) instead of waiting forever for a result that will never come.
+    context = multiprocessing.get_context("spawn")
+    result_queue = context.Queue()
+    process = context.Process(target=target, args=args + (result_queue,))
+    process.start()
+    while True:
+        try:
+            # Read before join: a child blocks on exit until its queued result is consumed
+            result = result_queue.get(timeout=poll_interval)
+            break
+        except queue.Empty:
+            if process.is_alive():
+                continue
+            # The result may have been flushed just before the child exited
+            try:
+                result = result_queue.get(timeout=poll_interval)
+                break
+            except queue.Empty:
+                process.join()
+                raise RuntimeError(f"worker process exited with code {process.exitcode} without a result")
+    process.join()
+    return result
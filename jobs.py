@@ -0,0 +1,342 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+from batch_score import decode_batch
+from calibration import ABSTAIN_THRESHOLD, apply_temperature
+from inference import decode_predictions, predict_batch
+from metrics import counter, stage
+from prediction_cache import image_bytes
+from quality import check_quality
+
+# Background jobs for large submissions: images are spooled to disk, tracked in
+# SQLite, and scored in batches by a small worker pool while clients poll for
+# progress and partial results. No broker; the queue survives restarts.
+working_dir = os.path.dirname(os.path.abspath(__file__))
+JOBS_PATH = os.environ.get("PLANT_JOBS_DB", f"{working_dir}/jobs.sqlite3")
+JOBS_DIR = os.environ.get("PLANT_JOBS_DIR", f"{working_dir}/jobs")
+JOB_WORKERS = int(os.environ.get("PLANT_JOB_WORKERS", 2))
+JOB_BATCH_SIZE = int(os.environ.get("PLANT_JOB_BATCH_SIZE", 16))
+# Batches of one job that may be in flight at once, so a huge job cannot take every worker
+JOB_MAX_CONCURRENCY = int(os.environ.get("PLANT_JOB_MAX_CONCURRENCY", 1))
+JOB_MAX_ATTEMPTS = int(os.environ.get("PLANT_JOB_MAX_ATTEMPTS", 3))
+# A claimed batch not completed within this time (e.g. the process died) is handed out again
+JOB_LEASE_SECONDS = float(os.environ.get("PLANT_JOB_LEASE_SECONDS", 300))
+# The Streamlit app runs uploads larger than this as a background job
+JOB_THRESHOLD = int(os.environ.get("PLANT_JOB_THRESHOLD", 20))
+
+TERMINAL = ("done", "cancelled")
+# Where a running image goes when its batch is given back: dropped if the job was cancelled
+# meanwhile, failed once it has used up its attempts, otherwise queued again
+REQUEUE = (
+    "CASE WHEN (SELECT status FROM jobs WHERE id = items.job_id) = 'cancelled' THEN 'cancelled'"
+    " WHEN attempts >= ? THEN 'failed' ELSE 'pending' END"
+)
+JOB_ITEMS = counter("plant_job_items", "Background job images by outcome", ("result",))
+
+
+class JobStore:
+
+    def __init__(self, path=JOBS_PATH, files_dir=JOBS_DIR, max_attempts=JOB_MAX_ATTEMPTS,
+                 lease_seconds=JOB_LEASE_SECONDS):
+        self.files_dir = files_dir
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, status TEXT NOT NULL, created REAL NOT NULL, finished REAL,"
+            " total INTEGER NOT NULL, max_concurrency INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS items ("
+            " job_id TEXT NOT NULL, position INTEGER NOT NULL, name TEXT, path TEXT NOT NULL,"
+            " status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, claim TEXT, lease_until REAL,"
+            " result TEXT, error TEXT, PRIMARY KEY (job_id, position));"
+            "CREATE INDEX IF NOT EXISTS items_status ON items (job_id, status);"
+        )
+
+    def _transaction(self, fn, *args):
+        # BEGIN IMMEDIATE takes the write lock up front, so claims from other processes sharing the file serialise
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(*args)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return result
+
+    def submit(self, images, names=None, max_concurrency=JOB_MAX_CONCURRENCY):
+        # images: paths, file objects or bytes. They are copied into the spool directory
+        # before the job is visible, so callers may discard them right away.
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.files_dir, job_id)
+        os.makedirs(job_dir)
+        names = names or [getattr(image, "name", None) or str(image)[:200] for image in images]
+        rows = []
+        for position, (image, name) in enumerate(zip(images, names)):
+            path = os.path.join(job_dir, str(position))
+            with open(path, "wb") as f:
+                f.write(image_bytes(image))
+            rows.append((job_id, position, name, path, "pending"))
+
+        def insert():
+            self._db.execute(
+                "INSERT INTO jobs (id, status, created, total, max_concurrency) VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, time.time(), len(rows), max(1, max_concurrency)),
+            )
+            self._db.executemany("INSERT INTO items (job_id, position, name, path, status) VALUES (?, ?, ?, ?, ?)", rows)
+
+        self._transaction(insert)
+        return job_id
+
+    def claim(self, batch_size=JOB_BATCH_SIZE):
+        # Returns (job_id, claim, [(position, path), ...]) for the job with the fewest
+        # images in flight, or None when nothing is runnable
+        finished, claimed = self._transaction(self._claim, batch_size)
+        for job_id in finished:
+            self._cleanup(True, job_id)
+        return claimed
+
+    def _claim(self, batch_size):
+        # Expired leases (the worker died or hung) count as an attempt like a released batch,
+        # so an image that keeps killing its worker ends up failed instead of looping forever
+        now = time.time()
+        expired = [job_id for job_id, in self._db.execute(
+            "SELECT DISTINCT job_id FROM items WHERE status = 'running' AND lease_until < ?", (now,)
+        )]
+        self._db.execute(
+            f"UPDATE items SET status = {REQUEUE}, error = 'lease expired', claim = NULL"
+            " WHERE status = 'running' AND lease_until < ?",
+            (self.max_attempts, now),
+        )
+        finished = [job_id for job_id in expired if self._finish_if_done(job_id)]
+        row = self._db.execute(
+            "SELECT j.id FROM jobs j WHERE j.status IN ('queued', 'running')"
+            " AND EXISTS (SELECT 1 FROM items i WHERE i.job_id = j.id AND i.status = 'pending')"
+            " AND (SELECT COUNT(DISTINCT claim) FROM items i WHERE i.job_id = j.id AND i.status = 'running')"
+            "     < j.max_concurrency"
+            " ORDER BY (SELECT COUNT(*) FROM items i WHERE i.job_id = j.id AND i.status = 'running'), j.created"
+            " LIMIT 1"
+        ).fetchone()
+        if row is None:
+            return finished, None
+        job_id = row[0]
+        items = self._db.execute(
+            "SELECT position, path FROM items WHERE job_id = ? AND status = 'pending' ORDER BY position LIMIT ?",
+            (job_id, batch_size),
+        ).fetchall()
+        claim = uuid.uuid4().hex
+        self._db.executemany(
+            "UPDATE items SET status = 'running', claim = ?, lease_until = ?, attempts = attempts + 1"
+            " WHERE job_id = ? AND position = ?",
+            [(claim, now + self.lease_seconds, job_id, position) for position, _ in items],
+        )
+        self._db.execute("UPDATE jobs SET status = 'running' WHERE id = ? AND status = 'queued'", (job_id,))
+        return finished, (job_id, claim, items)
+
+    def complete(self, job_id, claim, results, errors, rejected=None):
+        # results: {position: JSON-serialisable result}; errors: {position: message};
+        # rejected: {position: QualityReport._asdict()} from the quality gate. Failed and
+        # rejected images are final (unreadable or unusable), not retried.
+        def update():
+            self._db.executemany(
+                "UPDATE items SET status = 'done', result = ?, claim = NULL WHERE job_id = ? AND position = ? AND claim = ?",
+                [(json.dumps(result), job_id, position, claim) for position, result in results.items()],
+            )
+            self._db.executemany(
+                "UPDATE items SET status = 'rejected', result = ?, claim = NULL"
+                " WHERE job_id = ? AND position = ? AND claim = ?",
+                [(json.dumps(report), job_id, position, claim) for position, report in (rejected or {}).items()],
+            )
+            self._db.executemany(
+                "UPDATE items SET status = 'failed', error = ?, claim = NULL WHERE job_id = ? AND position = ? AND claim = ?",
+                [(error, job_id, position, claim) for position, error in errors.items()],
+            )
+            return self._finish_if_done(job_id)
+
+        self._cleanup(self._transaction(update), job_id)
+
+    def release(self, job_id, claim, error):
+        # A batch failed as a whole (e.g. the inference queue was full): retry it later,
+        # unless its images have used up their attempts
+        def update():
+            self._db.execute(
+                f"UPDATE items SET status = {REQUEUE}, error = ?, claim = NULL"
+                " WHERE job_id = ? AND claim = ? AND status = 'running'",
+                (self.max_attempts, error, job_id, claim),
+            )
+            return self._finish_if_done(job_id)
+
+        self._cleanup(self._transaction(update), job_id)
+
+    def cancel(self, job_id):
+        # Pending images are dropped; a batch already being scored still records its results,
+        # and the spool is removed once it has (see _finish_if_done)
+        def update():
+            changed = self._db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status NOT IN (?, ?)",
+                (time.time(), job_id) + TERMINAL,
+            ).rowcount
+            self._db.execute("UPDATE items SET status = 'cancelled' WHERE job_id = ? AND status = 'pending'", (job_id,))
+            return bool(changed), self._finish_if_done(job_id)
+
+        cancelled, idle = self._transaction(update)
+        self._cleanup(idle, job_id)
+        return cancelled
+
+    def _finish_if_done(self, job_id):
+        # True once no image of the job is pending or running, i.e. its spooled files can go.
+        # A job that is not cancelled is marked done at that point.
+        remaining = self._db.execute(
+            "SELECT COUNT(*) FROM items WHERE job_id = ? AND status IN ('pending', 'running')", (job_id,)
+        ).fetchone()[0]
+        if remaining:
+            return False
+        self._db.execute(
+            "UPDATE jobs SET status = 'done', finished = ? WHERE id = ? AND status NOT IN (?, ?)",
+            (time.time(), job_id) + TERMINAL,
+        )
+        return True
+
+    def _cleanup(self, finished, job_id):
+        # Results live in SQLite; the spooled images are only needed until the job ends
+        if finished:
+            shutil.rmtree(os.path.join(self.files_dir, job_id), ignore_errors=True)
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._db.execute(
+                "SELECT id, status, created, finished, total, max_concurrency FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if job is None:
+                return None
+            counts = dict(self._db.execute(
+                "SELECT status, COUNT(*) FROM items WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall())
+        status = dict(zip(("id", "status", "created", "finished", "total", "max_concurrency"), job))
+        status["counts"] = {name: counts.get(name, 0) for name in ("pending", "running", "done", "rejected", "failed", "cancelled")}
+        return status
+
+    def results(self, job_id, after=-1):
+        # Finished images with position > after, in submission order, for incremental polling.
+        # "result" holds the prediction of a done image and the quality report of a rejected one.
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT position, name, status, result, error FROM items"
+                " WHERE job_id = ? AND position > ? AND status IN ('done', 'rejected', 'failed') ORDER BY position",
+                (job_id, after),
+            ).fetchall()
+        return [
+            {"position": position, "name": name, "status": status,
+             **({"result": json.loads(result)} if result is not None else {"error": error})}
+            for position, name, status, result, error in rows
+        ]
+
+
+class JobWorkerPool:
+    # Worker threads that claim batches from a JobStore and score them. model is usually
+    # the shared MicroBatcher so job batches queue behind interactive requests; yield_to
+    # returns True while interactive work is waiting, and workers hold off until it clears.
+
+    def __init__(self, store, model, class_indices, workers=JOB_WORKERS, batch_size=JOB_BATCH_SIZE, temperature=1.,
+                 abstain_threshold=ABSTAIN_THRESHOLD, quality_thresholds=None, yield_to=None, poll_interval=0.5):
+        self.store = store
+        self.model = model
+        self.class_indices = class_indices
+        self.batch_size = batch_size
+        self.temperature = temperature
+        self.abstain_threshold = abstain_threshold
+        self.quality_thresholds = quality_thresholds
+        self.yield_to = yield_to
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True) for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, images, names=None, max_concurrency=JOB_MAX_CONCURRENCY):
+        job_id = self.store.submit(images, names, max_concurrency)
+        self._wake.set()
+        return job_id
+
+    def close(self):
+        self._stopped.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            if self.yield_to is not None and self.yield_to():
+                time.sleep(0.01)
+                continue
+            claimed = self.store.claim(self.batch_size)
+            if claimed is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            job_id, claim, items = claimed
+            try:
+                results, rejected, errors = self._score(items)
+            except Exception as e:
+                JOB_ITEMS.inc(len(items), result="retried")
+                self.store.release(job_id, claim, f"{type(e).__name__}: {e}")
+                continue
+            JOB_ITEMS.inc(len(results), result="done")
+            JOB_ITEMS.inc(len(rejected), result="rejected")
+            JOB_ITEMS.inc(len(errors), result="failed")
+            self.store.complete(job_id, claim, results, errors, rejected)
+
+    def _score(self, items):
+        paths = dict((path, position) for position, path in items)
+        rejected, errors = {}, {}
+        if self.quality_thresholds is not None:
+            with stage("quality_gate"):
+                for path, position in list(paths.items()):
+                    try:
+                        report = check_quality(path, self.quality_thresholds)
+                    except (OSError, ValueError) as e:
+                        errors[position] = str(e)
+                        del paths[path]
+                        continue
+                    if not report.ok:
+                        rejected[position] = report._asdict()
+                        del paths[path]
+        with stage("preprocess"):
+            batch, decoded, decode_errors = decode_batch(list(paths), draft=False)
+        errors.update((paths[path], error) for path, error in decode_errors.items())
+        results = {}
+        if decoded:
+            with stage("predict"):
+                predictions = apply_temperature(predict_batch(self.model, batch), self.temperature)
+            for path, result in zip(decoded, decode_predictions(
+                    predictions, self.class_indices, abstain_threshold=self.abstain_threshold)):
+                results[paths[path]] = result._asdict()
+        return results, rejected, errors
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_job_pool(key, model, class_indices, **config):
+    # One store and worker pool per model path in the process, like batching.get_batcher
+    with _pools_lock:
+        entry = _pools.get(key)
+        if entry is not None and entry[0] is model:
+            return entry[1]
+        if entry is not None:
+            entry[1].close()
+        pool = JobWorkerPool(JobStore(), model, class_indices, **config)
+        _pools[key] = (model, pool)
+        return pool
@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+from backends import load_backend
+from metrics import gauge
+
+# Process-wide model registry.
+# Streamlit re-executes app.py on every widget interaction, but imported
+# modules stay in sys.modules, so models held here are loaded once per
+# process and shared by every session.
+_lock = threading.Lock()
+_models = {}
+_path_locks = {}
+_loading = {}
+_errors = {}
+
+# Startup timings in seconds since this module was first imported
+_started = time.perf_counter()
+_startup = {}
+STARTUP_SECONDS = gauge(
+    "plant_startup_seconds", "Seconds from process start to each startup milestone", ("event",)
+)
+
+
+def _file_key(path):
+    # mtime + size identifies a model file without hashing ~267 MB on each rerun
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _path_lock(path):
+    # Loads of the same file are serialised; lookups and other paths are not blocked
+    with _lock:
+        return _path_locks.setdefault(path, threading.Lock())
+
+
+def warmup(model, input_shape=(1, 224, 224, 3)):
+    # One dummy forward pass so graph tracing happens before the first user click
+    model.predict_on_batch(np.zeros(input_shape, dtype=np.float32))
+    return model
+
+
+def get_model(path, loader=load_backend, warm=True):
+    path = os.path.abspath(path)
+    key = _file_key(path)
+    with _path_lock(path):
+        entry = _models.get(path)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        model = loader(path)
+        if warm:
+            warmup(model)
+        with _lock:
+            _models[path] = (key, model)
+        mark_startup("model_ready")
+        return model
+
+
+def reload(path, loader=load_backend, warm=True):
+    path = os.path.abspath(path)
+    with _lock:
+        _models.pop(path, None)
+    return get_model(path, loader=loader, warm=warm)
+
+
+def _background_load(path, key, loader, warm):
+    try:
+        get_model(path, loader=loader, warm=warm)
+        _errors.pop(path, None)
+    except Exception as e:
+        # Remembered per file version so a broken file is not retried on every rerun
+        _errors[path] = (key, e)
+
+
+def load_in_background(path, loader=load_backend, warm=True):
+    # Starts loading (or reloading a changed file) without blocking the caller
+    path = os.path.abspath(path)
+    try:
+        key = _file_key(path)
+    except OSError as e:
+        # A missing or unreadable file is reported through load_error like a failed load;
+        # once it appears, its key no longer matches and loading starts
+        _errors[path] = (None, e)
+        return
+    with _lock:
+        entry = _models.get(path)
+        if entry is not None and entry[0] == key:
+            return
+        thread = _loading.get(path)
+        if thread is not None and thread.is_alive():
+            return
+        error = _errors.get(path)
+        if error is not None and error[0] == key:
+            return
+        thread = threading.Thread(target=_background_load, args=(path, key, loader, warm), name="model-loader", daemon=True)
+        _loading[path] = thread
+        thread.start()
+
+
+def peek_model(path):
+    # The loaded model for path, or None while it is still loading
+    with _lock:
+        entry = _models.get(os.path.abspath(path))
+        return entry[1] if entry is not None else None
+
+
+def wait_until_ready(path, timeout=None):
+    with _lock:
+        thread = _loading.get(os.path.abspath(path))
+    if thread is not None:
+        thread.join(timeout)
+    return peek_model(path) is not None
+
+
+def load_error(path):
+    error = _errors.get(os.path.abspath(path))
+    return error[1] if error is not None else None
+
+
+def mark_startup(event):
+    # Records only the first occurrence, e.g. first_paint, model_ready, first_prediction;
+    # returns True when this call recorded it
+    with _lock:
+        if event in _startup:
+            return False
+        _startup[event] = time.perf_counter() - _started
+    STARTUP_SECONDS.set(_startup[event], event=event)
+    return True
+
+
+def startup_metrics():
+    with _lock:
+        return dict(_startup)
+
+
+def model_version(path):
+    # Short tag for the loaded file version (or the file on disk), used to namespace caches
+    path = os.path.abspath(path)
+    with _lock:
+        entry = _models.get(path)
+    mtime_ns, size = entry[0] if entry is not None else _file_key(path)
+    return f"{mtime_ns:x}-{size:x}"
+
+
+def loaded_models():
+    with _lock:
+        return {path: key for path, (key, _) in _models.items()}
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import counter
+
+TOP_K = 5
+CACHE_SIZE = int(os.environ.get("PLANT_PREDICTION_CACHE_SIZE", 1024))
+CACHE_TTL = float(os.environ.get("PLANT_PREDICTION_CACHE_TTL", 24 * 3600))
+# Empty means memory only
+CACHE_PATH = os.environ.get("PLANT_PREDICTION_CACHE", "")
+# Expired rows are deleted from the SQLite table at most this often
+PRUNE_INTERVAL = 60.
+
+LOOKUPS = counter("plant_prediction_cache_lookups", "Prediction cache lookups by result", ("result",))
+
+
+def image_bytes(image):
+    # Accepts paths, Streamlit UploadedFile / BytesIO objects and raw bytes
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    if hasattr(image, "getvalue"):
+        return image.getvalue()
+    if hasattr(image, "read"):
+        position = image.tell()
+        data = image.read()
+        image.seek(position)
+        return data
+    with open(image, "rb") as f:
+        return f.read()
+
+
+def top_k(predictions, k=TOP_K):
+    # [(class_index, probability), ...] per row, most likely first. argpartition
+    # selects the k largest in linear time; only those k are then sorted.
+    k = min(k, predictions.shape[1])
+    indices = np.argpartition(-predictions, k - 1, axis=1)[:, :k]
+    probabilities = np.take_along_axis(predictions, indices, axis=1)
+    order = np.argsort(-probabilities, axis=1, kind="stable")
+    indices = np.take_along_axis(indices, order, axis=1)
+    probabilities = np.take_along_axis(probabilities, order, axis=1)
+    return [
+        [(int(idx), float(prob)) for idx, prob in zip(row_indices, row_probabilities)]
+        for row_indices, row_probabilities in zip(indices, probabilities)
+    ]
+
+
+class PredictionCache:
+    # Bounded LRU of top-k predictions keyed by a hash of the image bytes,
+    # optionally backed by SQLite so results survive restarts
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL, path=CACHE_PATH, namespace=""):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._pruned = 0.
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.executescript(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                " key TEXT PRIMARY KEY, created REAL NOT NULL, top_k TEXT NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS predictions_created ON predictions (created);"
+            )
+
+    def key(self, data):
+        # namespace keeps results from different model files apart
+        return f"{self.namespace}:{hashlib.blake2b(data, digest_size=16).hexdigest()}"
+
+    def _expired(self, created):
+        return time.time() - created > self.ttl
+
+    def _remember(self, key, created, value):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None and self._db is not None:
+                row = self._db.execute("SELECT created, top_k FROM predictions WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    entry = (row[0], [tuple(pair) for pair in json.loads(row[1])])
+            if entry is None or self._expired(entry[0]):
+                self._memory.pop(key, None)
+                self.misses += 1
+                LOOKUPS.inc(result="miss")
+                return None
+            self._remember(key, *entry)
+            self.hits += 1
+            LOOKUPS.inc(result="hit")
+            return entry[1]
+
+    def set(self, key, value):
+        created = time.time()
+        with self._lock:
+            self._remember(key, created, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?)", (key, created, json.dumps(value))
+                )
+                if created - self._pruned >= PRUNE_INTERVAL:
+                    # An index range scan over the expired rows, not a pass over the whole table
+                    self._db.execute("DELETE FROM predictions WHERE created < ?", (created - self.ttl,))
+                    self._pruned = created
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._memory), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+def predict_with_cache(cache, images, predict_fn):
+    # images: list of encoded image bytes. Only images not already cached are
+    # passed to predict_fn, and duplicates within the list are predicted once.
+    # predict_fn may return an exception in place of the row of an image it could not
+    # read; that image gets the exception as its result and nothing is cached for it.
+    keys = [cache.key(data) for data in images]
+    results = {}
+    missing = {}
+    for key, data in zip(keys, images):
+        if key in results or key in missing:
+            continue
+        cached = cache.get(key)
+        if cached is not None:
+            results[key] = cached
+        else:
+            missing[key] = data
+    if missing:
+        predictions = predict_fn(list(missing.values()))
+        readable = []
+        for key, row in zip(missing, predictions):
+            if isinstance(row, Exception):
+                results[key] = row
+            else:
+                readable.append((key, row))
+        if readable:
+            for (key, _), value in zip(readable, top_k(np.stack([row for _, row in readable]))):
+                cache.set(key, value)
+                results[key] = value
+    return [results[key] for key in keys]
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_prediction_cache(namespace=""):
+    # Shared per namespace (usually the model file version) within the process
+    with _caches_lock:
+        if namespace not in _caches:
+            _caches[namespace] = PredictionCache(namespace=namespace)
+        return _caches[namespace]
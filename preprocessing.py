@@ -0,0 +1,80 @@
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+IMAGE_SIZE = (224, 224)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def list_images(directory, limit=None):
+    paths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(root, name))
+    paths.sort()
+    return paths[:limit] if limit else paths
+
+
+def fit_rgb(img, target_size=IMAGE_SIZE):
+    # Grayscale, palette, RGBA and CMYK uploads all become 3-channel RGB;
+    # alpha is dropped rather than composited
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return img.resize(target_size, Image.Resampling.BICUBIC)
+
+
+def decode_rgb(image_path, target_size=IMAGE_SIZE, draft=False):
+    img = Image.open(image_path)
+    if draft and img.format == "JPEG":
+        # Let libjpeg decode at 1/2, 1/4 or 1/8 scale while staying at least 2x the
+        # target size; much cheaper for phone photos but not bit-identical
+        img.draft("RGB", (target_size[0] * 2, target_size[1] * 2))
+    return fit_rgb(img, target_size)
+
+
+def normalize_into(out, img):
+    # One uint8 view of the PIL buffer, then a cast and an in-place divide with no temporaries
+    np.copyto(out, np.asarray(img), casting="unsafe")
+    np.divide(out, 255., out=out)
+    return out
+
+
+def preprocess_into(out, image_path, draft=False):
+    # Writes one image into a preallocated (H, W, 3) float32 slot.
+    # image_path may also be an already decoded PIL image, e.g. a video frame.
+    target_size = (out.shape[1], out.shape[0])
+    if isinstance(image_path, Image.Image):
+        img = fit_rgb(image_path, target_size)
+    else:
+        img = decode_rgb(image_path, target_size, draft)
+    return normalize_into(out, img)
+
+
+class PreprocessBuffer:
+    # Reusable float32 batch buffer; grows on demand and never shrinks
+
+    def __init__(self, capacity=32, target_size=IMAGE_SIZE):
+        self.target_size = target_size
+        self._array = np.empty((capacity, target_size[1], target_size[0], 3), dtype=np.float32)
+
+    def fill(self, images, draft=False):
+        # The returned view is overwritten by the next fill() on this buffer
+        if len(images) > len(self._array):
+            self._array = np.empty((len(images),) + self._array.shape[1:], dtype=np.float32)
+        batch = self._array[:len(images)]
+        for slot, image in zip(batch, images):
+            preprocess_into(slot, image, draft)
+        return batch
+
+
+_local = threading.local()
+
+
+def thread_buffer(target_size=IMAGE_SIZE):
+    buffer = getattr(_local, "buffer", None)
+    if buffer is None or buffer.target_size != target_size:
+        buffer = _local.buffer = PreprocessBuffer(target_size=target_size)
+    return buffer
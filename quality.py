@@ -0,0 +1,67 @@
+import io
+import os
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+from metrics import counter
+from prediction_cache import image_bytes
+
+# Cheap checks run on a small thumbnail before an image costs a forward pass
+QUALITY_GATE = os.environ.get("PLANT_QUALITY_GATE", "1") == "1"
+THUMBNAIL_SIZE = 128
+
+Thresholds = namedtuple("Thresholds", "min_sharpness min_brightness max_brightness min_plant_ratio")
+DEFAULT_THRESHOLDS = Thresholds(
+    # Variance of the Laplacian on the grayscale thumbnail; low means blurry
+    min_sharpness=float(os.environ.get("PLANT_MIN_SHARPNESS", 5)),
+    # Mean grayscale level, 0-255
+    min_brightness=float(os.environ.get("PLANT_MIN_BRIGHTNESS", 40)),
+    max_brightness=float(os.environ.get("PLANT_MAX_BRIGHTNESS", 225)),
+    # Share of green or yellow-green pixels; diseased leaves are still mostly plant-coloured
+    min_plant_ratio=float(os.environ.get("PLANT_MIN_PLANT_RATIO", 0.1)),
+)
+
+# reasons lists why the image was rejected: "blurry", "too_dark", "too_bright", "not_a_leaf"
+QualityReport = namedtuple("QualityReport", "ok reasons sharpness brightness plant_ratio")
+
+REJECTIONS = counter("plant_quality_rejections", "Images rejected before inference by reason", ("reason",))
+
+
+def thumbnail(image, size=THUMBNAIL_SIZE):
+    img = Image.open(io.BytesIO(image_bytes(image)))
+    # JPEG decodes straight to a reduced scale, so the full photo is never materialised
+    img.draft("RGB", (size, size))
+    img = img.convert("RGB")
+    img.thumbnail((size, size), Image.Resampling.BILINEAR)
+    return np.asarray(img, dtype=np.float32)
+
+
+def laplacian_variance(gray):
+    laplacian = gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:] - 4 * gray[1:-1, 1:-1]
+    return float(laplacian.var())
+
+
+def plant_ratio(rgb):
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    # Green dominates blue and is not far below red (yellowing leaves)
+    return float(np.mean((g > b + 10) & (g > 0.8 * r)))
+
+
+def check_quality(image, thresholds=DEFAULT_THRESHOLDS):
+    rgb = thumbnail(image)
+    gray = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    report = dict(sharpness=laplacian_variance(gray), brightness=float(gray.mean()), plant_ratio=plant_ratio(rgb))
+    reasons = []
+    if report["sharpness"] < thresholds.min_sharpness:
+        reasons.append("blurry")
+    if report["brightness"] < thresholds.min_brightness:
+        reasons.append("too_dark")
+    elif report["brightness"] > thresholds.max_brightness:
+        reasons.append("too_bright")
+    if report["plant_ratio"] < thresholds.min_plant_ratio:
+        reasons.append("not_a_leaf")
+    for reason in reasons:
+        REJECTIONS.inc(reason=reason)
+    return QualityReport(not reasons, reasons, **report)
@@ -0,0 +1,516 @@
+import argparse
+import io
+import json
+import os
+import queue
+import time
+import traceback
+from email.parser import BytesParser
+from email.policy import HTTP
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+from PIL import UnidentifiedImageError
+
+from backends import memory_usage
+from batching import MAX_BATCH_SIZE, MAX_QUEUE_SIZE, MAX_WAIT_MS, MicroBatcher
+from calibration import ABSTAIN_THRESHOLD, CALIBRATION_PATH, apply_temperature, load_temperature
+from class_registry import ClassRegistry, load_registry
+from embeddings import EMBEDDINGS_DIR, EmbeddingIndex, normalize
+from inference import Prediction, decode_predictions, decode_top_k, load_and_preprocess_image, predict_batch
+from jobs import JOB_MAX_CONCURRENCY, JOB_WORKERS, TERMINAL, JobStore, JobWorkerPool
+from metrics import render, stage
+from model_registry import get_model, mark_startup, model_version
+from prediction_cache import get_prediction_cache, predict_with_cache
+from quality import DEFAULT_THRESHOLDS, QUALITY_GATE, QualityReport, check_quality
+from tiling import analyze_tiled
+from translation import backend_stats
+from tta import TTA_AGGREGATION, TTA_VIEWS, build_views, check_views, predict_views
+
+working_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_multipart(content_type, body):
+    # Returns (filename, bytes) for every file part of a multipart/form-data body
+    message = BytesParser(policy=HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body
+    )
+    return [
+        (part.get_filename() or part.get_param("name", header="content-disposition"), part.get_payload(decode=True))
+        for part in message.iter_parts()
+        if part.get_payload(decode=True)
+    ]
+
+
+def format_result(result, registry):
+    record = registry[result.class_index]
+    info = None
+    if record.description:
+        info = {"name": record.title, "description": record.description, "symptoms": list(record.symptoms),
+                "cure": list(record.cure)}
+    return {
+        "class": record.key,
+        "label": record.label,
+        "confidence": round(result.confidence, 4),
+        "rejected": False,
+        "abstain": result.abstain,
+        "top_k": [{"class": name, "confidence": round(confidence, 4)} for name, confidence in result.top_k],
+        "info": info,
+    }
+
+
+def format_tiled(result, registry):
+    heatmap = np.round(result.heatmap, 4)
+    return dict(
+        format_result(result.verdict, registry),
+        grid=list(heatmap.shape),
+        scale=round(result.scale, 4),
+        # Probability that each tile is diseased, row by row; null for background tiles
+        heatmap=[[None if np.isnan(value) else float(value) for value in row] for row in heatmap],
+        disease_tiles=dict(result.disease_tiles.most_common()),
+    )
+
+
+def format_job_item(item, registry):
+    # The same entry /predict returns for the image, plus its file name and position
+    if item["status"] == "done":
+        entry = format_result(Prediction(**item["result"]), registry)
+    elif item["status"] == "rejected":
+        entry = format_rejection(QualityReport(**item["result"]))
+    else:
+        entry = {"error": item["error"]}
+    return dict(entry, file=item["name"], position=item["position"])
+
+
+def format_similar(cases, registry):
+    return [
+        {"file": case["name"], "class": registry[case["class_index"]].key, "label": registry[case["class_index"]].label,
+         "confidence": case["confidence"], "similarity": round(case["similarity"], 4)}
+        for case in cases
+    ]
+
+
+def format_with_similar(pair, registry):
+    result, cases = pair
+    return dict(format_result(result, registry), similar=format_similar(cases, registry))
+
+
+def format_error(error):
+    # PIL's "cannot identify image file" message embeds the repr of the BytesIO it was given
+    message = "unrecognised image format" if isinstance(error, UnidentifiedImageError) else str(error)
+    return {"error": f"could not read image: {message}"}
+
+
+def decode_image(data):
+    return load_and_preprocess_image(io.BytesIO(data))[0]
+
+
+def format_rejection(report):
+    return {
+        "rejected": True,
+        "reasons": report.reasons,
+        "quality": {
+            "sharpness": round(report.sharpness, 2),
+            "brightness": round(report.brightness, 2),
+            "plant_ratio": round(report.plant_ratio, 4),
+        },
+    }
+
+
+class InferenceService:
+    # Keeps the model resident and routes every request through one shared micro-batcher
+
+    def __init__(self, model, class_indices, cache=None, temperature=1., abstain_threshold=ABSTAIN_THRESHOLD,
+                 quality_thresholds=DEFAULT_THRESHOLDS, job_store=None, job_workers=JOB_WORKERS, embedding_index=None,
+                 **batch_config):
+        self.model = model
+        # class_indices: a ClassRegistry or the class_indices.json mapping
+        self.registry = class_indices if isinstance(class_indices, ClassRegistry) else ClassRegistry(class_indices)
+        self.cache = cache
+        self.temperature = temperature
+        self.abstain_threshold = abstain_threshold
+        # None turns the pre-inference quality gate off
+        self.quality_thresholds = quality_thresholds
+        # Models that expose their penultimate layer answer ?similar=K from the prediction pass
+        self.embedding_index = embedding_index if getattr(model, "supports_embeddings", False) else None
+        self.batcher = MicroBatcher(
+            lambda batch: predict_batch(model, batch),
+            embed_fn=model.predict_with_embeddings if self.embedding_index is not None else None,
+            **batch_config,
+        )
+        # Background jobs share the batcher but hold off while interactive requests are queued
+        self.jobs = None
+        if job_store is not None:
+            self.jobs = JobWorkerPool(
+                job_store, self.batcher, self.registry, job_workers, temperature=temperature,
+                abstain_threshold=abstain_threshold, quality_thresholds=quality_thresholds,
+                yield_to=lambda: self.batcher.queue_depth() > 0,
+            )
+
+    def _decode(self, images, decode_fn):
+        # Each upload is decoded on its own, like batch_score.decode_batch, so an unreadable
+        # file only fails itself. Returns the arrays, the positions they came from, and
+        # {position: error} for the rest.
+        arrays, decoded, errors = [], [], {}
+        with stage("preprocess"):
+            for i, data in enumerate(images):
+                try:
+                    arrays.append(decode_fn(data))
+                except (OSError, ValueError) as e:
+                    errors[i] = e
+                    continue
+                decoded.append(i)
+        return arrays, decoded, errors
+
+    def _predict_probabilities(self, arrays):
+        with stage("predict"):
+            # All of the request is queued or none of it; queue.Full or TimeoutError becomes a 503
+            predictions = np.stack(self.batcher.gather(self.batcher.submit_many(arrays)))
+        return apply_temperature(predictions, self.temperature)
+
+    def _predict_with_embeddings(self, arrays):
+        with stage("predict"):
+            predictions, embeddings = zip(*self.batcher.gather(self.batcher.submit_many(arrays, embedding=True)))
+        return apply_temperature(np.stack(predictions), self.temperature), normalize(np.stack(embeddings))
+
+    def _cached_probabilities(self, images):
+        # For predict_with_cache: one row per image, or its decode error in place of the row
+        arrays, decoded, errors = self._decode(images, decode_image)
+        rows = [errors.get(i) for i in range(len(images))]
+        if arrays:
+            for i, row in zip(decoded, self._predict_probabilities(arrays)):
+                rows[i] = row
+        return rows
+
+    def _analyze_tiled(self, data):
+        # Each photo is decoded and tiled separately, so a bad one only fails itself
+        try:
+            return analyze_tiled(self.batcher, data, self.registry, temperature=self.temperature,
+                                 abstain_threshold=self.abstain_threshold)
+        except TimeoutError:
+            # An OSError subclass, but a busy server rather than a bad file
+            raise
+        except (OSError, ValueError) as e:
+            return e
+
+    def _predict(self, images, tta=None, tiled=False, similar=0):
+        # One result per image, or the exception raised while decoding it
+        if tiled:
+            return [self._analyze_tiled(data) for data in images]
+        if self.cache is not None and tta is None and not similar:
+            results = predict_with_cache(self.cache, images, self._cached_probabilities)
+            readable = [i for i, top in enumerate(results) if not isinstance(top, Exception)]
+            decoded = decode_top_k([results[i] for i in readable], self.registry, self.abstain_threshold)
+            for i, result in zip(readable, decoded):
+                results[i] = result
+            return results
+        # Views of a TTA request go to the shared batcher together and usually share one forward pass
+        decode_fn = decode_image if tta is None else partial(build_views, views=tta[0])
+        arrays, decoded, errors = self._decode(images, decode_fn)
+        results = [errors.get(i) for i in range(len(images))]
+        if not arrays:
+            return results
+        if similar:
+            # Similar cases need this image's embedding, so the prediction cache is bypassed
+            probabilities, embeddings = self._predict_with_embeddings(arrays)
+            predictions = decode_predictions(probabilities, self.registry, abstain_threshold=self.abstain_threshold)
+            predictions = list(zip(predictions, self.embedding_index.similar(embeddings, similar)))
+        elif tta is not None:
+            predictions = predict_views(self.batcher, np.concatenate(arrays), self.registry, *tta, self.temperature,
+                                        abstain_threshold=self.abstain_threshold)
+        else:
+            predictions = decode_predictions(
+                self._predict_probabilities(arrays), self.registry, abstain_threshold=self.abstain_threshold
+            )
+        for i, prediction in zip(decoded, predictions):
+            results[i] = prediction
+        return results
+
+    def predict(self, images, tta=None, tiled=False, similar=0):
+        # tta: (views, aggregation) for test-time augmentation, None for a single view.
+        # tiled: classify overlapping patches of the full-resolution photo instead.
+        # similar: also return this many similar past cases from the embedding index.
+        format_fn = format_with_similar if similar else format_tiled if tiled else format_result
+        # One entry per image: a result, reject reasons from the quality gate, or a read error
+        entries = [None] * len(images)
+        accepted = []
+        for i, data in enumerate(images):
+            if self.quality_thresholds is not None:
+                # Unusable images are answered with reject reasons and never reach the model
+                try:
+                    with stage("quality_gate"):
+                        report = check_quality(data, self.quality_thresholds)
+                except (OSError, ValueError) as e:
+                    entries[i] = format_error(e)
+                    continue
+                if not report.ok:
+                    entries[i] = format_rejection(report)
+                    continue
+            accepted.append(i)
+        if accepted:
+            results = self._predict([images[i] for i in accepted], tta, tiled, similar)
+            for i, result in zip(accepted, results):
+                entries[i] = format_error(result) if isinstance(result, Exception) else format_fn(result, self.registry)
+        return entries
+
+    def stats(self):
+        stats = {"batcher": self.batcher.stats(), "memory_mb": memory_usage(), "translation": backend_stats()}
+        if self.cache is not None:
+            stats["prediction_cache"] = self.cache.stats()
+        if self.embedding_index is not None:
+            stats["embedding_index"] = {"rows": len(self.embedding_index), "dim": self.embedding_index.dim}
+        return stats
+
+    def close(self):
+        if self.jobs is not None:
+            self.jobs.close()
+        self.batcher.close()
+
+
+class PredictHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def _send_text(self, status, text, content_type="text/plain; version=0.0.4; charset=utf-8"):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_images(self):
+        # (names, images) from a multipart or raw image body; None after sending a 400
+        content_type = self.headers.get("Content-Type", "")
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not body:
+            self._send_json(400, {"error": "empty request body"})
+            return None
+        if content_type.startswith("multipart/form-data"):
+            files = parse_multipart(content_type, body)
+            if not files:
+                self._send_json(400, {"error": "no files in multipart body"})
+                return None
+            return tuple(zip(*files))
+        return (None,), (body,)
+
+    def _int_param(self, query, name, default, minimum):
+        # An integer query parameter; None after sending a 400
+        value = parse_qs(query).get(name, [str(default)])[0]
+        try:
+            number = int(value)
+        except ValueError:
+            number = None
+        if number is None or number < minimum:
+            self._send_json(400, {"error": f"{name} must be an integer >= {minimum}"})
+            return None
+        return number
+
+    def _job(self, path):
+        # /jobs/<id>[/<action>] -> (status, action), or None after sending a 404
+        parts = path.strip("/").split("/")
+        status = None
+        if self.service.jobs is not None and len(parts) in (2, 3):
+            status = self.service.jobs.store.status(parts[1])
+        if status is None:
+            self._send_json(404, {"error": "no such job"})
+            return None
+        return status, parts[2] if len(parts) == 3 else None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif url.path == "/stats":
+            self._send_json(200, self.service.stats())
+        elif url.path == "/metrics":
+            self._send_text(200, render())
+        elif url.path.startswith("/jobs/"):
+            job = self._job(url.path)
+            if job is None:
+                return
+            status, action = job
+            if action is None:
+                self._send_json(200, status)
+            elif action == "results":
+                # ?after=<position> returns only results finished since the last poll
+                after = self._int_param(url.query, "after", -1, -1)
+                if after is None:
+                    return
+                self._send_json(200, dict(status, results=self._job_results(status["id"], after)))
+            elif action == "events":
+                self._stream_job(status)
+            else:
+                self._send_json(404, {"error": "not found"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _job_results(self, job_id, after):
+        store, registry = self.service.jobs.store, self.service.registry
+        return [format_job_item(item, registry) for item in store.results(job_id, after)]
+
+    def _stream_job(self, status, interval=1.):
+        # Newline-delimited JSON: a status line plus any new results every interval, until the job ends
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        after = -1
+        while True:
+            results = self._job_results(status["id"], after)
+            if results:
+                after = results[-1]["position"]
+            self.wfile.write(json.dumps(dict(status, results=results), ensure_ascii=False).encode("utf-8") + b"\n")
+            self.wfile.flush()
+            if status["status"] in TERMINAL:
+                return
+            time.sleep(interval)
+            status = self.service.jobs.store.status(status["id"])
+
+    def do_DELETE(self):
+        url = urlsplit(self.path)
+        if not url.path.startswith("/jobs/"):
+            self._send_json(404, {"error": "not found"})
+            return
+        job = self._job(url.path)
+        if job is not None:
+            cancelled = self.service.jobs.store.cancel(job[0]["id"])
+            self._send_json(200, dict(self.service.jobs.store.status(job[0]["id"]), cancelled=cancelled))
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path == "/jobs" and self.service.jobs is not None:
+            self._submit_job(url)
+            return
+        if url.path != "/predict":
+            self._send_json(404, {"error": "not found"})
+            return
+        # /predict?tta=1[&views=identity,hflip][&aggregation=geometric], /predict?tiles=1 or /predict?similar=K
+        params = parse_qs(url.query)
+        tiled = params.get("tiles", ["0"])[0] in ("1", "true")
+        similar = self._int_param(url.query, "similar", 0, 0)
+        if similar is None:
+            return
+        if similar and self.service.embedding_index is None:
+            self._send_json(400, {"error": "similar cases need an embedding index and a model with an embedding output"})
+            return
+        tta = None
+        if params.get("tta", ["0"])[0] in ("1", "true"):
+            views = tuple(params["views"][0].split(",")) if "views" in params else TTA_VIEWS
+            tta = (views, params.get("aggregation", [TTA_AGGREGATION])[0])
+            try:
+                check_views(*tta)
+            except ValueError as e:
+                self._send_json(400, {"error": str(e)})
+                return
+        if similar and (tta or tiled):
+            self._send_json(400, {"error": "similar cannot be combined with tta or tiles"})
+            return
+        files = self._read_images()
+        if files is None:
+            return
+        names, images = files
+
+        try:
+            results = self.service.predict(images, tta, tiled, similar)
+        except (queue.Full, TimeoutError):
+            self._send_json(503, {"error": "inference queue is full, retry later"})
+            return
+        except Exception as e:
+            self.log_error("prediction failed: %s: %s", type(e).__name__, e)
+            traceback.print_exc()
+            self._send_json(500, {"error": "internal error during prediction"})
+            return
+
+        mark_startup("first_prediction")
+        # Unreadable files in a multipart batch get an error entry next to the other results
+        if self.headers.get("Content-Type", "").startswith("multipart/form-data"):
+            self._send_json(200, {"results": [dict(result, file=name) for name, result in zip(names, results)]})
+        else:
+            self._send_json(400 if "error" in results[0] else 200, results[0])
+
+    def _submit_job(self, url):
+        # POST /jobs[?max_concurrency=N]: spools the images and returns 202 with the job id right away
+        max_concurrency = self._int_param(url.query, "max_concurrency", JOB_MAX_CONCURRENCY, 1)
+        if max_concurrency is None:
+            return
+        files = self._read_images()
+        if files is None:
+            return
+        names, images = files
+        # Clients may lower their own concurrency but not raise it above the server limit
+        job_id = self.service.jobs.submit(
+            list(images), [name or str(i) for i, name in enumerate(names)], min(max_concurrency, JOB_MAX_CONCURRENCY)
+        )
+        self._send_json(202, dict(
+            self.service.jobs.store.status(job_id), status_url=f"/jobs/{job_id}", results_url=f"/jobs/{job_id}/results",
+            events_url=f"/jobs/{job_id}/events",
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP inference service for the plant disease classifier")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--model", default=f"{working_dir}/plant_disease_prediction_model.h5")
+    parser.add_argument("--class-indices", default=f"{working_dir}/class_indices.json")
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    parser.add_argument("--max-queue-size", type=int, default=MAX_QUEUE_SIZE)
+    parser.add_argument("--calibration", default=CALIBRATION_PATH, help="temperature file from calibration.py")
+    parser.add_argument("--abstain-threshold", type=float, default=ABSTAIN_THRESHOLD,
+                        help="top-1 probability below which results are flagged for a retake")
+    parser.add_argument("--no-quality-gate", action="store_true", default=not QUALITY_GATE,
+                        help="send every image to the model, even blurry, dark or non-leaf ones")
+    parser.add_argument("--job-workers", type=int, default=JOB_WORKERS,
+                        help="threads scoring background jobs from /jobs; 0 disables the endpoint")
+    parser.add_argument("--embeddings", default=EMBEDDINGS_DIR,
+                        help="similar-case index built with embeddings.py; enables /predict?similar=K")
+    args = parser.parse_args()
+
+    temperature = load_temperature(args.calibration)
+    registry = load_registry(args.class_indices)
+    missing = registry.missing_info()
+    if missing:
+        print(f"{len(missing)} of {len(registry)} classes have no disease information: {', '.join(missing)}")
+    service = InferenceService(
+        get_model(args.model),
+        registry,
+        # Cached top-k lists are calibrated, so a new temperature gets its own namespace
+        cache=get_prediction_cache(f"{model_version(args.model)}-t{temperature:g}"),
+        temperature=temperature,
+        abstain_threshold=args.abstain_threshold,
+        quality_thresholds=None if args.no_quality_gate else DEFAULT_THRESHOLDS,
+        job_store=JobStore() if args.job_workers else None,
+        job_workers=args.job_workers,
+        embedding_index=EmbeddingIndex(args.embeddings) if os.path.isdir(args.embeddings) else None,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        max_queue_size=args.max_queue_size,
+    )
+    if os.path.isdir(args.embeddings) and service.embedding_index is None:
+        print(f"{args.model} has no embedding output; similar cases are disabled")
+    PredictHandler.service = service
+    httpd = ThreadingHTTPServer((args.host, args.port), PredictHandler)
+    httpd.daemon_threads = True
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+from calibration import ABSTAIN_THRESHOLD, CALIBRATION_PATH, apply_temperature, load_temperature
+from inference import decode_predictions, load_class_indices, predict_batch
+from metrics import counter, stage
+from preprocessing import IMAGE_SIZE, list_images, preprocess_into
+
+working_dir = os.path.dirname(os.path.abspath(__file__))
+# Frames whose 64-bit difference hashes are at most this many bits apart count as duplicates
+HASH_THRESHOLD = int(os.environ.get("PLANT_STREAM_HASH_THRESHOLD", 6))
+STREAM_BATCH_SIZE = int(os.environ.get("PLANT_STREAM_BATCH_SIZE", 16))
+
+FRAMES = counter("plant_stream_frames", "Streamed frames by outcome", ("result",))
+
+
+def difference_hash(img):
+    # dHash: sign of horizontal gradients on a 9x8 grayscale thumbnail, packed into 64 bits
+    pixels = np.asarray(img.convert("L").resize((9, 8), Image.Resampling.BILINEAR), dtype=np.int16)
+    return int.from_bytes(np.packbits(pixels[:, 1:] > pixels[:, :-1]).tobytes(), "big")
+
+
+def video_frames(source, stride=1, max_frames=None):
+    # PIL images from a directory of stills, an animated GIF/WebP, or (with opencv-python) a video file
+    if os.path.isdir(source):
+        frames = (Image.open(path) for path in list_images(source))
+    elif source.lower().endswith((".gif", ".webp")):
+        frames = ImageSequence.Iterator(Image.open(source))
+    else:
+        frames = _opencv_frames(source)
+    for i, frame in enumerate(frames):
+        if max_frames is not None and i >= max_frames * stride:
+            break
+        if i % stride == 0:
+            yield frame.convert("RGB")
+
+
+def _opencv_frames(path):
+    try:
+        import cv2
+    except ImportError:
+        raise RuntimeError("reading video files needs opencv-python (pip install opencv-python-headless)")
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"could not open video: {path}")
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                return
+            yield Image.fromarray(frame[..., ::-1])
+    finally:
+        capture.release()
+
+
+class FrameStream:
+    # Classifies a sequence of frames: near-duplicates are skipped by perceptual hash,
+    # the rest are preprocessed into a fixed batch buffer and predicted batch_size at a
+    # time, and confident top-1 classes are tallied. cpu_budget (in cores) throttles the
+    # stream so it never uses more CPU than that on average.
+
+    def __init__(self, model, class_indices, batch_size=STREAM_BATCH_SIZE, hash_threshold=HASH_THRESHOLD,
+                 temperature=1., abstain_threshold=ABSTAIN_THRESHOLD, cpu_budget=None):
+        self.model = model
+        self.class_indices = class_indices
+        self.hash_threshold = hash_threshold
+        self.temperature = temperature
+        self.abstain_threshold = abstain_threshold
+        self.cpu_budget = cpu_budget
+        self.tally = Counter()
+        self.frames = self.skipped = self.classified = self.abstained = 0
+        self._batch = np.empty((batch_size, IMAGE_SIZE[1], IMAGE_SIZE[0], 3), dtype=np.float32)
+        self._pending = 0
+        self._last_hash = None
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+
+    def push(self, frame):
+        # Returns True when the frame filled the batch and triggered a forward pass
+        if isinstance(frame, np.ndarray):
+            frame = Image.fromarray(frame)
+        self.frames += 1
+        frame_hash = difference_hash(frame)
+        if self._last_hash is not None and (frame_hash ^ self._last_hash).bit_count() <= self.hash_threshold:
+            self.skipped += 1
+            FRAMES.inc(result="skipped")
+            return False
+        self._last_hash = frame_hash
+        with stage("preprocess"):
+            preprocess_into(self._batch[self._pending], frame)
+        self._pending += 1
+        if self._pending == len(self._batch):
+            self.flush()
+            return True
+        return False
+
+    def flush(self):
+        if not self._pending:
+            return []
+        with stage("predict"):
+            predictions = apply_temperature(predict_batch(self.model, self._batch[:self._pending]), self.temperature)
+        results = decode_predictions(predictions, self.class_indices, abstain_threshold=self.abstain_threshold)
+        for result in results:
+            if result.abstain:
+                self.abstained += 1
+            else:
+                self.tally[result.class_name] += 1
+        self.classified += self._pending
+        FRAMES.inc(self._pending, result="classified")
+        self._pending = 0
+        self._throttle()
+        return results
+
+    def _throttle(self):
+        if not self.cpu_budget:
+            return
+        wall = time.perf_counter() - self._start_wall
+        cpu = time.process_time() - self._start_cpu
+        excess = cpu / self.cpu_budget - wall
+        if excess > 0:
+            time.sleep(excess)
+
+    def run(self, frames):
+        # Yields stats after every forward pass and once more at the end of the stream
+        for frame in frames:
+            if self.push(frame):
+                yield self.stats()
+        self.flush()
+        yield self.stats()
+
+    def stats(self):
+        wall = time.perf_counter() - self._start_wall
+        cpu = time.process_time() - self._start_cpu
+        return {
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "classified": self.classified,
+            "abstained": self.abstained,
+            "seconds": wall,
+            "fps": self.frames / wall if wall else 0.,
+            "classified_fps": self.classified / wall if wall else 0.,
+            "cpu_cores_used": cpu / wall if wall else 0.,
+            "cpu_budget": self.cpu_budget,
+            "tally": self.tally.most_common(),
+        }
+
+
+def main():
+    from model_registry import get_model
+
+    parser = argparse.ArgumentParser(description="Classify a video or frame sequence swept along a crop row")
+    parser.add_argument("source", help="video file (needs opencv-python), animated GIF/WebP, or directory of frames")
+    parser.add_argument("--model", default=f"{working_dir}/plant_disease_prediction_model.h5")
+    parser.add_argument("--class-indices", default=f"{working_dir}/class_indices.json")
+    parser.add_argument("--calibration", default=CALIBRATION_PATH)
+    parser.add_argument("--batch-size", type=int, default=STREAM_BATCH_SIZE)
+    parser.add_argument("--hash-threshold", type=int, default=HASH_THRESHOLD,
+                        help="max differing hash bits for a frame to be skipped as a duplicate")
+    parser.add_argument("--stride", type=int, default=1, help="only consider every Nth frame")
+    parser.add_argument("--max-frames", type=int)
+    parser.add_argument("--cpu-budget", type=float, help="average CPU cores the stream may use")
+    parser.add_argument("--output", help="write the final stats as JSON")
+    args = parser.parse_args()
+
+    stream = FrameStream(
+        get_model(args.model), load_class_indices(args.class_indices), args.batch_size, args.hash_threshold,
+        load_temperature(args.calibration), cpu_budget=args.cpu_budget,
+    )
+    for stats in stream.run(video_frames(args.source, args.stride, args.max_frames)):
+        leader = stats["tally"][0] if stats["tally"] else ("-", 0)
+        print(f"{stats['frames']:>6} frames  {stats['skipped']:>5} skipped  {stats['fps']:7.1f} fps  "
+              f"{stats['cpu_cores_used']:.2f} cores  leading: {leader[0]} ({leader[1]})", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(stats, f, indent=2)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import json
+
+import numpy as np
+import pytest
+
+from batch_score import load_checkpoint, score_decoded
+
+
+def test_checkpoint_retries_errors_and_drops_a_torn_line(tmp_path):
+    output = tmp_path / "scores.jsonl"
+    output.write_text(
+        json.dumps({"path": "a.jpg", "class": "x"}) + "\n"
+        + json.dumps({"path": "b.jpg", "error": "Input/output error"}) + "\n"
+        + json.dumps({"path": "c.jpg", "class": "y"}) + "\n"
+        + '{"path": "d.jp'
+    )
+    assert load_checkpoint(str(output)) == {"a.jpg", "c.jpg"}
+    # Only complete, successful records remain, so appended retries start on a clean line
+    assert [json.loads(line)["path"] for line in output.read_text().splitlines()] == ["a.jpg", "c.jpg"]
+
+
+def test_missing_checkpoint_is_empty(tmp_path):
+    assert load_checkpoint(str(tmp_path / "scores.jsonl")) == set()
+
+
+class FixedModel:
+    def __init__(self, probabilities):
+        self.probabilities = np.asarray(probabilities, dtype=np.float32)
+
+    def predict_on_batch(self, batch):
+        return self.probabilities[:len(batch)]
+
+
+def test_records_are_calibrated_and_flag_abstentions():
+    model = FixedModel([[0.7, 0.2, 0.1]])
+    class_indices = {"0": "Apple___healthy", "1": "Apple___scab", "2": "Corn___rust"}
+    batch = np.zeros((1, 4, 4, 3), dtype=np.float32)
+    raw, = score_decoded(model, class_indices, batch, ["a.jpg"], {}, k=2)
+    softened, = score_decoded(model, class_indices, batch, ["a.jpg"], {}, k=2, temperature=3.,
+                              abstain_threshold=0.5)
+    assert raw["class"] == softened["class"] == "Apple___healthy"
+    assert raw["confidence"] == pytest.approx(70, abs=1e-4) and not raw["abstain"]
+    # A higher temperature flattens the distribution below the abstain threshold
+    assert softened["confidence"] < 50 and softened["abstain"]
+    assert [entry["class"] for entry in softened["top_k"]] == ["Apple___healthy", "Apple___scab"]
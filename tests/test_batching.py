@@ -0,0 +1,152 @@
+import queue
+import threading
+
+import numpy as np
+import pytest
+
+from batching import MicroBatcher
+
+
+def fake_model(batch):
+    # One "probability" row per image: its mean pixel value and the batch size it ran in
+    return np.stack([batch.mean(axis=(1, 2, 3)), np.full(len(batch), len(batch), dtype=np.float32)], axis=1)
+
+
+def images(count):
+    return np.arange(count, dtype=np.float32)[:, None, None, None] * np.ones((1, 4, 4, 3), dtype=np.float32)
+
+
+def test_results_match_their_inputs():
+    batcher = MicroBatcher(fake_model, max_batch_size=8, max_wait_ms=20)
+    try:
+        predictions = batcher.predict_on_batch(images(20))
+    finally:
+        batcher.close()
+    np.testing.assert_array_equal(predictions[:, 0], np.arange(20))
+    assert predictions[:, 1].max() <= 8
+
+
+def test_concurrent_requests_share_forward_passes():
+    started = threading.Barrier(8)
+    results = {}
+    batcher = MicroBatcher(fake_model, max_batch_size=8, max_wait_ms=200)
+
+    def request(i):
+        started.wait()
+        results[i] = batcher.predict(images(8)[i])
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.close()
+    assert [results[i][0] for i in range(8)] == list(range(8))
+    assert batcher.stats()["batches"] < 8
+
+
+def test_request_larger_than_the_queue_is_not_rejected():
+    batcher = MicroBatcher(fake_model, max_batch_size=2, max_wait_ms=1, max_queue_size=2)
+    try:
+        predictions = batcher.gather(batcher.submit_many(images(9)))
+    finally:
+        batcher.close()
+    assert [row[0] for row in predictions] == list(range(9))
+    assert batcher.stats()["rejected"] == 0
+
+
+def test_full_queue_cancels_the_queued_part_of_a_request():
+    release = threading.Event()
+
+    def slow_model(batch):
+        release.wait()
+        return fake_model(batch)
+
+    batcher = MicroBatcher(slow_model, max_batch_size=1, max_wait_ms=0, max_queue_size=2)
+    try:
+        blocker = batcher.submit(images(1)[0])
+        with pytest.raises(queue.Full):
+            batcher.submit_many(images(5), timeout=0.2)
+        release.set()
+        blocker.result(5)
+    finally:
+        release.set()
+        batcher.close()
+    # Only the blocking image reached the model; the cancelled ones were skipped
+    assert batcher.stats()["batch_sizes"] == {1: 1}
+
+
+def test_model_errors_fail_every_future_in_the_batch():
+    def broken(batch):
+        raise RuntimeError("backend failed")
+
+    batcher = MicroBatcher(broken, max_wait_ms=1)
+    try:
+        with pytest.raises(RuntimeError, match="backend failed"):
+            batcher.predict_on_batch(images(3))
+        assert batcher.stats()["failed"] == 3
+    finally:
+        batcher.close()
+
+
+def test_submit_after_close_raises():
+    batcher = MicroBatcher(fake_model)
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit(images(1)[0])
+    with pytest.raises(RuntimeError):
+        batcher.predict_on_batch(images(2))
+
+
+def test_close_finishes_queued_images_and_refuses_new_ones():
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_model(batch):
+        entered.set()
+        release.wait()
+        return fake_model(batch)
+
+    batcher = MicroBatcher(slow_model, max_batch_size=1, max_wait_ms=0)
+    running = batcher.submit(images(1)[0])
+    entered.wait(5)
+    waiting = batcher.submit(images(2)[1])
+    closer = threading.Thread(target=batcher.close)
+    closer.start()
+    # The stop marker is queued behind the waiting image before the model is released
+    while batcher.queue_depth() < 2:
+        threading.Event().wait(0.001)
+    with pytest.raises(RuntimeError):
+        batcher.submit(images(3)[2])
+    release.set()
+    closer.join(5)
+    assert running.result(5)[0] == 0
+    assert waiting.result(5)[0] == 1
+
+
+def test_embeddings_come_from_the_same_pass():
+    calls = []
+
+    def embed(batch):
+        calls.append(len(batch))
+        return fake_model(batch), batch.reshape(len(batch), -1)[:, :3]
+
+    batcher = MicroBatcher(fake_model, max_batch_size=8, max_wait_ms=50, embed_fn=embed)
+    try:
+        plain = batcher.submit(images(2)[0])
+        wanted = batcher.submit(images(2)[1], embedding=True)
+        probabilities, embedding = wanted.result(5)
+        assert plain.result(5)[0] == 0
+    finally:
+        batcher.close()
+    assert probabilities[0] == 1
+    np.testing.assert_array_equal(embedding, [1, 1, 1])
+    assert calls == [2]
+
+
+def test_embedding_needs_an_embed_fn():
+    batcher = MicroBatcher(fake_model)
+    try:
+        with pytest.raises(ValueError):
+            batcher.submit(images(1)[0], embedding=True)
+    finally:
+        batcher.close()
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from calibration import apply_temperature, expected_calibration_error, fit_temperature, negative_log_likelihood
+
+
+def softmax(logits):
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def overconfident(rng, temperature, count=20000, classes=10):
+    # Labels follow softmax(logits); the model reports softmax(logits * temperature)
+    logits = 1.5 * rng.normal(size=(count, classes))
+    true = softmax(logits)
+    labels = (true.cumsum(axis=1) < rng.random((count, 1))).sum(axis=1)
+    return softmax(logits * temperature).astype(np.float32), labels
+
+
+def test_fit_temperature_recovers_a_known_temperature():
+    probabilities, labels = overconfident(np.random.default_rng(0), 2.5)
+    temperature = fit_temperature(probabilities, labels)
+    assert temperature == pytest.approx(2.5, rel=0.05)
+    calibrated = apply_temperature(probabilities, temperature)
+    assert negative_log_likelihood(calibrated, labels) < negative_log_likelihood(probabilities, labels)
+    assert expected_calibration_error(calibrated, labels) < expected_calibration_error(probabilities, labels)
+
+
+def test_calibrated_probabilities_keep_temperature_one():
+    probabilities, labels = overconfident(np.random.default_rng(1), 1.)
+    assert fit_temperature(probabilities, labels) == pytest.approx(1., rel=0.05)
+    assert expected_calibration_error(probabilities, labels) < 0.02
+    assert apply_temperature(probabilities, 1.) is probabilities
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from embeddings import EmbeddingIndex, cosine_top_k, normalize
+
+
+def brute_force(vectors, queries, k):
+    scores = queries @ vectors.T
+    return np.argsort(-scores, axis=1, kind="stable")[:, :k]
+
+
+def clustered(rng, count, dim=16, clusters=20):
+    centres = normalize(rng.normal(size=(clusters, dim)))
+    return normalize(centres[rng.integers(0, clusters, count)] + 0.15 * rng.normal(size=(count, dim)))
+
+
+@pytest.mark.parametrize("chunk_rows", [3, 64, 1000])
+def test_cosine_top_k_matches_brute_force(chunk_rows):
+    rng = np.random.default_rng(0)
+    vectors, queries = normalize(rng.normal(size=(300, 16))), normalize(rng.normal(size=(7, 16)))
+    ids, scores = cosine_top_k(vectors, queries, k=5, chunk_rows=chunk_rows)
+    np.testing.assert_array_equal(ids, brute_force(vectors, queries, 5))
+    np.testing.assert_allclose(scores, np.take_along_axis(queries @ vectors.T, ids, axis=1), rtol=1e-5)
+
+
+def test_cosine_top_k_within_rows_and_beyond_the_row_count():
+    rng = np.random.default_rng(1)
+    vectors, queries = normalize(rng.normal(size=(50, 8))), normalize(rng.normal(size=(2, 8)))
+    rows = np.arange(10, 20)
+    ids, _ = cosine_top_k(vectors, queries, k=3, rows=rows, chunk_rows=4)
+    np.testing.assert_array_equal(ids, rows[brute_force(vectors[rows], queries, 3)])
+    ids, scores = cosine_top_k(vectors, queries, k=100)
+    assert ids.shape == scores.shape == (2, 50)
+
+
+def test_index_persists_and_other_instances_refresh(tmp_path):
+    rng = np.random.default_rng(2)
+    writer = EmbeddingIndex(str(tmp_path / "index"))
+    writer.add(rng.normal(size=(3, 8)), [{"name": f"{i}.jpg"} for i in range(3)])
+    reader = EmbeddingIndex(str(tmp_path / "index"))
+    assert len(reader) == 3 and reader.vectors().shape == (3, 8)
+    writer.add(rng.normal(size=(2, 8)), [{"name": "3.jpg"}, {"name": "4.jpg"}])
+    # A case line still being written is not counted yet
+    with open(tmp_path / "index" / "cases.jsonl", "a") as f:
+        f.write('{"name": "5.j')
+    reader.refresh()
+    assert [case["name"] for case in reader.cases] == [f"{i}.jpg" for i in range(5)]
+    assert reader.vectors().dtype == np.float16
+    with pytest.raises(ValueError):
+        writer.add(rng.normal(size=(1, 4)), [{"name": "wrong.jpg"}])
+
+
+def test_similar_finds_the_stored_image(tmp_path):
+    rng = np.random.default_rng(3)
+    embeddings = rng.normal(size=(20, 8))
+    index = EmbeddingIndex(str(tmp_path / "index"))
+    index.add(embeddings, [{"name": f"{i}.jpg"} for i in range(20)])
+    cases = index.similar(embeddings[[4, 11]] * 3, k=2)
+    assert [row[0]["name"] for row in cases] == ["4.jpg", "11.jpg"]
+    # float16 rounding never reports more than a perfect match
+    assert all(0 < case["similarity"] <= 1 for row in cases for case in row)
+
+
+def test_ivf_search_recalls_most_exact_neighbours(tmp_path):
+    rng = np.random.default_rng(4)
+    index = EmbeddingIndex(str(tmp_path / "index"))
+    index.add(clustered(rng, 2000), [{"name": str(i)} for i in range(2000)])
+    sizes = index.build_ivf(lists=20, seed=0)
+    assert sizes.sum() == 2000
+    queries = clustered(rng, 50)
+    exact, _ = index.search(queries, k=10, probes=0)
+    approximate, _ = index.search(queries, k=10, probes=4)
+    recall = np.mean([len(set(a) & set(e)) / 10 for a, e in zip(approximate, exact)])
+    assert recall >= 0.9
+    # Rows added after the partitioning are still searched
+    late = normalize(rng.normal(size=(1, 16)))
+    index.add(late, [{"name": "late"}])
+    assert index.similar(late, k=1, probes=1)[0][0]["name"] == "late"
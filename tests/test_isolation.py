@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+from isolation import run_isolated
+
+
+def answer(value, result_queue):
+    result_queue.put({"value": value, "pid": os.getpid()})
+
+
+def crash(result_queue):
+    os._exit(3)
+
+
+def test_the_result_comes_from_another_process():
+    result = run_isolated(answer, (42,), poll_interval=0.1)
+    assert result["value"] == 42 and result["pid"] != os.getpid()
+
+
+def test_a_child_that_dies_is_reported_instead_of_awaited():
+    with pytest.raises(RuntimeError, match="exited with code 3"):
+        run_isolated(crash, (), poll_interval=0.1)
@@ -0,0 +1,140 @@
+import io
+import os
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from jobs import JobStore, JobWorkerPool
+from quality import DEFAULT_THRESHOLDS
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"), str(tmp_path / "spool"), max_attempts=2)
+
+
+def spool(store, job_id):
+    return os.path.join(store.files_dir, job_id)
+
+
+def test_claimed_batches_complete_the_job(store):
+    job_id = store.submit([b"a", b"b", b"c"], names=["a.jpg", "b.jpg", "c.jpg"])
+    assert sorted(os.listdir(spool(store, job_id))) == ["0", "1", "2"]
+    claimed_job, claim, items = store.claim(batch_size=2)
+    assert claimed_job == job_id and [position for position, _ in items] == [0, 1]
+    store.complete(job_id, claim, {0: {"class": "x"}}, {1: "unreadable"})
+    assert store.status(job_id)["status"] == "running"
+    _, claim, items = store.claim(batch_size=2)
+    store.complete(job_id, claim, {2: {"class": "y"}}, {})
+    status = store.status(job_id)
+    assert status["status"] == "done"
+    assert status["counts"] == {"pending": 0, "running": 0, "done": 2, "rejected": 0, "failed": 1, "cancelled": 0}
+    assert [item["position"] for item in store.results(job_id)] == [0, 1, 2]
+    assert store.results(job_id, after=1) == [{"position": 2, "name": "c.jpg", "status": "done", "result": {"class": "y"}}]
+    assert not os.path.exists(spool(store, job_id))
+
+
+def test_released_batches_are_retried_until_attempts_run_out(store):
+    job_id = store.submit([b"a"])
+    _, claim, _ = store.claim()
+    store.release(job_id, claim, "queue full")
+    assert store.status(job_id)["counts"]["pending"] == 1
+    _, claim, _ = store.claim()
+    store.release(job_id, claim, "queue full")
+    assert store.status(job_id)["status"] == "done"
+    assert store.results(job_id)[0]["error"] == "queue full"
+    assert store.claim() is None
+    assert not os.path.exists(spool(store, job_id))
+
+
+def test_expired_leases_use_up_attempts(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), str(tmp_path / "spool"), max_attempts=2, lease_seconds=-1)
+    job_id = store.submit([b"a"])
+    # Every lease is already expired, as if each worker died mid-batch
+    assert store.claim() is not None
+    assert store.claim() is not None
+    assert store.claim() is None
+    status = store.status(job_id)
+    assert status["status"] == "done" and status["counts"]["failed"] == 1
+    assert store.results(job_id)[0]["error"] == "lease expired"
+    assert not os.path.exists(spool(store, job_id))
+
+
+def test_cancel_keeps_the_spool_until_the_running_batch_finishes(store):
+    job_id = store.submit([b"a", b"b", b"c"])
+    _, claim, items = store.claim(batch_size=1)
+    assert store.cancel(job_id)
+    # The running batch still reads its spooled file
+    assert os.path.exists(items[0][1])
+    assert store.status(job_id)["counts"]["cancelled"] == 2
+    store.complete(job_id, claim, {0: {"class": "x"}}, {})
+    status = store.status(job_id)
+    assert status["status"] == "cancelled" and status["counts"]["done"] == 1
+    assert not os.path.exists(spool(store, job_id))
+    assert not store.cancel(job_id)
+
+
+def test_a_batch_released_after_cancel_is_not_requeued(store):
+    job_id = store.submit([b"a", b"b"])
+    _, claim, _ = store.claim(batch_size=1)
+    store.cancel(job_id)
+    store.release(job_id, claim, "queue full")
+    assert store.status(job_id)["counts"] == {"pending": 0, "running": 0, "done": 0, "rejected": 0, "failed": 0, "cancelled": 2}
+    assert store.claim() is None
+    assert not os.path.exists(spool(store, job_id))
+
+
+def test_cancel_without_running_batches_removes_the_spool(store):
+    job_id = store.submit([b"a"])
+    assert store.cancel(job_id)
+    assert not os.path.exists(spool(store, job_id))
+
+
+def test_jobs_share_workers(store):
+    first = store.submit([b"a"] * 4, max_concurrency=1)
+    second = store.submit([b"b"] * 4, max_concurrency=1)
+    # The older job is at its concurrency limit, so the next batch goes to the other one
+    assert store.claim(batch_size=1)[0] == first
+    assert store.claim(batch_size=1)[0] == second
+    assert store.claim(batch_size=1) is None
+
+
+class FixedModel:
+    def predict_on_batch(self, batch):
+        return np.tile(np.array([[0.1, 0.9]], dtype=np.float32), (len(batch), 1))
+
+
+def test_worker_pool_scores_jobs(store):
+    image = io.BytesIO()
+    Image.new("RGB", (64, 48), (40, 140, 50)).save(image, "PNG")
+    pool = JobWorkerPool(store, FixedModel(), {"0": "Apple___healthy", "1": "Apple___scab"}, workers=1,
+                         batch_size=2, poll_interval=0.01)
+    try:
+        job_id = pool.submit([image.getvalue(), b"not an image", image.getvalue()])
+        deadline = time.monotonic() + 10
+        while store.status(job_id)["status"] != "done" and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        pool.close()
+    results = store.results(job_id)
+    assert [item["status"] for item in results] == ["done", "failed", "done"]
+    assert results[0]["result"]["class_name"] == "Apple___scab"
+
+
+def test_quality_rejections_keep_their_reasons(store):
+    dark = io.BytesIO()
+    Image.new("RGB", (64, 48), (3, 3, 3)).save(dark, "PNG")
+    pool = JobWorkerPool(store, FixedModel(), {"0": "Apple___healthy", "1": "Apple___scab"}, workers=1,
+                         quality_thresholds=DEFAULT_THRESHOLDS, poll_interval=0.01)
+    try:
+        job_id = pool.submit([dark.getvalue()])
+        deadline = time.monotonic() + 10
+        while store.status(job_id)["status"] != "done" and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        pool.close()
+    assert store.status(job_id)["counts"]["rejected"] == 1
+    item, = store.results(job_id)
+    assert item["status"] == "rejected" and "too_dark" in item["result"]["reasons"]
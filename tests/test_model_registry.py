@@ -0,0 +1,30 @@
+from model_registry import load_error, load_in_background, model_version, peek_model, wait_until_ready
+
+
+class FakeModel:
+    def predict_on_batch(self, batch):
+        return batch[:, :1, 0, 0]
+
+
+def test_a_missing_model_file_is_a_load_error(tmp_path):
+    path = str(tmp_path / "model.tflite")
+    load_in_background(path, loader=lambda path: FakeModel())
+    assert isinstance(load_error(path), FileNotFoundError)
+    assert not wait_until_ready(path, timeout=5)
+    # Once the file exists the next rerun loads it
+    with open(path, "wb") as f:
+        f.write(b"weights")
+    load_in_background(path, loader=lambda path: FakeModel())
+    assert wait_until_ready(path, timeout=5)
+    assert isinstance(peek_model(path), FakeModel) and load_error(path) is None
+
+
+def test_model_version_follows_the_loaded_file(tmp_path):
+    path = tmp_path / "model.tflite"
+    path.write_bytes(b"weights")
+    load_in_background(str(path), loader=lambda path: FakeModel())
+    assert wait_until_ready(str(path), timeout=5)
+    version = model_version(str(path))
+    # The loaded model keeps its cache namespace even if the file disappears underneath it
+    path.unlink()
+    assert model_version(str(path)) == version
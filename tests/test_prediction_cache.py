@@ -0,0 +1,94 @@
+import numpy as np
+
+from prediction_cache import PredictionCache, image_bytes, predict_with_cache, top_k
+
+
+def test_top_k_matches_a_full_sort():
+    rng = np.random.default_rng(0)
+    predictions = rng.random((50, 38)).astype(np.float32)
+    for row, expected in zip(top_k(predictions, 5), np.argsort(-predictions, axis=1)[:, :5]):
+        assert [idx for idx, _ in row] == expected.tolist()
+        assert [prob for _, prob in row] == sorted((prob for _, prob in row), reverse=True)
+
+
+def test_top_k_is_capped_at_the_class_count():
+    assert top_k(np.array([[0.2, 0.8]]), 5) == [[(1, 0.8), (0, 0.2)]]
+
+
+def test_lru_eviction_and_counters():
+    cache = PredictionCache(maxsize=2, path="")
+    cache.set("a", [(1, 0.9)])
+    cache.set("b", [(2, 0.8)])
+    assert cache.get("a") == [(1, 0.9)]
+    cache.set("c", [(3, 0.7)])
+    # "b" was the least recently used entry
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats() == {"size": 2, "maxsize": 2, "hits": 3, "misses": 1}
+
+
+def test_entries_expire_after_the_ttl():
+    cache = PredictionCache(ttl=-1, path="")
+    cache.set("a", [(1, 0.9)])
+    assert cache.get("a") is None
+
+
+def test_sqlite_backing_survives_a_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    first = PredictionCache(path=path, namespace="model-v1")
+    first.set(first.key(b"leaf"), [(4, 0.5), (7, 0.25)])
+    second = PredictionCache(path=path, namespace="model-v1")
+    assert second.get(second.key(b"leaf")) == [(4, 0.5), (7, 0.25)]
+    # A different model version never sees those results
+    other = PredictionCache(path=path, namespace="model-v2")
+    assert other.get(other.key(b"leaf")) is None
+
+
+def test_predict_with_cache_only_predicts_unseen_images():
+    cache = PredictionCache(path="")
+    calls = []
+
+    def predict(blobs):
+        calls.append(list(blobs))
+        return np.array([[0.1, 0.9] if blob == b"b" else [0.9, 0.1] for blob in blobs])
+
+    first = predict_with_cache(cache, [b"a", b"b", b"a"], predict)
+    second = predict_with_cache(cache, [b"b", b"c"], predict)
+    # Duplicates within a call run once; cached images are not predicted again
+    assert calls == [[b"a", b"b"], [b"c"]]
+    assert first[0] == first[2] and first[0][0][0] == 0
+    assert second[0] == first[1] and second[0][0][0] == 1
+
+
+def test_image_bytes_accepts_paths_files_and_bytes(tmp_path):
+    path = tmp_path / "leaf.bin"
+    path.write_bytes(b"pixels")
+    with open(path, "rb") as f:
+        assert image_bytes(f) == b"pixels"
+        # The file can still be decoded by the caller afterwards
+        assert f.tell() == 0
+    assert image_bytes(str(path)) == image_bytes(b"pixels") == b"pixels"
+
+
+def test_unreadable_images_are_reported_and_not_cached():
+    cache = PredictionCache(path="")
+    error = OSError("cannot identify image file")
+
+    def predict(blobs):
+        return [error if blob == b"bad" else np.array([0.3, 0.7]) for blob in blobs]
+
+    results = predict_with_cache(cache, [b"a", b"bad"], predict)
+    assert results[0] == [(1, 0.7), (0, 0.3)] and results[1] is error
+    assert cache.get(cache.key(b"bad")) is None
+    assert cache.get(cache.key(b"a")) is not None
+
+
+def test_expired_rows_are_pruned_through_the_created_index(tmp_path):
+    cache = PredictionCache(path=str(tmp_path / "cache.sqlite3"), ttl=60)
+    cache._db.execute("INSERT INTO predictions VALUES ('stale', 0, '[]')")
+    cache.set("fresh", [(1, 0.9)])
+    assert [key for key, in cache._db.execute("SELECT key FROM predictions")] == ["fresh"]
+    plan = " ".join(row[-1] for row in cache._db.execute(
+        "EXPLAIN QUERY PLAN DELETE FROM predictions WHERE created < 0"
+    ))
+    assert "predictions_created" in plan
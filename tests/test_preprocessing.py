@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from inference import load_and_preprocess_image, preprocess_images
+from preprocessing import IMAGE_SIZE, PreprocessBuffer, preprocess_into
+
+
+def baseline(path, size=IMAGE_SIZE):
+    # The original implementation, before decoding went straight into a float32 buffer
+    return np.array(Image.open(path).resize(size))[None].astype("float32") / 255.
+
+
+@pytest.fixture
+def photo():
+    rng = np.random.default_rng(0)
+    # Not square and not the model size, so the resize is exercised
+    return Image.fromarray(rng.integers(0, 256, (300, 412, 3), dtype=np.uint8))
+
+
+@pytest.mark.parametrize("extension", [".jpg", ".png"])
+def test_rgb_matches_the_original_function(tmp_path, photo, extension):
+    path = tmp_path / f"leaf{extension}"
+    photo.save(path)
+    result = load_and_preprocess_image(path)
+    assert result.dtype == np.float32
+    assert result.shape == (1, IMAGE_SIZE[1], IMAGE_SIZE[0], 3)
+    np.testing.assert_array_equal(result, baseline(path))
+
+
+def test_batches_match_single_images(tmp_path, photo):
+    paths = []
+    for i in range(3):
+        paths.append(tmp_path / f"{i}.png")
+        photo.rotate(90 * i).save(paths[-1])
+    batch = preprocess_images(paths, buffer=PreprocessBuffer(capacity=1))
+    np.testing.assert_array_equal(batch, np.concatenate([baseline(path) for path in paths]))
+
+
+def test_decoded_images_match_files(tmp_path, photo):
+    path = tmp_path / "leaf.png"
+    photo.save(path)
+    out = np.empty((IMAGE_SIZE[1], IMAGE_SIZE[0], 3), dtype=np.float32)
+    np.testing.assert_array_equal(preprocess_into(out, photo)[None], baseline(path))
+
+
+@pytest.mark.parametrize("mode", ["RGBA", "L", "P", "CMYK"])
+def test_other_modes_become_three_channels(tmp_path, photo, mode):
+    path = tmp_path / ("leaf.jpg" if mode == "CMYK" else "leaf.png")
+    photo.convert(mode).save(path)
+    result = load_and_preprocess_image(path)
+    assert result.shape == (1, IMAGE_SIZE[1], IMAGE_SIZE[0], 3)
+    expected = np.array(Image.open(path).convert("RGB").resize(IMAGE_SIZE))[None].astype("float32") / 255.
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_grayscale_is_replicated_across_channels(tmp_path, photo):
+    path = tmp_path / "leaf.png"
+    photo.convert("L").save(path)
+    result = load_and_preprocess_image(path)[0]
+    np.testing.assert_array_equal(result[..., 0], result[..., 1])
+    np.testing.assert_array_equal(result[..., 0], result[..., 2])
@@ -0,0 +1,81 @@
+import io
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from inference import load_class_indices
+from prediction_cache import PredictionCache
+from quality import QualityReport
+from server import InferenceService, format_job_item, format_rejection
+
+CLASS_INDICES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "class_indices.json")
+
+
+class FixedModel:
+    def predict_on_batch(self, batch):
+        probabilities = np.full((len(batch), 38), 0.01, dtype=np.float32)
+        probabilities[:, 3] = 0.63
+        return probabilities
+
+
+def png(color):
+    data = io.BytesIO()
+    Image.new("RGB", (300, 260), color).save(data, "PNG")
+    return data.getvalue()
+
+
+@pytest.fixture
+def images():
+    return [png((40, 140, 50)), png((60, 120, 40)), b"not an image", png((50, 150, 60))]
+
+
+@pytest.mark.parametrize("options", [{}, {"tta": (("identity", "hflip"), "mean")}])
+def test_an_unreadable_upload_does_not_split_the_batch(images, options):
+    service = InferenceService(FixedModel(), load_class_indices(CLASS_INDICES), quality_thresholds=None)
+    try:
+        entries = service.predict(images, **options)
+        batch_sizes = service.batcher.stats()["batch_sizes"]
+    finally:
+        service.close()
+    assert entries[2] == {"error": "could not read image: unrecognised image format"}
+    assert [entry["class"] for i, entry in enumerate(entries) if i != 2] == [entries[0]["class"]] * 3
+    # The readable images still share one forward pass
+    views = len(options["tta"][0]) if options else 1
+    assert batch_sizes == {3 * views: 1}
+
+
+def test_tiled_results_are_kept_next_to_an_unreadable_upload(images):
+    entries, batches = [], []
+    for uploads in (images, images[:2] + images[3:]):
+        service = InferenceService(FixedModel(), load_class_indices(CLASS_INDICES), quality_thresholds=None)
+        try:
+            entries.append(service.predict(uploads, tiled=True))
+            batches.append(service.batcher.stats()["batches"])
+        finally:
+            service.close()
+    assert ["error" in entry for entry in entries[0]] == [False, False, True, False]
+    assert entries[0][:2] + entries[0][3:] == entries[1]
+    # Each readable photo was tiled once; none was recomputed because of the bad file
+    assert batches[0] == batches[1]
+
+
+def test_cached_requests_report_unreadable_uploads(images):
+    service = InferenceService(FixedModel(), load_class_indices(CLASS_INDICES), quality_thresholds=None,
+                               cache=PredictionCache(path=""))
+    try:
+        first = service.predict(images)
+        second = service.predict(images)
+        batch_sizes = service.batcher.stats()["batch_sizes"]
+    finally:
+        service.close()
+    assert first == second
+    assert "error" in second[2]
+    assert batch_sizes == {3: 1}
+
+
+def test_rejected_job_items_match_the_predict_response():
+    report = QualityReport(False, ["blurry", "not_a_leaf"], 1.5, 120., 0.01)
+    item = {"position": 3, "name": "leaf.jpg", "status": "rejected", "result": report._asdict()}
+    assert format_job_item(item, None) == dict(format_rejection(report), file="leaf.jpg", position=3)
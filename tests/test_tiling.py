@@ -0,0 +1,59 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from tiling import analyze_tiled, tile_origins
+
+TILE = 224
+LEAF, LESION = (60, 150, 40), (60, 150, 100)
+CLASS_INDICES = {"0": "Apple___healthy", "1": "Apple___scab", "2": "Apple___rust"}
+
+
+class LesionModel:
+    # Scab when at least 40% of the tile is lesion-coloured, healthy otherwise
+    def predict_on_batch(self, batch):
+        lesion = (batch[..., 2] > 70 / 255).mean(axis=(1, 2)) >= 0.4
+        return np.where(lesion[:, None], [0.05, 0.9, 0.05], [0.9, 0.05, 0.05]).astype(np.float32)
+
+
+def leaf(lesion_from):
+    # One tile high, three wide; columns from lesion_from onwards are lesion
+    pixels = np.empty((TILE, 3 * TILE, 3), dtype=np.uint8)
+    pixels[:] = LEAF
+    pixels[:, lesion_from:] = LESION
+    image = io.BytesIO()
+    Image.fromarray(pixels).save(image, "PNG")
+    return image.getvalue()
+
+
+@pytest.mark.parametrize("length, stride, expected", [
+    (224, 112, [0]),
+    (448, 112, [0, 112, 224]),
+    (500, 112, [0, 112, 224, 276]),
+    (300, 224, [0, 76]),
+])
+def test_tile_origins_align_the_last_tile_to_the_edge(length, stride, expected):
+    assert tile_origins(length, TILE, stride).tolist() == expected
+
+
+def test_a_disease_in_enough_tiles_is_the_verdict(monkeypatch):
+    monkeypatch.setattr("tiling.TILE_MIN_DISEASED", 2)
+    # The last tile is all lesion and its neighbour half, so two of five tiles are scab
+    result = analyze_tiled(LesionModel(), leaf(2 * TILE), CLASS_INDICES, overlap=0.5)
+    assert result.tile_classes.tolist() == [[0, 0, 0, 1, 1]]
+    assert result.disease_tiles == {"Apple___scab": 2}
+    assert result.verdict.class_name == "Apple___scab"
+    assert result.verdict.confidence == pytest.approx(90, abs=1e-3)
+
+
+def test_a_single_diseased_tile_is_averaged_away(monkeypatch):
+    monkeypatch.setattr("tiling.TILE_MIN_DISEASED", 2)
+    result = analyze_tiled(LesionModel(), leaf(5 * TILE // 2), CLASS_INDICES, overlap=0.5)
+    assert result.tile_classes.tolist() == [[0, 0, 0, 0, 1]]
+    assert result.disease_tiles == {"Apple___scab": 1}
+    # Mean of four healthy tiles and one scab tile
+    assert result.verdict.class_name == "Apple___healthy"
+    assert result.verdict.confidence == pytest.approx((4 * 90 + 5) / 5, abs=1e-3)
+    assert np.allclose(result.heatmap, [[0.1, 0.1, 0.1, 0.1, 0.95]])
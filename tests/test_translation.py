@@ -0,0 +1,52 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import translation
+from translation import DeepTranslatorBackend
+
+
+class TranslatePage(BaseHTTPRequestHandler):
+    delay = 0.
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        body = '<html><body><div class="result-container">पत्ती</div></body></html>'.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def endpoint(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TranslatePage)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(translation, "GOOGLE_TRANSLATE_URL", f"http://127.0.0.1:{server.server_port}/m")
+    monkeypatch.setattr(translation, "TRANSLATION_REQUEST_TIMEOUT", 0.2)
+    yield TranslatePage
+    TranslatePage.delay = 0.
+    server.shutdown()
+    server.server_close()
+
+
+def test_live_translations_are_parsed_from_the_page(endpoint):
+    backend = DeepTranslatorBackend()
+    assert backend.translate("leaf", "en", "hi") == "पत्ती"
+    assert backend.stats()["hits"] == 1
+
+
+def test_a_hung_request_times_out_and_counts_as_an_error(endpoint):
+    endpoint.delay = 2.
+    backend = DeepTranslatorBackend()
+    start = time.perf_counter()
+    assert backend.translate("leaf", "en", "hi") is None
+    assert time.perf_counter() - start < 1.5
+    assert backend.stats()["errors"] == 1 and backend.stats()["misses"] == 1
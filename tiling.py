@@ -0,0 +1,127 @@
+import io
+import os
+from collections import Counter, namedtuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from PIL import Image
+
+from calibration import ABSTAIN_THRESHOLD, apply_temperature
+from class_registry import class_names
+from inference import decode_predictions, predict_batch
+from metrics import stage
+from prediction_cache import TOP_K, image_bytes
+from preprocessing import IMAGE_SIZE
+from quality import plant_ratio
+
+# Tiled analysis of large field photos: overlapping model-sized patches are
+# classified in fixed-size chunks so small lesions are not lost to one resize
+TILE_MAX_SIDE = int(os.environ.get("PLANT_TILE_MAX_SIDE", 1792))
+TILE_OVERLAP = float(os.environ.get("PLANT_TILE_OVERLAP", 0.5))
+TILE_CHUNK_SIZE = int(os.environ.get("PLANT_TILE_CHUNK_SIZE", 32))
+# Tiles with less plant colour than this are background and left out of the verdict
+TILE_MIN_PLANT_RATIO = float(os.environ.get("PLANT_TILE_MIN_PLANT_RATIO", 0.25))
+# A disease seen confidently in at least this many tiles wins over the averaged verdict
+TILE_MIN_DISEASED = int(os.environ.get("PLANT_TILE_MIN_DISEASED", 2))
+
+# heatmap: (rows, cols) probability that the tile is diseased, NaN for background.
+# tile_classes: (rows, cols) top-1 class index, -1 for background.
+# disease_tiles: Counter of confident diseased tiles per class name.
+TiledResult = namedtuple("TiledResult", "verdict heatmap tile_classes disease_tiles origins tile_size scale")
+
+
+def tile_origins(length, tile, stride):
+    # Start offsets along one axis; the last tile is aligned to the edge so nothing is cut off
+    starts = list(range(0, length - tile + 1, stride))
+    if starts[-1] != length - tile:
+        starts.append(length - tile)
+    return np.asarray(starts)
+
+
+def load_full_resolution(image, tile_size=IMAGE_SIZE[0], max_side=TILE_MAX_SIDE):
+    # uint8 RGB array, downscaled so the long side is at most max_side (0 keeps the native
+    # size) and upscaled if needed so at least one tile fits
+    img = Image.open(io.BytesIO(image_bytes(image)))
+    width, height = img.size
+    scale = 1.
+    if max_side and max(width, height) > max_side:
+        scale = max_side / max(width, height)
+    scale = max(scale, tile_size / min(width, height))
+    if scale < 1. and img.format == "JPEG":
+        # libjpeg skips straight to the nearest larger power-of-two reduction
+        img.draft("RGB", (round(width * scale), round(height * scale)))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    if img.size != (round(width * scale), round(height * scale)):
+        img = img.resize((max(tile_size, round(width * scale)), max(tile_size, round(height * scale))),
+                         Image.Resampling.BICUBIC)
+    return np.asarray(img), scale
+
+
+def analyze_tiled(model, image, class_indices, overlap=TILE_OVERLAP, chunk_size=TILE_CHUNK_SIZE, max_side=TILE_MAX_SIDE,
+                  temperature=1., k=TOP_K, abstain_threshold=ABSTAIN_THRESHOLD):
+    tile = IMAGE_SIZE[0]
+    stride = max(1, round(tile * (1 - overlap)))
+    with stage("tile_decode"):
+        pixels, scale = load_full_resolution(image, tile, max_side)
+    # (H - tile + 1, W - tile + 1, tile, tile, 3) view of every possible patch; no pixels are copied
+    windows = sliding_window_view(pixels, (tile, tile, 3))[:, :, 0]
+    rows, cols = tile_origins(pixels.shape[0], tile, stride), tile_origins(pixels.shape[1], tile, stride)
+    origins = np.stack(np.meshgrid(rows, cols, indexing="ij"), axis=-1).reshape(-1, 2)
+
+    # Only one chunk of float32 tiles exists at a time, whatever the photo size
+    batch = np.empty((min(chunk_size, len(origins)), tile, tile, 3), dtype=np.float32)
+    probabilities = np.empty((len(origins), len(class_indices)), dtype=np.float32)
+    is_plant = np.empty(len(origins), dtype=bool)
+    for start in range(0, len(origins), chunk_size):
+        chunk = origins[start:start + chunk_size]
+        tiles = batch[:len(chunk)]
+        with stage("preprocess"):
+            for i, (top, left) in enumerate(chunk):
+                np.copyto(tiles[i], windows[top, left], casting="unsafe")
+                is_plant[start + i] = plant_ratio(tiles[i]) >= TILE_MIN_PLANT_RATIO
+            np.divide(tiles, 255., out=tiles)
+        with stage("predict"):
+            probabilities[start:start + len(chunk)] = predict_batch(model, tiles)
+    probabilities = apply_temperature(probabilities, temperature)
+
+    names = class_names(class_indices)
+    healthy = np.array([name.endswith("healthy") for name in names])
+    top1 = probabilities.argmax(axis=1)
+    confident = probabilities.max(axis=1) >= abstain_threshold
+    heatmap = np.where(is_plant, 1. - probabilities[:, healthy].sum(axis=1), np.nan)
+    tile_classes = np.where(is_plant, top1, -1)
+    counts = Counter(top1[is_plant & confident & ~healthy[top1]].tolist())
+    disease_tiles = Counter({names[idx]: count for idx, count in counts.items()})
+
+    # Lesions cover few tiles and would be averaged away, so a disease seen in enough
+    # tiles is the verdict; otherwise the leaf tiles' mean probabilities decide
+    if counts and counts.most_common(1)[0][1] >= TILE_MIN_DISEASED:
+        selected = is_plant & (top1 == counts.most_common(1)[0][0])
+    else:
+        selected = is_plant if is_plant.any() else np.ones_like(is_plant)
+    combined = probabilities[selected].mean(axis=0, keepdims=True)
+    verdict = decode_predictions(combined, class_indices, k, abstain_threshold)[0]
+    shape = (len(rows), len(cols))
+    return TiledResult(
+        verdict, heatmap.reshape(shape), tile_classes.reshape(shape), disease_tiles, origins, tile, scale
+    )
+
+
+def heatmap_overlay(image, result, max_side=TILE_MAX_SIDE, alpha=0.45):
+    # The analysed photo with diseased tiles tinted red (healthy ones green), for display;
+    # max_side must match the value given to analyze_tiled
+    pixels, _ = load_full_resolution(image, result.tile_size, max_side)
+    height, width = pixels.shape[:2]
+    coverage = np.zeros((height, width), dtype=np.float32)
+    weights = np.zeros((height, width), dtype=np.float32)
+    for (top, left), value in zip(result.origins, result.heatmap.ravel()):
+        if not np.isnan(value):
+            coverage[top:top + result.tile_size, left:left + result.tile_size] += value
+            weights[top:top + result.tile_size, left:left + result.tile_size] += 1
+    covered = weights > 0
+    severity = np.divide(coverage, weights, out=np.zeros_like(coverage), where=covered)
+    tint = np.stack([severity * 255, (1 - severity) * 255, np.zeros_like(severity)], axis=-1)
+    blend = np.where(covered[..., None], alpha, 0.)
+    out = pixels * (1 - blend) + tint * blend
+    return Image.fromarray(out.astype(np.uint8))
@@ -0,0 +1,234 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import counter, histogram
+
+working_dir = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.environ.get("PLANT_TRANSLATION_CACHE", f"{working_dir}/translation_cache.sqlite3")
+TRANSLATION_TIMEOUT = float(os.environ.get("PLANT_TRANSLATION_TIMEOUT", 5))
+# Per HTTP request, so a hung call gives its pool thread back instead of holding it forever
+TRANSLATION_REQUEST_TIMEOUT = float(os.environ.get("PLANT_TRANSLATION_REQUEST_TIMEOUT", TRANSLATION_TIMEOUT))
+GOOGLE_TRANSLATE_URL = "https://translate.google.com/m"
+# Backends tried in order; use "dictionary,cache" for offline deployments
+TRANSLATION_BACKENDS = os.environ.get("PLANT_TRANSLATION_BACKENDS", "dictionary,cache,deep-translator")
+
+# Shared pool for live translations; requests that outlive their timeout keep
+# running here and still fill the cache for the next render
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="translate")
+
+TRANSLATION_SECONDS = histogram("plant_translation_seconds", "Translation backend call latency", ("backend",))
+TRANSLATION_CALLS = counter("plant_translations", "Translation backend calls by result", ("backend", "result"))
+
+
+class TranslationCache:
+    # In-memory LRU in front of a SQLite table keyed by (source, target, text)
+
+    def __init__(self, path=CACHE_PATH, maxsize=4096):
+        self.maxsize = maxsize
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            " source TEXT NOT NULL, target TEXT NOT NULL, text TEXT NOT NULL, translation TEXT NOT NULL,"
+            " PRIMARY KEY (source, target, text))"
+        )
+        self._db.commit()
+
+    def _remember(self, key, translation):
+        self._memory[key] = translation
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def get(self, text, source, target):
+        key = (source, target, text)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            row = self._db.execute(
+                "SELECT translation FROM translations WHERE source = ? AND target = ? AND text = ?", key
+            ).fetchone()
+            if row is None:
+                return None
+            self._remember(key, row[0])
+            return row[0]
+
+    def set(self, text, source, target, translation):
+        key = (source, target, text)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?)", key + (translation,))
+            self._db.commit()
+            self._remember(key, translation)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TranslationCache()
+        return _cache
+
+
+class TranslationBackend:
+    # A backend returns the translation, or None when it has none for this text.
+    # Remote backends run in the shared pool and their results are written to the cache.
+    name = None
+    remote = False
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.seconds = 0.
+
+    def lookup(self, text, source, target):
+        raise NotImplementedError
+
+    def translate(self, text, source, target):
+        start = time.perf_counter()
+        result = "hit"
+        try:
+            translation = self.lookup(text, source, target) or None
+        except Exception:
+            translation = None
+            result = "error"
+            with self._stats_lock:
+                self.errors += 1
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            self.seconds += elapsed
+            if translation is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if translation is None and result == "hit":
+            result = "miss"
+        TRANSLATION_SECONDS.observe(elapsed, backend=self.name)
+        TRANSLATION_CALLS.inc(backend=self.name, result=result)
+        return translation
+
+    def stats(self):
+        with self._stats_lock:
+            calls = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "seconds": self.seconds,
+                "mean_ms": self.seconds / calls * 1000 if calls else 0.,
+            }
+
+
+class DictionaryBackend(TranslationBackend):
+    # Prebuilt per-language catalogues written by catalogue.py
+    name = "dictionary"
+
+    def lookup(self, text, source, target):
+        from catalogue import load_catalogue
+        if source != 'en':
+            return None
+        return load_catalogue(target)["strings"].get(text)
+
+
+class CacheOnlyBackend(TranslationBackend):
+    name = "cache"
+
+    def lookup(self, text, source, target):
+        return get_cache().get(text, source, target)
+
+
+class DeepTranslatorBackend(TranslationBackend):
+    # The page deep_translator.GoogleTranslator scrapes, fetched the same way but with a
+    # timeout, which GoogleTranslator cannot set. requests and bs4 come with deep-translator.
+    name = "deep-translator"
+    remote = True
+
+    def lookup(self, text, source, target):
+        import requests
+        from bs4 import BeautifulSoup
+        response = requests.get(
+            GOOGLE_TRANSLATE_URL, params={"sl": source, "tl": target, "q": text}, timeout=TRANSLATION_REQUEST_TIMEOUT
+        )
+        response.raise_for_status()
+        soup = BeautifulSoup(response.text, "html.parser")
+        element = soup.find("div", {"class": "t0"}) or soup.find("div", {"class": "result-container"})
+        return element.get_text(strip=True) if element is not None else None
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (DictionaryBackend, CacheOnlyBackend, DeepTranslatorBackend)
+}
+
+_backends = None
+
+
+def get_backends():
+    global _backends
+    with _cache_lock:
+        if _backends is None:
+            _backends = [BACKENDS[name.strip()]() for name in TRANSLATION_BACKENDS.split(",") if name.strip()]
+        return _backends
+
+
+def backend_stats():
+    # Hits, misses, errors and latency per configured backend, for /stats and the app's debug panel
+    return {backend.name: backend.stats() for backend in get_backends()}
+
+
+def _translate_local(text, source, target):
+    for backend in get_backends():
+        if not backend.remote:
+            translation = backend.translate(text, source, target)
+            if translation is not None:
+                return translation
+    return None
+
+
+def _translate_remote(text, source, target):
+    for backend in get_backends():
+        if backend.remote:
+            translation = backend.translate(text, source, target)
+            if translation is not None:
+                get_cache().set(text, source, target, translation)
+                return translation
+    return None
+
+
+def translate(text, source='en', target='hi'):
+    # Falls back to the source text when no backend has a translation
+    translation = _translate_local(text, source, target) or _translate_remote(text, source, target)
+    return translation or text
+
+
+def translate_many(texts, source='en', target='hi', timeout=TRANSLATION_TIMEOUT):
+    # Local backends answer inline; everything else is translated concurrently and
+    # anything not back within timeout seconds is returned in the source language
+    results = {}
+    pending = []
+    for text in dict.fromkeys(texts):
+        translation = _translate_local(text, source, target)
+        if translation is not None:
+            results[text] = translation
+        else:
+            pending.append(text)
+
+    futures = {text: _executor.submit(_translate_remote, text, source, target) for text in pending}
+    deadline = time.monotonic() + timeout
+    for text, future in futures.items():
+        try:
+            results[text] = future.result(timeout=max(deadline - time.monotonic(), 0)) or text
+        except Exception:
+            results[text] = text
+    return results
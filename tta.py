@@ -0,0 +1,102 @@
+import io
+import os
+
+import numpy as np
+
+from calibration import ABSTAIN_THRESHOLD, apply_temperature
+from inference import decode_predictions, predict_batch
+from metrics import stage
+from prediction_cache import TOP_K, image_bytes
+from preprocessing import IMAGE_SIZE, preprocess_into
+
+# Test-time augmentation: every view of an image goes through the model in one
+# batch and the per-view probabilities are combined into a single answer
+TTA_VIEWS = tuple(os.environ.get("PLANT_TTA_VIEWS", "identity,hflip,vflip,rot90,rot270,crop_center").split(","))
+TTA_AGGREGATION = os.environ.get("PLANT_TTA_AGGREGATION", "mean")
+# Crops are cut from a second decode this much larger than the model input
+CROP_SCALE = 8 / 7
+
+# Strided views of the one decoded image; nothing is copied until the batch is filled
+GEOMETRIC_VIEWS = {
+    "identity": lambda x: x,
+    "hflip": lambda x: x[:, ::-1],
+    "vflip": lambda x: x[::-1],
+    "rot90": lambda x: np.rot90(x, 1),
+    "rot180": lambda x: np.rot90(x, 2),
+    "rot270": lambda x: np.rot90(x, 3),
+    "transpose": lambda x: x.swapaxes(0, 1),
+}
+# (top, left) as fractions of the free margin
+CROP_VIEWS = {
+    "crop_center": (.5, .5),
+    "crop_top_left": (0., 0.),
+    "crop_top_right": (0., 1.),
+    "crop_bottom_left": (1., 0.),
+    "crop_bottom_right": (1., 1.),
+}
+AGGREGATIONS = ("mean", "geometric", "max")
+
+
+def check_views(views, aggregation=TTA_AGGREGATION):
+    unknown = [name for name in views if name not in GEOMETRIC_VIEWS and name not in CROP_VIEWS]
+    if unknown or not views:
+        raise ValueError(f"unknown TTA views {unknown}; choose from {list(GEOMETRIC_VIEWS) + list(CROP_VIEWS)}")
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"unknown TTA aggregation {aggregation!r}; choose from {list(AGGREGATIONS)}")
+
+
+def build_views(data, views=TTA_VIEWS, target_size=IMAGE_SIZE, out=None):
+    # All views of one encoded image as a (len(views), H, W, 3) float32 batch.
+    # The image is decoded at most twice: once at the model size and once larger for crops.
+    width, height = target_size
+    if out is None:
+        out = np.empty((len(views), height, width, 3), dtype=np.float32)
+    base = large = None
+    for slot, name in zip(out, views):
+        if name in GEOMETRIC_VIEWS:
+            if base is None:
+                base = preprocess_into(np.empty((height, width, 3), dtype=np.float32), io.BytesIO(data))
+            np.copyto(slot, GEOMETRIC_VIEWS[name](base))
+        else:
+            if large is None:
+                large_shape = (round(height * CROP_SCALE), round(width * CROP_SCALE), 3)
+                large = preprocess_into(np.empty(large_shape, dtype=np.float32), io.BytesIO(data))
+            top, left = CROP_VIEWS[name]
+            top = round(top * (large.shape[0] - height))
+            left = round(left * (large.shape[1] - width))
+            np.copyto(slot, large[top:top + height, left:left + width])
+    return out
+
+
+def aggregate(probabilities, method=TTA_AGGREGATION):
+    # probabilities: (images, views, classes) -> (images, classes)
+    if method == "mean":
+        return probabilities.mean(axis=1)
+    if method == "geometric":
+        combined = np.exp(np.log(np.maximum(probabilities, 1e-12)).mean(axis=1))
+    else:
+        combined = probabilities.max(axis=1)
+    return combined / combined.sum(axis=1, keepdims=True)
+
+
+def predict_images_tta(model, images, class_indices, views=TTA_VIEWS, aggregation=TTA_AGGREGATION, temperature=1.,
+                       k=TOP_K, abstain_threshold=ABSTAIN_THRESHOLD):
+    # One forward pass over images x views instead of one call per view
+    check_views(views, aggregation)
+    with stage("upload_read"):
+        blobs = [image_bytes(image) for image in images]
+    width, height = IMAGE_SIZE
+    with stage("preprocess"):
+        batch = np.empty((len(blobs) * len(views), height, width, 3), dtype=np.float32)
+        for i, data in enumerate(blobs):
+            build_views(data, views, IMAGE_SIZE, out=batch[i * len(views):(i + 1) * len(views)])
+    return predict_views(model, batch, class_indices, views, aggregation, temperature, k, abstain_threshold)
+
+
+def predict_views(model, batch, class_indices, views=TTA_VIEWS, aggregation=TTA_AGGREGATION, temperature=1., k=TOP_K,
+                  abstain_threshold=ABSTAIN_THRESHOLD):
+    # batch: len(views) consecutive rows per image, in the order build_views fills them
+    with stage("predict"):
+        probabilities = apply_temperature(predict_batch(model, batch), temperature)
+    combined = aggregate(probabilities.reshape(len(batch) // len(views), len(views), -1), aggregation)
+    return decode_predictions(combined, class_indices, k, abstain_threshold)